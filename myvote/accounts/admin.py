@@ -1,3 +1,6 @@
 from django.contrib import admin
 
-# Register your models here.
+from .forms import AdminLoginForm
+
+# The admin signs in through the same hashing pool as the site.
+admin.site.login_form = AdminLoginForm
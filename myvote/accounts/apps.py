@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class AccountsConfig(AppConfig):
     name = 'accounts'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from .backends import forget_user
+        post_save.connect(forget_user, sender=User, dispatch_uid='accounts.forget_user.save')
+        post_delete.connect(forget_user, sender=User, dispatch_uid='accounts.forget_user.delete')
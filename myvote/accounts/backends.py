@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from myvote import db_router
+from . import hashing
+
+def _user_key(user_id):
+    return 'auth_user:%s' % user_id
+
+def forget_user(sender, instance, **kwargs):
+    """
+        Drops a saved or deleted user from the cache. Connected to User's
+        post_save and post_delete in AccountsConfig.ready, so password,
+        email and account changes take effect on the next request, whatever
+        made them.
+    """
+    cache.delete(_user_key(instance.pk))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+        ModelBackend that loads the user of a logged in session from the
+        cache, saving the auth_user query AuthenticationMiddleware would
+        otherwise run on every request. Cached users are dropped by
+        forget_user, and the session's password hash is still checked
+        against the cached user, so a password change logs out its other
+        sessions as before.
+
+        Passwords are checked in the hashing pool (see accounts.hashing), so
+        authenticate raises HashingBusy when its queue is full.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so an unknown username takes as long to refuse.
+            hashing.make_password(password)
+        else:
+            if hashing.check_password(user, password) and self.user_can_authenticate(user):
+                return user
+
+    def get_user(self, user_id):
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Cached until the user next changes, so never from a replica
+            # that may not have the latest change yet.
+            with db_router.use_primary():
+                user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user
@@ -0,0 +1,184 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from myvote import db_router, page_cache, poll_cache, votes
+from .models import FollowedUsers, UserProfile
+
+# The follow graph as seen by the rest of the site. Edges are written with
+# single idempotent statements that also maintain the follow counts on each
+# user's UserProfile. Each user's set of followed ids lives in the cache,
+# loaded from FollowedUsers on a miss, so rendering a feed, a profile or a
+# list of users doesn't query the follow table. The set is keyed by a
+# version that follow and unfollow move once they commit. A set loaded
+# before the change, even one stored after it, sits under the old version
+# and is never read again; sets are never patched in place.
+
+# Selecting the followed user rather than relying on the foreign key: the
+# key is checked only at commit, too late to tell the caller.
+FOLLOW_SQL = """
+    INSERT INTO accounts_followedusers (follower_id, followed_id)
+    SELECT %s, id FROM auth_user WHERE id = %s
+    ON CONFLICT (follower_id, followed_id) DO NOTHING
+    RETURNING id
+"""
+
+UNFOLLOW_SQL = """
+    DELETE FROM accounts_followedusers WHERE follower_id = %s AND followed_id = %s
+    RETURNING id
+"""
+
+# Rows are listed in user id order, so two follows between the same pair of
+# users lock their profiles in the same order and can't deadlock.
+ADD_FOLLOW_COUNTS_SQL = """
+    INSERT INTO accounts_userprofile AS profile (user_id, follower_count, following_count)
+    VALUES (%s, %s, %s), (%s, %s, %s)
+    ON CONFLICT (user_id) DO UPDATE SET
+        follower_count = profile.follower_count + EXCLUDED.follower_count,
+        following_count = profile.following_count + EXCLUDED.following_count
+"""
+
+# The profiles exist: the follow being removed created them.
+REMOVE_FOLLOW_COUNTS_SQL = """
+    UPDATE accounts_userprofile SET
+        follower_count = follower_count - (user_id = %(followed)s)::int,
+        following_count = following_count - (user_id = %(follower)s)::int
+    WHERE user_id IN (%(follower)s, %(followed)s)
+"""
+
+# Take a user about to be deleted out of the counts of everyone they follow
+# and everyone following them. Each returns the users whose counts changed.
+REMOVE_FOLLOWED_COUNTS_SQL = """
+    UPDATE accounts_userprofile profile SET follower_count = profile.follower_count - 1
+    FROM accounts_followedusers follow
+    WHERE follow.follower_id = %s AND profile.user_id = follow.followed_id
+    RETURNING profile.user_id
+"""
+
+REMOVE_FOLLOWER_COUNTS_SQL = """
+    UPDATE accounts_userprofile profile SET following_count = profile.following_count - 1
+    FROM accounts_followedusers follow
+    WHERE follow.followed_id = %s AND profile.user_id = follow.follower_id
+    RETURNING profile.user_id
+"""
+
+def _version_key(user_id):
+    return 'follow_graph:%s:version' % user_id
+
+def _followed_key(user_id, version):
+    return 'follow_graph:%s:followed:%s' % (user_id, version)
+
+def _fresh_version():
+    # As poll_cache: an evicted version must never restart at an old value.
+    return int(time.time() * 1000)
+
+def _followed_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+def _bump_followed_versions(user_ids):
+    """ Makes the users' cached followed sets unreachable. Run after commit. """
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.add(_version_key(user_id), _fresh_version(), None)
+
+def followed_ids(user_id):
+    """ Returns the frozenset of ids of the users user_id follows. """
+    key = _followed_key(user_id, _followed_version(user_id))
+    ids = cache.get(key)
+    if ids is None:
+        # Stored under the version read above, so read from the primary in
+        # case a replica is behind that version.
+        with db_router.use_primary():
+            ids = frozenset(FollowedUsers.objects.filter(follower_id=user_id)
+                                                 .values_list('followed_id', flat=True))
+        cache.set(key, ids, settings.FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+def is_following(follower_id, followed_id):
+    return followed_id in followed_ids(follower_id)
+
+def follow_counts(user):
+    """
+        Returns the user's (follower count, following count) from their
+        profile, without a query if it was loaded with
+        select_related('profile').
+    """
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:
+        return 0, 0
+    return profile.follower_count, profile.following_count
+
+def follow_states(viewer, users):
+    """
+        Sets user.follow_state on each user in users to the viewer's follow
+        state, as view_profile's followed: None (viewer not logged in),
+        'Self', True or False. One followed_ids lookup for the whole list.
+    """
+    ids = followed_ids(viewer.id) if viewer.is_authenticated else None
+    for user in users:
+        if ids is None:
+            user.follow_state = None
+        elif user.id == viewer.id:
+            user.follow_state = 'Self'
+        else:
+            user.follow_state = user.id in ids
+
+def follow(follower_id, followed_id):
+    """
+        Makes follower_id follow followed_id. Returns True if they didn't
+        already. Raises User.DoesNotExist if followed_id doesn't exist.
+    """
+    rows = sorted([(followed_id, 1, 0), (follower_id, 0, 1)])
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(FOLLOW_SQL, [follower_id, followed_id])
+        if cursor.fetchone() is None:
+            if not User.objects.filter(pk=followed_id).exists():
+                raise User.DoesNotExist('User %s does not exist.' % followed_id)
+            return False
+        cursor.execute(ADD_FOLLOW_COUNTS_SQL, [value for row in rows for value in row])
+    _bump_followed_versions([follower_id])
+    return True
+
+def unfollow(follower_id, followed_id):
+    """
+        Makes follower_id stop following followed_id. Returns True if they
+        were following.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(UNFOLLOW_SQL, [follower_id, followed_id])
+        if cursor.fetchone() is None:
+            return False
+        cursor.execute(REMOVE_FOLLOW_COUNTS_SQL, {'follower': follower_id, 'followed': followed_id})
+    _bump_followed_versions([follower_id])
+    return True
+
+def delete_user(user):
+    """
+        Deletes a user along with their follows and votes, taking them out of
+        the follow counts and cached followed sets of the users on the other
+        end and out of the vote tallies of the polls they voted on. The
+        profiles showing changed counts get new page stamps.
+    """
+    user_id = user.id
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(REMOVE_FOLLOWED_COUNTS_SQL, [user_id])
+        followed_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(REMOVE_FOLLOWER_COUNTS_SQL, [user_id])
+        follower_ids = [row[0] for row in cursor.fetchall()]
+        voted_poll_ids = votes.remove_voter_tallies(user_id)
+        user.delete()
+    _bump_followed_versions(follower_ids + [user_id])
+    page_cache.bump_version(*[page_cache.profile(other_id) for other_id in followed_ids + follower_ids])
+    for poll_id in voted_poll_ids:
+        poll_cache.bump_results_version(poll_id)
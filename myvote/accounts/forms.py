@@ -1,11 +1,38 @@
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.admin.forms import AdminAuthenticationForm
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth.models import User
 from django.core.validators import validate_email
 from django.contrib.auth.password_validation import (validate_password,
         MinimumLengthValidator, CommonPasswordValidator,
         NumericPasswordValidator,)
 
+from . import hashing
+
+def _hashed(func, *args):
+    """
+        Runs one of the accounts.hashing functions, turning a full hashing
+        queue into a form error asking the user to try again.
+    """
+    try:
+        return func(*args)
+    except hashing.HashingBusy as e:
+        raise forms.ValidationError(str(e), code='busy')
+
+class BusyLoginMixin:
+    """
+        For AuthenticationForms: the backend checks the password in the
+        hashing pool, so a full queue becomes a form error, not a 500.
+    """
+    def clean(self):
+        return _hashed(super().clean)
+
+class LoginForm(BusyLoginMixin, AuthenticationForm):
+    pass
+
+class AdminLoginForm(BusyLoginMixin, AdminAuthenticationForm):
+    pass
+
 class SignUpForm(UserCreationForm):
     email = forms.CharField(max_length=254, required=True, widget=forms.EmailInput())
 
@@ -13,6 +40,26 @@ class SignUpForm(UserCreationForm):
         model = User
         fields = ('username', 'email', 'password1', 'password2')
 
+    def _post_clean(self):
+        # After UserCreationForm's password validation, so only passwords
+        # that will be saved are hashed.
+        super()._post_clean()
+        password = self.cleaned_data.get('password2')
+        if password and not self.errors:
+            try:
+                self.password_hash = _hashed(hashing.make_password, password)
+            except forms.ValidationError as error:
+                self.add_error(None, error)
+
+    def save(self, commit=True):
+        # Skips UserCreationForm.save, which would hash the password again
+        # in the request thread.
+        user = forms.ModelForm.save(self, commit=False)
+        user.password = self.password_hash
+        if commit:
+            user.save()
+        return user
+
 class BioForm(forms.Form):
     BIO_PLACEHOLDER = "Enter your new biography here"
     bio_text = forms.CharField(label="Biography",
@@ -34,7 +81,7 @@ class ChangePasswordForm(forms.Form):
         new_password = cleaned_data.get('new_password')
         new_password2 = cleaned_data.get('new_password2')
 
-        if not self.user.check_password(old_password):
+        if not _hashed(hashing.check_password, self.user, old_password):
             raise forms.ValidationError("Incorrect old password.")
 
         if not new_password or not new_password == new_password2:
@@ -45,8 +92,16 @@ class ChangePasswordForm(forms.Form):
 
         validate_password(password=new_password, user=self.user)
 
+        self.password_hash = _hashed(hashing.make_password, new_password)
+
         return cleaned_data
 
+    def save(self):
+        self.user.password = self.password_hash
+        self.user._password = self.cleaned_data['new_password']
+        self.user.save()
+        return self.user
+
 class ChangeEmailForm(forms.Form):
     password = forms.CharField(max_length=72, required=True, widget=forms.PasswordInput())
     new_email = forms.CharField(max_length=254, required=True, widget=forms.EmailInput())
@@ -62,7 +117,7 @@ class ChangeEmailForm(forms.Form):
         new_email = cleaned_data.get('new_email')
         new_email2 = cleaned_data.get('new_email2')
 
-        if not self.user.check_password(password):
+        if not _hashed(hashing.check_password, self.user, password):
             raise forms.ValidationError("Incorrect password.")
 
         if not new_email == new_email2:
@@ -85,7 +140,7 @@ class DeleteAccountForm(forms.Form):
         password = cleaned_data.get('password')
         password2 = cleaned_data.get('password2')
 
-        if not self.user.check_password(password):
+        if not _hashed(hashing.check_password, self.user, password):
             raise forms.ValidationError("Incorrect password.")
 
         if not password or not password == password2:
@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# Password hashing is made slow on purpose: a PBKDF2 check holds a CPU for
+# tens of milliseconds. Run in the request thread, a burst of logins keeps
+# every worker busy hashing while page views queue behind them. Hashes are
+# run in a small process pool instead, and a worker never lets more than
+# PASSWORD_HASHING_QUEUE_DEPTH of them wait at once: past that, logins and
+# password forms fail straight away asking the user to try again.
+
+RETRY_MESSAGE = "Too many people are signing in right now. Please try again in a few seconds."
+
+
+class HashingBusy(Exception):
+    """ Raised instead of queueing a hash when the queue is full. """
+    def __init__(self, message=RETRY_MESSAGE):
+        super().__init__(message)
+
+
+_lock = threading.Lock()
+_executor = None
+_queued = 0
+
+def _get_executor():
+    global _executor
+    if not settings.PASSWORD_HASHING_PROCESSES:
+        return None
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASHING_PROCESSES)
+    return _executor
+
+def run(func, *args):
+    """
+        Returns func(*args), run in the hashing pool, or in this thread if
+        PASSWORD_HASHING_PROCESSES is 0. Raises HashingBusy if
+        PASSWORD_HASHING_QUEUE_DEPTH hashes are already running or waiting.
+    """
+    global _queued
+    with _lock:
+        if _queued >= settings.PASSWORD_HASHING_QUEUE_DEPTH:
+            raise HashingBusy()
+        _queued += 1
+    try:
+        executor = _get_executor()
+        if executor is None:
+            return func(*args)
+        return executor.submit(func, *args).result()
+    finally:
+        with _lock:
+            _queued -= 1
+
+def make_password(raw_password):
+    """ hashers.make_password, in the pool. """
+    return run(hashers.make_password, raw_password)
+
+def set_password(user, raw_password):
+    """ user.set_password, in the pool. The user isn't saved. """
+    user.password = make_password(raw_password)
+    user._password = raw_password
+
+def check_password(user, raw_password):
+    """
+        user.check_password, in the pool. Like it, a correct password stored
+        with an outdated hasher or iteration count is rehashed and saved.
+    """
+    encoded = user.password
+    if not run(hashers.check_password, raw_password, encoded):
+        return False
+    preferred = hashers.get_hasher('default')
+    hasher = hashers.identify_hasher(encoded)
+    if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+        set_password(user, raw_password)
+        user._password = None
+        user.save(update_fields=['password'])
+    return True
@@ -0,0 +1,33 @@
+# Generated by Django 2.0.1 on 2026-10-18 14:15
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# gin_trgm_ops indexes on auth_user.username. The plain one serves trigram
+# similarity (username % 'x'); the UPPER() one serves the
+# UPPER(username) LIKE UPPER('%x%') that username__icontains compiles to.
+CREATE_INDEXES = """
+    CREATE INDEX auth_user_username_trgm
+        ON auth_user USING gin (username gin_trgm_ops);
+    CREATE INDEX auth_user_username_upper_trgm
+        ON auth_user USING gin (UPPER(username::text) gin_trgm_ops);
+"""
+
+DROP_INDEXES = """
+    DROP INDEX IF EXISTS auth_user_username_trgm;
+    DROP INDEX IF EXISTS auth_user_username_upper_trgm;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0009_alter_user_last_name_max_length'),
+        ('accounts', '0003_auto_20180127_1458'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(CREATE_INDEXES, reverse_sql=DROP_INDEXES),
+    ]
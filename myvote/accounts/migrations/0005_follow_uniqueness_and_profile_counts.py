@@ -0,0 +1,65 @@
+# Generated by Django 2.0.1 on 2026-10-18 08:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Keeps the oldest of each set of duplicate edges left by racing follows.
+DELETE_DUPLICATE_FOLLOWS = """
+    DELETE FROM accounts_followedusers duplicate
+    USING accounts_followedusers original
+    WHERE duplicate.follower_id = original.follower_id
+      AND duplicate.followed_id = original.followed_id
+      AND duplicate.id > original.id;
+"""
+
+COUNT_FOLLOWS = """
+    INSERT INTO accounts_userprofile (user_id, follower_count, following_count)
+    SELECT user_id, sum(followers), sum(following) FROM (
+        SELECT followed_id AS user_id, 1 AS followers, 0 AS following
+        FROM accounts_followedusers
+        UNION ALL
+        SELECT follower_id, 0, 1 FROM accounts_followedusers
+    ) edges
+    GROUP BY user_id;
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0009_alter_user_last_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0004_username_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DELETE_DUPLICATE_FOLLOWS, migrations.RunSQL.noop),
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('follower_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='followedusers',
+            name='followed',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='followers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='followedusers',
+            name='follower',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='followed', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='followedusers',
+            unique_together={('follower', 'followed')},
+        ),
+        migrations.AddIndex(
+            model_name='followedusers',
+            index=models.Index(fields=['followed', 'follower'], name='follow_followed_follower_idx'),
+        ),
+        migrations.RunSQL(COUNT_FOLLOWS, migrations.RunSQL.noop),
+    ]
@@ -2,9 +2,31 @@ from django.db import models
 from django.contrib.auth.models import User
 
 class FollowedUsers(models.Model):
-    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="followed")
-    followed = models.ForeignKey(User, on_delete=models.CASCADE, related_name="followers")
+    # Both columns are indexed by the composite indexes below.
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="followed",
+                                 db_index=False)
+    followed = models.ForeignKey(User, on_delete=models.CASCADE, related_name="followers",
+                                 db_index=False)
+
+    class Meta:
+        # One edge per pair, so concurrent follows can't duplicate it. The
+        # unique index also serves a user's followed list; the other index
+        # serves follower lists (stream fan out) with index-only scans.
+        unique_together = ('follower', 'followed')
+        indexes = [
+            models.Index(fields=['followed', 'follower'], name='follow_followed_follower_idx'),
+        ]
 
 class UserBio(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="bio")
     text = models.TextField()
+
+class UserProfile(models.Model):
+    """
+        Denormalized follow counts, kept up to date by accounts.follow_graph
+        with upserts. A user without a row has no follows either way.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name="profile")
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
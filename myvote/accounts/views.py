@@ -4,13 +4,19 @@ from django.contrib.auth import login as auth_login
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
+from django.http import JsonResponse, Http404
 
+from myvote.pagination import KeysetPaginator
+from myvote import page_cache, pollstream, rollups
+from myvote.query_budget import query_budget
+from myvote.views import trend_resolution, invalid_resolution
+from . import follow_graph
 from .forms import (SignUpForm, ChangePasswordForm,
                     ChangeEmailForm, DeleteAccountForm,
                     BioForm)
-from .models import FollowedUsers, UserBio
+from .models import UserBio
 
+@query_budget(12)
 def signup(request):
     if request.method == 'POST':
         form = SignUpForm(request.POST)
@@ -23,6 +29,7 @@ def signup(request):
         form = SignUpForm()
     return render(request, 'accounts/signup.html', {'form': form})
 
+@query_budget(10)
 @login_required
 def follow_user(request, user_id):
     if request.method == 'POST':
@@ -31,18 +38,18 @@ def follow_user(request, user_id):
             messages.warning(request, "You cannot follow yourself.")
             return redirect(next_url)
         try:
-            followed_user = User.objects.get(pk=user_id)
+            followed = follow_graph.follow(request.user.id, user_id)
         except User.DoesNotExist:
             messages.error(request, "This user does not exist.")
             return redirect('home')
-        try:
-            relationship = FollowedUsers.objects.get(follower=request.user, followed=followed_user)
-        except FollowedUsers.DoesNotExist:
-            relationship = FollowedUsers(follower=request.user, followed=followed_user)
-            relationship.save()
+        if followed:
+            page_cache.bump_version(page_cache.profile(request.user.id),
+                                    page_cache.profile(user_id))
+            pollstream.backfill(request.user.id, user_id)
         return redirect(next_url)
     return redirect('home')
 
+@query_budget(7)
 @login_required
 def unfollow_user(request, user_id):
     if request.method == 'POST':
@@ -50,15 +57,14 @@ def unfollow_user(request, user_id):
         if request.user.id == user_id:
             messages.warning(request, "You cannot unfollow yourself.")
             return redirect(next_url)
-        try:
-            relationship = FollowedUsers.objects.get(follower=request.user, followed_id=user_id)
-            relationship.delete()
-        except Exception as e:
-            # TODO: implement logging
-            print(e)
+        if follow_graph.unfollow(request.user.id, user_id):
+            page_cache.bump_version(page_cache.profile(request.user.id),
+                                    page_cache.profile(user_id))
+            pollstream.prune(request.user.id, user_id)
         return redirect(next_url)
 
 
+@query_budget(3)
 @login_required
 def account_settings(request):
     """
@@ -67,6 +73,14 @@ def account_settings(request):
     if request.user.is_authenticated:
         return render(request, 'accounts/account_settings.html')
 
+def _profile_etag(request, user_id):
+    return 'profile-%s-%s' % (user_id, page_cache.get_version(page_cache.profile(user_id)))
+
+def _profile_last_modified(request, user_id):
+    return page_cache.version_datetime(page_cache.get_version(page_cache.profile(user_id)))
+
+@query_budget(7)
+@page_cache.anonymous_page(_profile_etag, _profile_last_modified)
 def view_profile(request, user_id):
     """
         Display the profile page for a user. Includes username, recent polls.
@@ -81,8 +95,9 @@ def view_profile(request, user_id):
                             - 'Self' (request.user is viewing own profile)
                             - True (request.user is already following view_user)
                             - False (request.user is NOT following view_user)
-            -  poll_list = a query_set of Poll objects, ordered by posted date
+            -  poll_list = a KeysetPage of Poll objects, ordered by posted date
                            descending.
+            -  follower_count, following_count = view_user's follow counts.
     """
     if not user_id:
         return redirect('home')
@@ -91,26 +106,46 @@ def view_profile(request, user_id):
         if request.user.is_authenticated and request.user.id == user_id:
             view_user = request.user
             followed = "Self"
-        elif request.user.is_authenticated:
-            try:
-                view_user = request.user.followed.get(followed_id=user_id).followed
-                followed = True
-            except Exception as e:
-                view_user = get_object_or_404(User, pk=user_id)
-                followed = False
         else:
-            view_user = get_object_or_404(User, pk=user_id)
-            followed = None
-
-        poll_list_query = view_user.polls.order_by('-datetime')
-        paginator = Paginator(poll_list_query, 10)
-        page = request.GET.get('page')
-        poll_list = paginator.get_page(page)
-
+            view_user = get_object_or_404(User.objects.select_related('bio', 'profile'), pk=user_id)
+            if request.user.is_authenticated:
+                followed = follow_graph.is_following(request.user.id, user_id)
+            else:
+                followed = None
+
+        poll_list_query = view_user.polls.select_related('owner')
+        paginator = KeysetPaginator(poll_list_query, 10)
+        poll_list = paginator.get_page(after=request.GET.get('after'),
+                                       before=request.GET.get('before'))
+
+        follower_count, following_count = follow_graph.follow_counts(view_user)
         return render(request, 'accounts/view_profile.html',
                       {'view_user': view_user, 'followed': followed,
-                       'poll_list': poll_list})
+                       'poll_list': poll_list,
+                       'follower_count': follower_count,
+                       'following_count': following_count})
 
+@query_budget(3)
+def profile_trend(request, user_id):
+    """
+        The votes on all of a user's polls over time, for the trend chart on
+        their profile. Responds with JSON of the form
+            {"resolution": "hour", "buckets": [{"time": bucket start, "count": count}, ...]}
+        See myvote.views.poll_trend for ?resolution=.
+    """
+    resolution = trend_resolution(request)
+    if resolution is None:
+        return invalid_resolution()
+    trend = rollups.get_owner_trend(user_id, resolution)
+    # Only an empty trend could belong to a user who doesn't exist.
+    if not trend and not User.objects.filter(pk=user_id).exists():
+        raise Http404('No User matches the given query.')
+    return JsonResponse({
+        'resolution': resolution,
+        'buckets': [{'time': time, 'count': count} for time, count in trend],
+    })
+
+@query_budget(5)
 @login_required
 def edit_bio(request):
     """
@@ -128,12 +163,14 @@ def edit_bio(request):
             except AttributeError:
                 bio = UserBio(user=request.user, text=bio_text)
                 bio.save()
+            page_cache.bump_version(page_cache.profile(request.user.id))
             return redirect(reverse('account:view profile', args=(request.user.id,)))
     else:
         form = BioForm(initial={'bio_text':request.user.bio.text})
     return render(request, 'accounts/edit_bio.html', {'form': form})
 
 
+@query_budget(4)
 @login_required
 def change_password(request):
     if request.method == 'GET':
@@ -143,13 +180,13 @@ def change_password(request):
     form = ChangePasswordForm(data=request.POST, user=request.user)
     if request.method == 'POST':
         if form.is_valid():
-            request.user.set_password(form.cleaned_data['new_password'])
-            request.user.save()
+            form.save()
             messages.add_message(request, messages.SUCCESS, "Password successfully changed. Please login with your new password.")
             return redirect('account:overview')
 
     return render(request, 'accounts/change_password.html', {'form': form})
 
+@query_budget(4)
 @login_required
 def change_email(request):
     if request.method == 'GET':
@@ -166,6 +203,7 @@ def change_email(request):
             return redirect('account:overview')
     return render(request, 'accounts/change_email.html', {'form': form})
 
+@query_budget(26)
 @login_required
 def delete_account(request):
     if request.method == 'GET':
@@ -178,7 +216,8 @@ def delete_account(request):
         if form.is_valid():
             try:
                 user = User.objects.get(pk=request.user.id)
-                user.delete()
+                follow_graph.delete_user(user)
+                page_cache.bump_version(page_cache.POLLS, page_cache.profile(request.user.id))
                 messages.success(request, 'Your profile has been deleted.')
             except User.DoesNotExist:
                 messages.error(request, "This user does not exist.")
@@ -0,0 +1,425 @@
+"""
+    End-to-end benchmark of every MyVote route. Each scenario drives one URL
+    through the Django test client against a seeded database and records its
+    latency and the number of SQL queries it ran. Results are plain dicts so
+    they can be written to JSON and diffed between runs. See the benchmark
+    management command.
+"""
+import datetime
+import json
+import math
+import platform
+import threading
+import time
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Count
+from django.shortcuts import resolve_url
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts import follow_graph, hashing
+from accounts.models import FollowedUsers, UserBio
+from .models import Poll, Option, Vote, PollStreamEntry
+from .query_budget import QueryRecorder
+
+BENCH_PREFIX = 'bench_'
+BENCH_PASSWORD = 'benchpassword12'
+PERCENTILES = (50, 95, 99)
+# Polls per request of the batch creation scenario.
+BATCH_POLLS = 100
+# Scenarios timed while the login storm runs.
+STORM_READS = ('view_poll', 'explore_polls', 'home')
+
+
+class Fixture:
+    """
+        The users and rows the scenarios act on. Creates a fresh benchmark
+        user, following the most prolific authors, and removes whatever a
+        previous run left behind so repeated runs start from the same state.
+    """
+    def __init__(self, iterations):
+        for user in User.objects.filter(username__startswith=BENCH_PREFIX):
+            follow_graph.delete_user(user)
+        self.password_hash = make_password(BENCH_PASSWORD)
+        self.user = self.create_user('user')
+        UserBio.objects.create(user=self.user, text='Benchmark user')
+
+        authors = (Poll.objects.order_by().values('owner_id')
+                               .annotate(polls=Count('id'))
+                               .order_by('-polls', 'owner_id')
+                               .values_list('owner_id', flat=True))
+        self.authors = list(authors[:iterations + 10])
+        # Followed up front; the follow scenario works through the rest.
+        self.unfollowed = self.authors[10:] or self.authors
+        for author_id in self.authors[:10]:
+            follow_graph.follow(self.user.id, author_id)
+        PollStreamEntry.objects.bulk_create(
+            PollStreamEntry(user=self.user, poll_id=poll_id, author_id=owner_id, datetime=poll_datetime)
+            for poll_id, owner_id, poll_datetime in
+            Poll.objects.filter(owner_id__in=self.authors[:10], fanned_out=True)
+                        .values_list('id', 'owner_id', 'datetime')[:1000])
+
+        self.poll = Poll.objects.order_by('-vote_count', 'id').first()
+        self.votable = list(Option.objects.exclude(poll__owner=self.user)
+                                          .order_by('-poll_id')
+                                          .values_list('poll_id', 'id')
+                                          .distinct('poll_id')[:max(iterations, 1)])
+        self.search_term = self.poll.name.split()[0]
+
+    def create_user(self, name):
+        username = BENCH_PREFIX + name
+        return User.objects.create(username=username, email=username + '@example.com',
+                                   password=self.password_hash)
+
+    def create_poll(self, name):
+        poll = Poll.objects.create(name=name, description='Benchmark poll', owner=self.user)
+        Option.objects.bulk_create([Option(option_text='yes', poll=poll),
+                                    Option(option_text='no', poll=poll)])
+        return poll
+
+
+class Scenario:
+    """
+        One request to benchmark. prepare(client, fixture, i) does any
+        untimed setup for the i-th request (logging in, creating the row it
+        deletes) and returns (method, path, data) for the request to time.
+        Method 'post_json' posts data as a JSON body.
+    """
+    def __init__(self, name, url_name, prepare):
+        self.name = name
+        self.url_name = url_name
+        self.prepare = prepare
+
+
+def _logged_in(client, fixture):
+    # The password scenario changes the stored hash, which the session
+    # is checked against.
+    fixture.user.refresh_from_db()
+    client.force_login(fixture.user)
+
+def _get(url_name, anonymous=False, query=None, **kwargs):
+    def prepare(client, fixture, i):
+        if anonymous:
+            client.logout()
+        else:
+            _logged_in(client, fixture)
+        args = {key: value(fixture, i) for key, value in kwargs.items()}
+        data = query(fixture, i) if query else None
+        return 'get', reverse(url_name, kwargs=args), data
+    return prepare
+
+def _post(url_name, data, anonymous=False, **kwargs):
+    def prepare(client, fixture, i):
+        if anonymous:
+            client.logout()
+        else:
+            _logged_in(client, fixture)
+        args = {key: value(fixture, i) for key, value in kwargs.items()}
+        return 'post', reverse(url_name, kwargs=args), data(fixture, i)
+    return prepare
+
+def _create_polls_batch(client, fixture, i):
+    _logged_in(client, fixture)
+    batch = [{'name': '%sbatch_%s_%s' % (BENCH_PREFIX, i, n), 'description': 'Benchmark poll',
+              'options': ['yes', 'no', 'maybe']}
+             for n in range(BATCH_POLLS)]
+    return 'post_json', reverse('create polls batch'), batch
+
+def _vote(client, fixture, i):
+    _logged_in(client, fixture)
+    poll_id, option_id = fixture.votable[i % len(fixture.votable)]
+    return 'get', reverse('vote poll', kwargs={'poll_id': poll_id, 'option_id': option_id}), None
+
+def _delete_poll(client, fixture, i):
+    _logged_in(client, fixture)
+    poll = fixture.create_poll('%sdelete_%s' % (BENCH_PREFIX, i))
+    return 'post', reverse('delete poll', kwargs={'poll_id': poll.id}), None
+
+def _change_password(client, fixture, i):
+    # Changing the password ends the session, so log in again every time.
+    _logged_in(client, fixture)
+    data = {'old_password': BENCH_PASSWORD, 'new_password': BENCH_PASSWORD,
+            'new_password2': BENCH_PASSWORD}
+    return 'post', reverse('account:change password'), data
+
+def _delete_account(client, fixture, i):
+    client.force_login(fixture.create_user('delete_%s' % i))
+    data = {'password': BENCH_PASSWORD, 'password2': BENCH_PASSWORD}
+    return 'post', reverse('account:delete account'), data
+
+def _logout(client, fixture, i):
+    _logged_in(client, fixture)
+    return 'get', reverse('account:logout'), None
+
+_poll_id = lambda fixture, i: fixture.poll.id
+_own_poll_id = lambda fixture, i: fixture.create_poll('%sview_%s' % (BENCH_PREFIX, i)).id
+_user_id = lambda fixture, i: fixture.user.id
+_author_id = lambda fixture, i: fixture.authors[i % len(fixture.authors)]
+_unfollowed_id = lambda fixture, i: fixture.unfollowed[i % len(fixture.unfollowed)]
+_search = lambda fixture, i: {'search_val': fixture.search_term}
+
+SCENARIOS = [
+    # myvote/urls.py
+    Scenario('home', 'home', _get('home')),
+    Scenario('home_anonymous', 'home', _get('home', anonymous=True)),
+    Scenario('explore_polls', 'explore polls', _get('explore polls')),
+    Scenario('explore_trending', 'explore polls', _get('explore polls', query=lambda fixture, i: {'sort': 'trending'})),
+    Scenario('explore_top', 'explore polls', _get('explore polls', query=lambda fixture, i: {'sort': 'top'})),
+    Scenario('explore_recent_polls', 'explore recent polls',
+             _get('explore recent polls', user_id=_author_id)),
+    Scenario('create_poll_form', 'create poll', _get('create poll')),
+    Scenario('create_poll', 'create poll',
+             _post('create poll', lambda fixture, i: {'name': '%screate_%s' % (BENCH_PREFIX, i),
+                                                      'description': 'Benchmark poll',
+                                                      'option1': 'yes', 'option2': 'no'})),
+    Scenario('create_polls_batch', 'create polls batch', _create_polls_batch),
+    Scenario('view_poll', 'view poll', _get('view poll', poll_id=_poll_id)),
+    Scenario('poll_trend', 'poll trend', _get('poll trend', anonymous=True, poll_id=_poll_id)),
+    Scenario('poll_results_stream', 'poll results stream',
+             _get('poll results stream', anonymous=True, poll_id=_poll_id)),
+    Scenario('view_poll_anonymous', 'view poll', _get('view poll', anonymous=True, poll_id=_poll_id)),
+    Scenario('vote_poll', 'vote poll', _vote),
+    Scenario('delete_poll_form', 'delete poll', _get('delete poll', poll_id=_own_poll_id)),
+    Scenario('delete_poll', 'delete poll', _delete_poll),
+    Scenario('search', 'search', _get('search', query=_search)),
+    Scenario('search_users', 'search users',
+             _get('search users', query=lambda fixture, i: {'search_val': 'user_1'})),
+    Scenario('search_polls', 'search polls', _get('search polls', query=_search)),
+    # accounts/urls.py
+    Scenario('account_overview', 'account:overview', _get('account:overview')),
+    Scenario('view_profile', 'account:view profile', _get('account:view profile', user_id=_author_id)),
+    Scenario('profile_trend', 'account:profile trend',
+             _get('account:profile trend', anonymous=True, user_id=_author_id)),
+    Scenario('view_own_profile', 'account:view profile', _get('account:view profile', user_id=_user_id)),
+    Scenario('follow_user', 'account:follow user',
+             _post('account:follow user', lambda fixture, i: {}, user_id=_unfollowed_id)),
+    Scenario('unfollow_user', 'account:unfollow user',
+             _post('account:unfollow user', lambda fixture, i: {}, user_id=_unfollowed_id)),
+    Scenario('signup_form', 'account:signup', _get('account:signup', anonymous=True)),
+    Scenario('signup', 'account:signup',
+             _post('account:signup', lambda fixture, i: {'username': '%ssignup_%s' % (BENCH_PREFIX, i),
+                                                         'email': 'signup_%s@example.com' % i,
+                                                         'password1': BENCH_PASSWORD,
+                                                         'password2': BENCH_PASSWORD},
+                   anonymous=True)),
+    Scenario('login_form', 'account:login', _get('account:login', anonymous=True)),
+    Scenario('login', 'account:login',
+             _post('account:login', lambda fixture, i: {'username': fixture.user.username,
+                                                        'password': BENCH_PASSWORD},
+                   anonymous=True)),
+    Scenario('logout', 'account:logout', _logout),
+    Scenario('edit_bio_form', 'account:edit bio', _get('account:edit bio')),
+    Scenario('edit_bio', 'account:edit bio',
+             _post('account:edit bio', lambda fixture, i: {'bio_text': 'Benchmark bio %s' % i})),
+    Scenario('change_password_form', 'account:change password', _get('account:change password')),
+    Scenario('change_password', 'account:change password', _change_password),
+    Scenario('change_email_form', 'account:change email', _get('account:change email')),
+    Scenario('change_email', 'account:change email',
+             _post('account:change email', lambda fixture, i: {'password': BENCH_PASSWORD,
+                                                               'new_email': 'bench%s@example.com' % i,
+                                                               'new_email2': 'bench%s@example.com' % i})),
+    Scenario('delete_account_form', 'account:delete account', _get('account:delete account')),
+    Scenario('delete_account', 'account:delete account', _delete_account),
+]
+
+
+def percentile(values, pct):
+    """ Nearest-rank percentile of an already sorted list. """
+    if not values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(values)))
+    return values[rank - 1]
+
+
+def run_scenario(scenario, fixture, iterations, warmup=0):
+    """
+        Times iterations requests of one scenario, after warmup untimed ones,
+        and returns its summary. A request answered with anything but a 200,
+        201 or a redirect counts as an error, as does a redirect to the login
+        page.
+    """
+    client = Client()
+    login_url = resolve_url(settings.LOGIN_URL)
+    latencies = []
+    queries = []
+    errors = 0
+    for i in range(warmup + iterations):
+        method, path, data = scenario.prepare(client, fixture, i)
+        recorder = QueryRecorder()
+        with recorder.record():
+            start = time.perf_counter()
+            if method == 'post_json':
+                response = client.post(path, json.dumps(data), content_type='application/json')
+            else:
+                response = getattr(client, method)(path, data)
+            if response.streaming:
+                # Streams are cut short after their first event; see run().
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if i < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+        queries.append(len(recorder))
+        if (response.status_code not in (200, 201, 302) or
+                response.get('Location', '').startswith(login_url)):
+            errors += 1
+    return summarize(scenario, latencies, queries, errors)
+
+
+def summarize(scenario, latencies, queries, errors):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    result = {
+        'url_name': scenario.url_name,
+        'requests': len(latencies),
+        'errors': errors,
+        'mean_ms': total / len(latencies) if latencies else None,
+        'max_ms': latencies[-1] if latencies else None,
+        'queries_per_request': sum(queries) / len(queries) if queries else None,
+        'max_queries': max(queries) if queries else None,
+        # One client issuing requests back to back.
+        'throughput_rps': len(latencies) / (total / 1000) if total else None,
+    }
+    for pct in PERCENTILES:
+        result['p%s_ms' % pct] = percentile(latencies, pct)
+    return result
+
+
+def run(iterations, warmup=0, names=None, stdout=None):
+    """
+        Runs every scenario, or those named in names, and returns the results
+        keyed by scenario name. Live result streams end right after their
+        first event, so they are timed to the first event.
+    """
+    fixture = Fixture(iterations + warmup)
+    results = {}
+    with override_settings(LIVE_STREAM_MAX_SECONDS=0):
+        for scenario in SCENARIOS:
+            if names and scenario.name not in names:
+                continue
+            results[scenario.name] = run_scenario(scenario, fixture, iterations, warmup)
+            if stdout:
+                stdout.write(format_result(scenario.name, results[scenario.name]))
+    return results
+
+
+def _storm_logins(fixture, stop, outcomes):
+    """
+        Posts logins back to back until stop is set, appending 'login',
+        'busy' (turned away by a full hashing queue) or 'error' to outcomes.
+    """
+    url = reverse('account:login')
+    data = {'username': fixture.user.username, 'password': BENCH_PASSWORD}
+    try:
+        while not stop.is_set():
+            response = Client().post(url, data)
+            if response.status_code == 302:
+                outcomes.append('login')
+            elif hashing.RETRY_MESSAGE in response.content.decode():
+                outcomes.append('busy')
+            else:
+                outcomes.append('error')
+    finally:
+        connections.close_all()
+
+
+def login_storm(iterations, warmup=0, threads=8, stdout=None):
+    """
+        Times the STORM_READS scenarios on their own, then again while
+        threads clients post logins as fast as they can. Password hashes run
+        in the hashing pool (see accounts.hashing), so read latency during
+        the storm should stay close to its baseline. Returns the results
+        keyed by scenario name, each with 'baseline' and 'storm' summaries,
+        and the storm's login outcomes under 'logins'.
+    """
+    fixture = Fixture(iterations + warmup)
+    scenarios = [scenario for scenario in SCENARIOS if scenario.name in STORM_READS]
+    results = {scenario.name: {'baseline': run_scenario(scenario, fixture, iterations, warmup)}
+               for scenario in scenarios}
+
+    stop = threading.Event()
+    outcomes = []
+    storm = [threading.Thread(target=_storm_logins, args=(fixture, stop, outcomes),
+                              name='login-storm', daemon=True)
+             for _ in range(threads)]
+    for thread in storm:
+        thread.start()
+    try:
+        for scenario in scenarios:
+            results[scenario.name]['storm'] = run_scenario(scenario, fixture, iterations, warmup)
+    finally:
+        stop.set()
+        for thread in storm:
+            thread.join()
+    results['logins'] = dict(Counter(outcomes))
+
+    if stdout:
+        for scenario in scenarios:
+            stdout.write(format_storm_result(scenario.name, results[scenario.name]))
+        stdout.write('logins during the storm: %s' % ', '.join(
+            '%s %s' % (count, outcome) for outcome, count in sorted(results['logins'].items())))
+    return results
+
+
+def metadata(scale, votes, seed):
+    return {
+        'scale': scale,
+        'votes': votes,
+        'seed': seed,
+        'counts': {
+            'users': User.objects.count(),
+            'polls': Poll.objects.count(),
+            'votes': Vote.objects.count(),
+            'follows': FollowedUsers.objects.count(),
+        },
+        'started': datetime.datetime.utcnow().isoformat() + 'Z',
+        'debug': settings.DEBUG,
+        'cache_backend': settings.CACHES['default']['BACKEND'],
+        'vote_ingestion_mode': settings.VOTE_INGESTION_MODE,
+        'password_hashing_processes': settings.PASSWORD_HASHING_PROCESSES,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+    }
+
+
+def format_result(name, result):
+    return '{0:<24} p50 {1:8.2f}ms  p95 {2:8.2f}ms  p99 {3:8.2f}ms  {4:6.1f} queries  {5:7.1f} req/s{6}'.format(
+        name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+        result['queries_per_request'], result['throughput_rps'],
+        '  %s errors' % result['errors'] if result['errors'] else '')
+
+
+def format_storm_result(name, result):
+    baseline, storm = result['baseline'], result['storm']
+    return '{0:<24} p95 {1:8.2f}ms alone  {2:8.2f}ms during the login storm'.format(
+        name, baseline['p95_ms'], storm['p95_ms'])
+
+
+def compare(baseline, current, threshold=10.0):
+    """
+        Compares two benchmark reports. Returns (lines, regressions): a line
+        per scenario present in both, and the names of the scenarios whose p95
+        latency grew by more than threshold percent or that now run more
+        queries per request.
+    """
+    lines = []
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        queries = result['queries_per_request'] - before['queries_per_request']
+        regressed = change > threshold or queries > 0
+        if regressed:
+            regressions.append(name)
+        lines.append('{0:<24} p95 {1:8.2f}ms -> {2:8.2f}ms ({3:+6.1f}%)  queries {4:+.1f}{5}'.format(
+            name, before['p95_ms'], result['p95_ms'], change, queries,
+            '  REGRESSION' if regressed else ''))
+    return lines, regressions
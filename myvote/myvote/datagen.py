@@ -0,0 +1,308 @@
+"""
+    Synthetic data for development and benchmarking. Generates users,
+    polls, options, votes and follow edges at any scale and streams them into
+    Postgres with COPY. The output is deterministic for a given seed and end
+    date.
+
+    Distributions:
+        -  poll popularity is Zipfian: the poll ranked r gets votes in
+           proportion to 1 / r ** poll_exponent.
+        -  users are ranked the same way, once by popularity and once by
+           activity. Follows are drawn in proportion to
+           1 / popularity ** user_exponent, which gives a power-law follower
+           count, and poll authorship in proportion to
+           1 / activity ** user_exponent. Keeping the two rankings independent
+           stops the most followed users from also writing most of the polls,
+           which would inflate the PollStreams far beyond realistic sizes.
+
+    Rows are written with explicit primary keys following the current
+    maximum, so the generator must not run alongside other writers.
+"""
+import bisect
+import datetime
+import io
+import itertools
+import random
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import FollowedUsers, UserProfile
+from .models import Poll, Option, Vote
+from . import page_cache, rollups, trending
+
+# Dataset sizes, by number of votes. See dataset_size().
+SCALES = {
+    'small': 1000,
+    'medium': 100000,
+    'large': 10000000,
+}
+
+DEFAULT_PASSWORD = 'password12'
+COPY_CHUNK_SIZE = 50000
+
+
+def dataset_size(votes):
+    """
+        Returns generate() keyword arguments for a dataset of roughly the
+        given number of votes.
+    """
+    return {
+        'users': max(50, votes // 20),
+        'polls': max(100, votes // 10),
+        'votes': votes,
+        'follows': 10,
+    }
+
+
+def zipf_weights(count, exponent):
+    """ Cumulative weights of ranks 1..count under Zipf's law. """
+    return list(itertools.accumulate(1.0 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+                      .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(table, columns, rows):
+    """
+        Streams rows into table with COPY, COPY_CHUNK_SIZE rows at a time.
+        Returns the number of rows written.
+    """
+    sql = 'COPY %s (%s) FROM STDIN' % (table, ', '.join(columns))
+    written = 0
+    with connection.cursor() as cursor:
+        while True:
+            chunk = list(itertools.islice(rows, COPY_CHUNK_SIZE))
+            if not chunk:
+                return written
+            buf = io.StringIO()
+            for row in chunk:
+                buf.write('\t'.join(copy_value(value) for value in row))
+                buf.write('\n')
+            buf.seek(0)
+            cursor.copy_expert(sql, buf)
+            written += len(chunk)
+
+
+def next_id(model):
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+class Generator:
+    """
+        Generates one dataset. See generate().
+    """
+    def __init__(self, users, polls, votes, follows, seed, poll_exponent,
+                 user_exponent, days, end, password):
+        self.rng = random.Random(seed)
+        self.user_count = users
+        self.poll_count = polls
+        self.vote_count = votes
+        self.follows = follows
+        self.poll_exponent = poll_exponent
+        self.user_exponent = user_exponent
+        self.end = end or timezone.now()
+        self.start = self.end - datetime.timedelta(days=days)
+        self.password = password
+
+        self.first_user = next_id(User)
+        self.first_poll = next_id(Poll)
+        self.first_option = next_id(Option)
+        # popularity[rank] and activity[rank] are user indexes. Follows
+        # are drawn by popularity rank, poll authors by activity rank.
+        self.popularity = list(range(users))
+        self.rng.shuffle(self.popularity)
+        self.activity = list(range(users))
+        self.rng.shuffle(self.activity)
+        self.user_weights = zipf_weights(users, user_exponent)
+        self.follower_counts = array('l', [0]) * users
+        self.following_counts = array('l', [0]) * users
+        # (first option index, number of options) of every poll, and the
+        # number of votes of every option.
+        self.poll_options = []
+        self.option_votes = array('l')
+
+    def user_by_rank(self, ranking):
+        rank = bisect.bisect(self.user_weights, self.rng.random() * self.user_weights[-1])
+        return ranking[min(rank, self.user_count - 1)]
+
+    def user_rows(self):
+        # One hash for everyone: hashing is deliberately slow.
+        password = make_password(self.password)
+        for index in range(self.user_count):
+            user_id = self.first_user + index
+            yield (user_id, password, None, False, 'user_%s' % user_id, '', '',
+                   'user_%s@example.com' % user_id, False, True, self.start)
+
+    def follow_rows(self):
+        if self.follows <= 0:
+            return
+        for follower in range(self.user_count):
+            wanted = min(self.user_count - 1, int(self.rng.expovariate(1.0 / self.follows)))
+            followed = set()
+            # Bounded so a small user count can't loop forever.
+            for _ in range(wanted * 3):
+                if len(followed) >= wanted:
+                    break
+                user = self.user_by_rank(self.popularity)
+                if user != follower:
+                    followed.add(user)
+            self.following_counts[follower] = len(followed)
+            for user in sorted(followed):
+                self.follower_counts[user] += 1
+                yield (self.first_user + follower, self.first_user + user)
+
+    def profile_rows(self):
+        for user in range(self.user_count):
+            if self.follower_counts[user] or self.following_counts[user]:
+                yield (self.first_user + user, self.follower_counts[user],
+                       self.following_counts[user])
+
+    def poll_vote_counts(self):
+        """
+            Votes per poll in poll order: a Zipf share of the total, assigned
+            to polls in random rank order. A poll can't get more votes than
+            there are users, so shares are handed out from the top rank down,
+            each from what is left, and a capped poll's excess goes to the
+            polls below it.
+        """
+        weights = [1.0 / rank ** self.poll_exponent for rank in range(1, self.poll_count + 1)]
+        remaining_votes = self.vote_count
+        remaining_weight = sum(weights)
+        shares = []
+        for weight in weights:
+            share = min(self.user_count, int(round(remaining_votes * weight / remaining_weight)))
+            shares.append(share)
+            remaining_votes -= share
+            remaining_weight -= weight
+        self.rng.shuffle(shares)
+        return shares
+
+    def poll_rows(self):
+        span = (self.end - self.start).total_seconds()
+        offsets = sorted(self.rng.random() * span for _ in range(self.poll_count))
+        limit = settings.POLLSTREAM_FANOUT_LIMIT
+        option_index = 0
+        for index, (offset, votes) in enumerate(zip(offsets, self.poll_vote_counts())):
+            owner = self.user_by_rank(self.activity)
+            options = self.rng.randint(2, 4)
+            weights = [self.rng.random() for _ in range(options)]
+            counts = Counter(self.rng.choices(range(options), weights, k=votes))
+            self.option_votes.extend(counts[n] for n in range(options))
+            self.poll_options.append((option_index, options))
+            option_index += options
+            poll_id = self.first_poll + index
+            yield (poll_id, 'Poll %s' % poll_id, self.first_user + owner,
+                   self.start + datetime.timedelta(seconds=offset),
+                   'Generated poll number %s' % poll_id, votes,
+                   self.follower_counts[owner] <= limit, 1, 0.0, False)
+
+    def option_rows(self):
+        for index, (first, options) in enumerate(self.poll_options):
+            for n in range(options):
+                option_id = self.first_option + first + n
+                yield (option_id, 'Option %s' % (n + 1), self.first_poll + index,
+                       self.option_votes[first + n])
+
+    def vote_rows(self, poll_datetimes):
+        for index, (first, options) in enumerate(self.poll_options):
+            votes = sum(self.option_votes[first:first + options])
+            voters = iter(self.rng.sample(range(self.user_count), votes))
+            opened = poll_datetimes[index]
+            window = (self.end - opened).total_seconds()
+            for n in range(options):
+                for _ in range(self.option_votes[first + n]):
+                    voted = opened + datetime.timedelta(seconds=self.rng.random() * window)
+                    yield (self.first_option + first + n, self.first_user + next(voters),
+                           self.first_poll + index, voted)
+
+
+def generate(users, polls, votes, follows=10, seed=0, poll_exponent=1.1,
+             user_exponent=1.0, days=365, end=None, password=DEFAULT_PASSWORD,
+             stdout=None):
+    """
+        Generates users, their follow edges, polls with 2-4 options each and
+        roughly votes votes, all in one transaction. Vote tallies are written
+        with the rows, and followers' PollStreams, the vote rollups and the
+        trending scores are filled in. Poll datetimes
+        are spread over the days before end (default now). Returns the number
+        of rows written per table.
+    """
+    generator = Generator(users, polls, votes, follows, seed, poll_exponent,
+                          user_exponent, days, end, password)
+
+    def log(message):
+        if stdout:
+            stdout.write(message)
+
+    written = {}
+    with transaction.atomic():
+        written['users'] = copy_rows(
+            User._meta.db_table,
+            ['id', 'password', 'last_login', 'is_superuser', 'username', 'first_name',
+             'last_name', 'email', 'is_staff', 'is_active', 'date_joined'],
+            generator.user_rows())
+        log('{0} users.'.format(written['users']))
+        written['follows'] = copy_rows(FollowedUsers._meta.db_table, ['follower_id', 'followed_id'],
+                                       generator.follow_rows())
+        log('{0} follows.'.format(written['follows']))
+        copy_rows(UserProfile._meta.db_table, ['user_id', 'follower_count', 'following_count'],
+                  generator.profile_rows())
+
+        poll_datetimes = []
+        def polls_and_datetimes():
+            for row in generator.poll_rows():
+                poll_datetimes.append(row[3])
+                yield row
+        written['polls'] = copy_rows(
+            Poll._meta.db_table,
+            ['id', 'name', 'owner_id', 'datetime', 'description', 'vote_count', 'fanned_out',
+             'revision', 'trending_score', 'is_deleted'],
+            polls_and_datetimes())
+        log('{0} polls.'.format(written['polls']))
+        written['options'] = copy_rows(Option._meta.db_table,
+                                       ['id', 'option_text', 'poll_id', 'vote_count'],
+                                       generator.option_rows())
+        log('{0} options.'.format(written['options']))
+        written['votes'] = copy_rows(Vote._meta.db_table,
+                                     ['option_id', 'owner_id', 'poll_id', 'datetime'],
+                                     generator.vote_rows(poll_datetimes))
+        log('{0} votes.'.format(written['votes']))
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Poll, Option]):
+                cursor.execute(sql)
+            cursor.execute("""
+                INSERT INTO myvote_pollstreamentry (user_id, poll_id, author_id, datetime)
+                SELECT DISTINCT f.follower_id, p.id, p.owner_id, p.datetime
+                FROM accounts_followedusers f
+                JOIN myvote_poll p ON p.owner_id = f.followed_id
+                WHERE p.fanned_out AND p.id >= %s
+            """, [generator.first_poll])
+            written['stream entries'] = cursor.rowcount
+        log('{0} stream entries.'.format(written['stream entries']))
+        new_polls = range(generator.first_poll, generator.first_poll + written['polls'])
+        rollups.rebuild(new_polls)
+        trending.recompute(new_polls)
+        log('Vote rollups and trending scores rebuilt.')
+    # Only new users and their polls were added, so existing profiles are
+    # unchanged; the explore page is not.
+    page_cache.bump_version(page_cache.POLLS)
+    return written
@@ -0,0 +1,145 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+# Set on responses to requests that wrote. While it lasts the client reads
+# from the primary, so it sees its own vote, poll or follow even if the
+# replicas haven't caught up yet.
+PIN_COOKIE = 'primary_pin'
+
+# Whether the current thread's reads go to the primary. Request state,
+# set by ReplicaPinMiddleware; other threads read from the replicas.
+_state = threading.local()
+
+# Replica alias -> time.monotonic() until which it is skipped, after a
+# failed connection. Shared by every thread of the process.
+_down_until = {}
+
+
+def reads_primary():
+    """
+        True if reads on this thread must go to the primary: the request is
+        pinned, or a transaction is open on the primary and should see its
+        own writes.
+    """
+    return getattr(_state, 'primary', False) or connections[PRIMARY].in_atomic_block
+
+def pin_to_primary():
+    """ Sends the rest of the current request's reads to the primary. """
+    _state.primary = True
+
+@contextmanager
+def use_primary():
+    """ Sends reads inside the block to the primary. """
+    previous = getattr(_state, 'primary', False)
+    _state.primary = True
+    try:
+        yield
+    finally:
+        _state.primary = previous
+
+def writes(view_func):
+    """
+        Marks a view that writes though it's called with GET, so its reads go
+        to the primary and the client is pinned to it afterwards. Views only
+        answering POST are treated that way already.
+    """
+    @wraps(view_func)
+    def inner(request, *args, **kwargs):
+        request._db_writes = True
+        pin_to_primary()
+        return view_func(request, *args, **kwargs)
+    return inner
+
+
+def _usable(alias):
+    """
+        Connects to a replica if this thread hasn't yet, and checks a
+        persistent connection with a trivial query at most every
+        DB_HEALTH_CHECK_INTERVAL seconds. On failure the replica is skipped
+        by every thread for REPLICA_RETRY_SECONDS.
+    """
+    connection = connections[alias]
+    now = time.monotonic()
+    try:
+        if connection.connection is None:
+            connection.ensure_connection()
+            connection.health_checked_at = now
+        elif now - getattr(connection, 'health_checked_at', 0) > settings.DB_HEALTH_CHECK_INTERVAL:
+            if not connection.is_usable():
+                connection.close()
+                connection.ensure_connection()
+            connection.health_checked_at = now
+        return True
+    except DatabaseError:
+        logger.warning("Read replica %s is unreachable, reading from the primary for %ss.",
+                       alias, settings.REPLICA_RETRY_SECONDS, exc_info=True)
+        _down_until[alias] = now + settings.REPLICA_RETRY_SECONDS
+        connection.close()
+        return False
+
+def choose_replica():
+    """ Returns a reachable replica alias, or None if there is none. """
+    now = time.monotonic()
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if _down_until.get(alias, 0) <= now]
+    random.shuffle(replicas)
+    for alias in replicas:
+        if _usable(alias):
+            return alias
+    return None
+
+
+class ReplicaRouter:
+    """
+        Sends every write to the primary and reads to a random reachable
+        replica in DATABASE_REPLICAS, unless reads_primary() says otherwise.
+        Replicas are streaming copies of the primary, so migrations only run
+        on the primary.
+    """
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or reads_primary():
+            return PRIMARY
+        return choose_replica() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaPinMiddleware:
+    """
+        Sends the reads of requests that write, or that come from a client
+        that wrote in the last REPLICA_PIN_SECONDS, to the primary. Requests
+        write if they aren't GET or HEAD, or their view is marked @writes;
+        their responses set PIN_COOKIE. Goes before
+        AnonymousPageCacheMiddleware, which pins cache misses too.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            request._db_writes = True
+        _state.primary = getattr(request, '_db_writes', False) or PIN_COOKIE in request.COOKIES
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.primary = False
+        if getattr(request, '_db_writes', False) and settings.DATABASE_REPLICAS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+        return response
@@ -0,0 +1,194 @@
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, close_old_connections
+from django.http import Http404
+
+from . import poll_cache
+
+logger = logging.getLogger(__name__)
+
+# How long a disconnected EventSource waits before reconnecting.
+RETRY_MS = 3000
+
+
+class Subscription:
+    """
+        One watcher's mailbox. Messages carry absolute counts, so while the
+        watcher is busy new messages are merged into the pending one instead
+        of queueing up: a slow watcher costs constant memory and still ends
+        up with the latest counts.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = None
+
+    def push(self, message):
+        with self._condition:
+            if self._pending is None:
+                self._pending = {'vote_count': None, 'options': {}}
+            self._pending['vote_count'] = message['vote_count']
+            self._pending['options'].update(message['options'])
+            if message.get('deleted'):
+                self._pending['deleted'] = True
+            self._condition.notify()
+
+    def get(self, timeout):
+        """ Returns the pending message, or None after timeout seconds. """
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending is not None, timeout)
+            message, self._pending = self._pending, None
+            return message
+
+
+class PollBroker:
+    """
+        In-process pub/sub of live poll results, one per worker process.
+        Watchers of a poll subscribe here; one watcher thread per worker
+        checks the results version of every watched poll in the shared cache
+        every LIVE_POLL_INTERVAL seconds (or as soon as notify is called) and
+        publishes the counts that changed. A poll with thousands of watchers
+        in a worker costs one cache read per interval and, when a vote moved
+        its version, one results read shared with view_poll, not a query per
+        watcher.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        # poll id -> (results version, {option id: count}) last published.
+        self._published = {}
+        self._wake = threading.Event()
+        self._watcher = None
+
+    def subscribe(self, poll_id):
+        subscription = Subscription()
+        with self._lock:
+            self._subscriptions.setdefault(poll_id, set()).add(subscription)
+        self._start_watcher()
+        return subscription
+
+    def unsubscribe(self, poll_id, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(poll_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(poll_id, None)
+                self._published.pop(poll_id, None)
+
+    def watchers(self, poll_id):
+        with self._lock:
+            return len(self._subscriptions.get(poll_id, ()))
+
+    def notify(self, poll_id):
+        """ Tells the watcher thread that a vote was just recorded here. """
+        self._wake.set()
+
+    def check(self):
+        """
+            Publishes the changed counts of every watched poll whose results
+            version moved since the last check.
+        """
+        with self._lock:
+            poll_ids = list(self._subscriptions)
+        if not poll_ids:
+            return
+        versions = poll_cache.get_results_versions(poll_ids)
+        for poll_id in poll_ids:
+            published = self._published.get(poll_id)
+            if published and published[0] == versions[poll_id]:
+                continue
+            try:
+                results = poll_cache.get_results(poll_id)
+            except Http404:
+                self._publish(poll_id, {'vote_count': 0, 'options': {}, 'deleted': True})
+                continue
+            counts = counts_message(results)
+            with self._lock:
+                if poll_id not in self._subscriptions:
+                    continue
+                self._published[poll_id] = (versions[poll_id], counts['options'])
+            # The first check of a newly watched poll sends every count: a
+            # vote may have landed between a watcher's snapshot and now.
+            previous = published[1] if published else {}
+            changed = {option_id: count for option_id, count in counts['options'].items()
+                       if previous.get(option_id) != count}
+            if changed:
+                self._publish(poll_id, {'vote_count': counts['vote_count'], 'options': changed})
+
+    def _publish(self, poll_id, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(poll_id, ()))
+        for subscription in subscriptions:
+            subscription.push(message)
+
+    def _start_watcher(self):
+        interval = settings.LIVE_POLL_INTERVAL
+        if not interval or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._run_watcher, args=(interval,),
+                                                 name='live-poll-watcher', daemon=True)
+                self._watcher.start()
+
+    def _run_watcher(self, interval):
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Live poll check failed.")
+            finally:
+                close_old_connections()
+
+
+def counts_message(results):
+    """
+        The compact form of poll_cache results sent to watchers: the total
+        and {option id: count}. Option ids are strings, as in JSON.
+    """
+    return {'vote_count': results['vote_count'],
+            'options': {str(option['id']): option['vote_count'] for option in results['options']}}
+
+
+def format_event(message):
+    return 'data: %s\n\n' % json.dumps(message, separators=(',', ':'))
+
+
+def event_stream(poll_id, subscription, snapshot):
+    """
+        The Server-Sent Events body for one watcher: the current counts,
+        then every change published for the poll. Comment lines are sent
+        every LIVE_KEEPALIVE_INTERVAL seconds so dead connections are
+        noticed. Ends after LIVE_STREAM_MAX_SECONDS, freeing the worker
+        thread; the browser reconnects on its own.
+    """
+    try:
+        # A watcher can stay connected for minutes without touching the
+        # database; don't hold a connection for it.
+        for connection in connections.all():
+            if not connection.in_atomic_block:
+                connection.close()
+        yield 'retry: %s\n\n' % RETRY_MS
+        yield format_event(counts_message(snapshot))
+        deadline = time.monotonic() + settings.LIVE_STREAM_MAX_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            message = subscription.get(min(settings.LIVE_KEEPALIVE_INTERVAL, remaining))
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(message)
+            if message.get('deleted'):
+                return
+    finally:
+        broker.unsubscribe(poll_id, subscription)
+
+
+broker = PollBroker()
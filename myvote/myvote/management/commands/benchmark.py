@@ -0,0 +1,96 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from myvote import benchmark, datagen
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks every MyVote route against a seeded throwaway database and '
+            'reports latency percentiles, queries per request and throughput as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(datagen.SCALES), default='small',
+                            help='Dataset size: small (1k votes), medium (100k) or large (10M).')
+        parser.add_argument('--votes', type=int,
+                            help='Seed this many votes instead of a named scale.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed for the generated dataset.')
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Untimed requests per scenario before timing starts.')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Only run the named scenario. May be given more than once.')
+        parser.add_argument('--output',
+                            help='Where to write the JSON report. Defaults to '
+                                 'benchmark-<scale>-<timestamp>.json.')
+        parser.add_argument('--compare',
+                            help='A previous JSON report to compare this run against.')
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help='p95 growth, in percent, that counts as a regression.')
+        parser.add_argument('--login-storm', type=int, metavar='THREADS', default=0,
+                            help='Also time the read scenarios while this many clients log '
+                                 'in back to back.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database, and reuse it if it exists.')
+
+    def handle(self, *args, **options):
+        names = options['scenarios']
+        known = {scenario.name for scenario in benchmark.SCENARIOS}
+        if names and not set(names) <= known:
+            raise CommandError('Unknown scenario: %s' % ', '.join(sorted(set(names) - known)))
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        votes = options['votes'] or datagen.SCALES[options['scale']]
+        scale = options['scale'] if not options['votes'] else 'custom'
+
+        # Never touch the configured database: benchmark a separate one,
+        # created and migrated the way the test runner does it. Replicas
+        # would still point at the configured database, so everything is
+        # read from the benchmark database.
+        setup_test_environment()
+        replicas = override_settings(DATABASE_REPLICAS=[])
+        replicas.enable()
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict['TEST']['NAME'] = 'benchmark_%s_%s' % (old_name, scale)
+        connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                           serialize=False, keepdb=options['keepdb'])
+        try:
+            from myvote.models import Poll
+            if not Poll.objects.exists():
+                self.stdout.write('Seeding {0} votes...'.format(votes))
+                started = time.perf_counter()
+                datagen.generate(seed=options['seed'], **datagen.dataset_size(votes))
+                self.stdout.write('Seeded in {0:.1f}s.'.format(time.perf_counter() - started))
+
+            report = {'meta': benchmark.metadata(scale, votes, options['seed'])}
+            report['meta']['iterations'] = options['iterations']
+            report['results'] = benchmark.run(options['iterations'], options['warmup'],
+                                              names=names, stdout=self.stdout)
+            if options['login_storm']:
+                report['login_storm'] = benchmark.login_storm(
+                    options['iterations'], options['warmup'],
+                    threads=options['login_storm'], stdout=self.stdout)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            replicas.disable()
+            teardown_test_environment()
+
+        output = options['output'] or 'benchmark-%s-%s.json' % (scale, time.strftime('%Y%m%d-%H%M%S'))
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS('Wrote {0}.'.format(output)))
+
+        if baseline:
+            lines, regressions = benchmark.compare(baseline, report, options['threshold'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError('%s scenarios regressed: %s' % (len(regressions), ', '.join(regressions)))
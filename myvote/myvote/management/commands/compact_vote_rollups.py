@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myvote import rollups
+from myvote.models import Poll
+
+
+class Command(BaseCommand):
+    help = 'Folds old minute and hour vote rollups into coarser buckets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of polls compacted per transaction.')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute the rollups from Vote rows instead.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        rebuild = options['rebuild']
+        # One cutoff for the whole run, so every poll is compacted alike.
+        now = timezone.now()
+        poll_ids = Poll.objects.order_by('pk').values_list('pk', flat=True)
+        last_id = 0
+        done = 0
+        while True:
+            # Walk the polls by primary key, as recount_votes does.
+            chunk = list(poll_ids.filter(pk__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            if rebuild:
+                rollups.rebuild(chunk, now)
+            else:
+                rollups.compact(chunk, now)
+            done += len(chunk)
+            last_id = chunk[-1]
+            self.stdout.write("{0} {1} polls.".format('Rebuilt' if rebuild else 'Compacted', done))
+
+        self.stdout.write(self.style.SUCCESS("Done. {0} polls {1}.".format(
+            done, 'rebuilt' if rebuild else 'compacted')))
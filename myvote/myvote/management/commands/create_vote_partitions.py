@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myvote import partitions
+
+
+class Command(BaseCommand):
+    help = ('Brings the hash partitioned Vote table to the given number of partitions, '
+            'splitting the existing ones. Each split locks the Vote table while it copies '
+            'one partition.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=settings.VOTE_PARTITIONS,
+                            help='Number of partitions. Must be a multiple of the current '
+                                 'number. Defaults to VOTE_PARTITIONS.')
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError('The Vote table is not partitioned. It is partitioned by the '
+                               'migrations on PostgreSQL 11 and later.')
+        try:
+            split, created = partitions.split_partitions(options['partitions'])
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(
+            "Done. {0} partitions split, {1} created, {2} in total.".format(
+                split, created, len(partitions.vote_partitions()))))
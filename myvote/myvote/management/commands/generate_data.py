@@ -0,0 +1,57 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myvote import datagen
+from myvote.datagen import SCALES
+
+
+class Command(BaseCommand):
+    help = ('Generates users, polls, options, votes and follows with Zipfian poll '
+            'popularity and power-law follower counts. Deterministic for a given '
+            '--seed and --end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                            help='Dataset size: small (1k votes), medium (100k) or large (10M).')
+        parser.add_argument('--users', type=int, help='Number of users. Overrides --scale.')
+        parser.add_argument('--polls', type=int, help='Number of polls. Overrides --scale.')
+        parser.add_argument('--votes', type=int, help='Approximate number of votes. Overrides --scale.')
+        parser.add_argument('--follows', type=int,
+                            help='Average number of users each user follows.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+        parser.add_argument('--poll-exponent', type=float, default=1.1,
+                            help='Zipf exponent of poll popularity.')
+        parser.add_argument('--user-exponent', type=float, default=1.0,
+                            help='Zipf exponent of user popularity (followers and authorship).')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread poll datetimes over this many days.')
+        parser.add_argument('--end',
+                            help='Latest poll datetime, as YYYY-MM-DD. Defaults to now.')
+        parser.add_argument('--password', default=datagen.DEFAULT_PASSWORD,
+                            help='Password of every generated user.')
+
+    def handle(self, *args, **options):
+        size = datagen.dataset_size(options['votes'] or SCALES[options['scale']])
+        for key in ('users', 'polls', 'votes', 'follows'):
+            if options[key] is not None:
+                size[key] = options[key]
+        if size['users'] < 2 or size['polls'] < 0 or size['votes'] < 0 or size['follows'] < 0:
+            raise CommandError('Need at least two users and no negative counts.')
+        end = None
+        if options['end']:
+            try:
+                end = datetime.datetime.strptime(options['end'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--end must be a date like 2018-01-31.')
+            end = timezone.make_aware(end, timezone.utc)
+
+        started = time.perf_counter()
+        written = datagen.generate(seed=options['seed'], poll_exponent=options['poll_exponent'],
+                                   user_exponent=options['user_exponent'], days=options['days'],
+                                   end=end, password=options['password'], stdout=self.stdout,
+                                   **size)
+        self.stdout.write(self.style.SUCCESS('Done. Wrote {0} rows in {1:.1f}s.'.format(
+            sum(written.values()), time.perf_counter() - started)))
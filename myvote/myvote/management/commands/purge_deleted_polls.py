@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from myvote.models import Poll
+from myvote.polls import purge_poll
+
+
+class Command(BaseCommand):
+    help = 'Removes deleted polls with their votes, in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows deleted per statement (default POLL_PURGE_BATCH_SIZE).')
+
+    def handle(self, *args, **options):
+        poll_ids = list(Poll.all_objects.filter(is_deleted=True).order_by('pk')
+                                        .values_list('pk', flat=True))
+        removed = 0
+        for i, poll_id in enumerate(poll_ids, 1):
+            removed += purge_poll(poll_id, options['batch_size'])
+            self.stdout.write("Purged {0} of {1} polls.".format(i, len(poll_ids)))
+
+        self.stdout.write(self.style.SUCCESS(
+            "Done. {0} polls purged, {1} rows removed.".format(len(poll_ids), removed)))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from myvote.models import Poll
+from myvote.votes import recount_tallies
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored poll and option vote tallies from Vote rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of polls recounted per transaction.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        poll_ids = Poll.objects.order_by('pk').values_list('pk', flat=True)
+        last_id = 0
+        checked = 0
+        repaired = 0
+        while True:
+            # Walk the polls by primary key so each chunk is an index range
+            # scan rather than an ever-growing OFFSET.
+            chunk = list(poll_ids.filter(pk__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            repaired += recount_tallies(chunk)
+            checked += len(chunk)
+            last_id = chunk[-1]
+            self.stdout.write("Checked {0} polls, repaired {1} tallies.".format(checked, repaired))
+
+        self.stdout.write(self.style.SUCCESS(
+            "Done. {0} polls checked, {1} tallies repaired.".format(checked, repaired)))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from myvote import trending
+from myvote.models import Poll
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the trending scores of polls from their vote rollups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of polls rescored per transaction.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        poll_ids = Poll.objects.order_by('pk').values_list('pk', flat=True)
+        last_id = 0
+        done = 0
+        while True:
+            # Walk the polls by primary key, as recount_votes does.
+            chunk = list(poll_ids.filter(pk__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            trending.recompute(chunk)
+            done += len(chunk)
+            last_id = chunk[-1]
+            self.stdout.write("Rescored {0} polls.".format(done))
+
+        self.stdout.write(self.style.SUCCESS("Done. {0} polls rescored.".format(done)))
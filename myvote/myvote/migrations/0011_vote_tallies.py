@@ -0,0 +1,38 @@
+# Generated by Django 2.0.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+# Backfill the stored tallies from the existing Vote rows so the new columns
+# start out consistent with the vote table.
+BACKFILL_TALLIES = """
+    UPDATE myvote_option SET vote_count = (
+        SELECT COUNT(*) FROM myvote_vote
+        WHERE myvote_vote.option_id = myvote_option.id
+    );
+    UPDATE myvote_poll SET vote_count = (
+        SELECT COUNT(*) FROM myvote_vote
+        WHERE myvote_vote.poll_id = myvote_poll.id
+    );
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myvote', '0010_auto_20180203_2243'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='option',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='poll',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL_TALLIES, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.0.1 on 2026-10-18 10:04
+
+from django.conf import settings
+from django.db import migrations
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    """
+        Keeps the earliest vote of every (poll, owner) pair so the unique
+        constraint can be created, then re-derives the tallies of the polls
+        that had duplicates.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("""
+            DELETE FROM myvote_vote dup
+            USING myvote_vote keep
+            WHERE dup.poll_id = keep.poll_id
+              AND dup.owner_id = keep.owner_id
+              AND dup.id > keep.id
+            RETURNING dup.poll_id
+        """)
+        poll_ids = list({row[0] for row in cursor.fetchall()})
+        if not poll_ids:
+            return
+        cursor.execute("""
+            UPDATE myvote_option SET vote_count = (
+                SELECT COUNT(*) FROM myvote_vote
+                WHERE myvote_vote.option_id = myvote_option.id
+            ) WHERE poll_id = ANY(%s)
+        """, [poll_ids])
+        cursor.execute("""
+            UPDATE myvote_poll SET vote_count = (
+                SELECT COUNT(*) FROM myvote_vote
+                WHERE myvote_vote.poll_id = myvote_poll.id
+            ) WHERE id = ANY(%s)
+        """, [poll_ids])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('myvote', '0011_vote_tallies'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='vote',
+            unique_together={('poll', 'owner')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.0.1 on 2026-10-18 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('myvote', '0012_vote_unique_poll_owner'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['-datetime', '-id'], name='poll_datetime_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['owner', '-datetime', '-id'], name='poll_owner_datetime_id_idx'),
+        ),
+    ]
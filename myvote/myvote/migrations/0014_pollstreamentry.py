@@ -0,0 +1,64 @@
+# Generated by Django 2.0.1 on 2026-10-18 12:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Materialize the streams of existing follow relationships.
+BACKFILL_STREAMS = """
+    INSERT INTO myvote_pollstreamentry (user_id, poll_id, author_id, datetime)
+    SELECT DISTINCT f.follower_id, p.id, p.owner_id, p.datetime
+    FROM accounts_followedusers f
+    JOIN myvote_poll p ON p.owner_id = f.followed_id;
+"""
+
+# Polls that were not fanned out are few; a partial index keeps the read-time
+# pull of those polls a small range scan.
+CREATE_PULL_INDEX = """
+    CREATE INDEX poll_pull_datetime_id_idx ON myvote_poll (datetime DESC, id DESC)
+    WHERE NOT fanned_out;
+"""
+
+DROP_PULL_INDEX = "DROP INDEX IF EXISTS poll_pull_datetime_id_idx;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0003_auto_20180127_1458'),
+        ('myvote', '0013_poll_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='fanned_out',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='PollStreamEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('poll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='myvote.Poll')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pollstreamentry',
+            index=models.Index(fields=['user', '-datetime', '-poll'], name='pollstream_user_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pollstreamentry',
+            index=models.Index(fields=['user', 'author'], name='pollstream_user_author_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pollstreamentry',
+            unique_together={('user', 'poll')},
+        ),
+        migrations.RunSQL(BACKFILL_STREAMS, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_PULL_INDEX, reverse_sql=DROP_PULL_INDEX),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.0.1 on 2026-10-18 13:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Keep search_vector in step with name and description on every insert and
+# on any update touching either column. Uses the database's default text
+# search configuration, the same one SearchQuery uses.
+CREATE_TRIGGER = """
+    CREATE FUNCTION myvote_poll_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector(coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector(coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER myvote_poll_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON myvote_poll
+    FOR EACH ROW EXECUTE PROCEDURE myvote_poll_search_vector_update();
+
+    UPDATE myvote_poll SET search_vector =
+        setweight(to_tsvector(coalesce(name, '')), 'A') ||
+        setweight(to_tsvector(coalesce(description, '')), 'B');
+"""
+
+DROP_TRIGGER = """
+    DROP TRIGGER IF EXISTS myvote_poll_search_vector_trigger ON myvote_poll;
+    DROP FUNCTION IF EXISTS myvote_poll_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myvote', '0014_pollstreamentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='poll_search_vector_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, reverse_sql=DROP_TRIGGER),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.1 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myvote', '0015_poll_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='revision',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
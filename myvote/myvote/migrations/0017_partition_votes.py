@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Rebuilds myvote_vote as a table hash partitioned by poll_id (see
+# myvote.partitions), on PostgreSQL 11 and later; elsewhere the table is left
+# as it is. The rows are copied into a new table, which keeps the old one
+# locked against writes for the length of the copy, then the keys and
+# indexes are built once over the copied rows. The primary key has to
+# include the partition key, so it becomes (id, poll_id); ids still come
+# from the same sequence.
+
+COLUMNS = """
+    id integer NOT NULL,
+    option_id integer NOT NULL,
+    owner_id integer NOT NULL,
+    poll_id integer NOT NULL,
+    datetime timestamp with time zone NOT NULL
+"""
+
+CONSTRAINTS = [
+    'ALTER TABLE myvote_vote ADD CONSTRAINT myvote_vote_pkey PRIMARY KEY ({primary_key})',
+    'ALTER TABLE myvote_vote ADD CONSTRAINT myvote_vote_poll_id_owner_id_uniq UNIQUE (poll_id, owner_id)',
+    'CREATE INDEX myvote_vote_option_id_idx ON myvote_vote (option_id)',
+    'CREATE INDEX myvote_vote_owner_id_idx ON myvote_vote (owner_id)',
+    'ALTER TABLE myvote_vote ADD CONSTRAINT myvote_vote_option_id_fk FOREIGN KEY (option_id) '
+    'REFERENCES myvote_option (id) DEFERRABLE INITIALLY DEFERRED',
+    'ALTER TABLE myvote_vote ADD CONSTRAINT myvote_vote_owner_id_fk FOREIGN KEY (owner_id) '
+    'REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED',
+    'ALTER TABLE myvote_vote ADD CONSTRAINT myvote_vote_poll_id_fk FOREIGN KEY (poll_id) '
+    'REFERENCES myvote_poll (id) DEFERRABLE INITIALLY DEFERRED',
+]
+
+
+def _supported(schema_editor):
+    connection = schema_editor.connection
+    return connection.vendor == 'postgresql' and connection.pg_version >= 110000
+
+def _rebuild(schema_editor, partition_by, partitions, primary_key):
+    execute = schema_editor.execute
+    execute('LOCK TABLE myvote_vote IN EXCLUSIVE MODE')
+    execute('CREATE TABLE myvote_vote_rebuilt (%s) %s' % (COLUMNS, partition_by))
+    for modulus, remainder in partitions:
+        execute('CREATE TABLE myvote_vote_h%(modulus)s_%(remainder)s PARTITION OF myvote_vote_rebuilt '
+                'FOR VALUES WITH (MODULUS %(modulus)s, REMAINDER %(remainder)s)'
+                % {'modulus': modulus, 'remainder': remainder})
+    execute('INSERT INTO myvote_vote_rebuilt SELECT id, option_id, owner_id, poll_id, datetime '
+            'FROM myvote_vote')
+    execute('ALTER SEQUENCE myvote_vote_id_seq OWNED BY NONE')
+    execute('DROP TABLE myvote_vote')
+    execute('ALTER TABLE myvote_vote_rebuilt RENAME TO myvote_vote')
+    execute("ALTER TABLE myvote_vote ALTER COLUMN id SET DEFAULT nextval('myvote_vote_id_seq')")
+    execute('ALTER SEQUENCE myvote_vote_id_seq OWNED BY myvote_vote.id')
+    for sql in CONSTRAINTS:
+        execute(sql.format(primary_key=primary_key))
+
+def partition_votes(apps, schema_editor):
+    if not _supported(schema_editor):
+        return
+    count = settings.VOTE_PARTITIONS
+    _rebuild(schema_editor, 'PARTITION BY HASH (poll_id)',
+             [(count, remainder) for remainder in range(count)], 'id, poll_id')
+
+def unpartition_votes(apps, schema_editor):
+    if not _supported(schema_editor):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                       "WHERE partrelid = 'myvote_vote'::regclass)")
+        if not cursor.fetchone()[0]:
+            return
+    _rebuild(schema_editor, '', [], 'id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myvote', '0016_poll_revision'),
+    ]
+
+    operations = [
+        # Lookups by poll use the (poll, owner) unique index.
+        migrations.AlterField(
+            model_name='vote',
+            name='poll',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='votes', to='myvote.Poll'),
+        ),
+        migrations.RunPython(partition_votes, unpartition_votes),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 2.0.1 on 2026-10-18 09:02
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+# Counts the votes already cast into rollups, at the resolution
+# compact_vote_rollups would have left them in.
+BACKFILL_SQL = """
+    INSERT INTO myvote_voterollup (poll_id, option_id, resolution, bucket, count)
+    SELECT poll_id, option_id, resolution, date_trunc(resolution, datetime), count(*)
+    FROM (
+        SELECT poll_id, option_id, datetime,
+               CASE WHEN datetime >= %s THEN 'minute'
+                    WHEN datetime >= %s THEN 'hour'
+                    ELSE 'day' END AS resolution
+        FROM myvote_vote
+    ) votes
+    GROUP BY poll_id, option_id, resolution, date_trunc(resolution, datetime)
+"""
+
+
+def backfill_rollups(apps, schema_editor):
+    now = timezone.now()
+    schema_editor.execute(BACKFILL_SQL, [
+        now - datetime.timedelta(hours=settings.ROLLUP_MINUTE_RETENTION_HOURS),
+        now - datetime.timedelta(days=settings.ROLLUP_HOUR_RETENTION_DAYS),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myvote', '0017_partition_votes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('option', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='myvote.Option')),
+                ('poll', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='myvote.Poll')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='voterollup',
+            unique_together={('poll', 'bucket', 'resolution', 'option')},
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
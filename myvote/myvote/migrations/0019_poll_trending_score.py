@@ -0,0 +1,63 @@
+# Generated by Django 2.0.1 on 2026-10-18 09:11
+
+import datetime
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# Scores the votes already cast from their rollups, as
+# myvote.trending.recompute does.
+BACKFILL_SQL = """
+    UPDATE myvote_poll poll SET trending_score = scores.score
+    FROM (
+        SELECT poll_id, top + LN(SUM(count * EXP(GREATEST(weight - top, -700)))) AS score
+        FROM (
+            SELECT poll_id, count, weight, MAX(weight) OVER (PARTITION BY poll_id) AS top
+            FROM (
+                SELECT poll_id, SUM(count) AS count,
+                       EXTRACT(EPOCH FROM bucket + CASE resolution WHEN 'minute' THEN interval '30 seconds'
+                                                                   WHEN 'hour' THEN interval '30 minutes'
+                                                                   ELSE interval '12 hours' END
+                                          - %s) * %s AS weight
+                FROM myvote_voterollup
+                WHERE count > 0
+                GROUP BY poll_id, bucket, resolution
+            ) rollups
+        ) buckets
+        GROUP BY poll_id, top
+    ) scores
+    WHERE poll.id = scores.poll_id
+"""
+
+
+def backfill_scores(apps, schema_editor):
+    schema_editor.execute(BACKFILL_SQL, [
+        datetime.datetime(2018, 1, 1, tzinfo=timezone.utc),
+        math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 60 * 60),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myvote', '0018_voterollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['-trending_score', '-id'], name='poll_trending_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['-vote_count', '-id'], name='poll_vote_count_id_idx'),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.1 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myvote', '0019_poll_trending_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='is_deleted',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+    ]
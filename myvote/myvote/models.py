@@ -1,29 +1,73 @@
 from django.db import models
 
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+from . import page_cache
+
+class PollManager(models.Manager):
+    """ Polls that haven't been deleted. """
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
 
 class Poll(models.Model):
     name = models.CharField(max_length=100)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='polls')
     datetime = models.DateTimeField(auto_now_add=True)
     description = models.TextField()
+    vote_count = models.PositiveIntegerField(default=0)
+    # False when the owner had too many followers to copy the poll into each
+    # follower's PollStream; such polls are pulled in when the stream is read.
+    fanned_out = models.BooleanField(default=True)
+    # Weighted tsvector of name (A) and description (B). Maintained by a
+    # database trigger (see migration 0015), so bulk inserts stay current.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Incremented on every update; part of the cache key of the poll's
+    # rendered stream item (see modules/poll_stream_item.html).
+    revision = models.PositiveIntegerField(default=1, editable=False)
+    # Log of the poll's time-decayed vote count (see myvote.trending). Only
+    # comparable between polls; bumped with vote_count on every vote.
+    trending_score = models.FloatField(default=0, editable=False)
+    # Deleted polls are hidden at once and removed later, with their votes,
+    # by purge_deleted_polls (see myvote.polls.purge_poll). Indexed so the
+    # purge finds the few deleted polls without a scan.
+    is_deleted = models.BooleanField(default=False, editable=False, db_index=True)
+
+    # The default manager, used by every queryset and reverse relation, skips
+    # deleted polls; all_objects includes them.
+    objects = PollManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.revision += 1
+        super().save(*args, **kwargs)
+        page_cache.bump_version(page_cache.POLLS, page_cache.profile(self.owner_id))
+
     def user_has_voted(self, user):
-        for option in self.options.all():
-            found_user = option.votes.filter(owner=user)
-            if found_user:
-                return True
-        return False
+        # Served by the unique (poll, owner) index on Vote.
+        return self.votes.filter(owner=user).exists()
 
     class Meta:
         ordering = ['-datetime']
+        indexes = [
+            # Keyset pagination of the poll streams seeks on (datetime, id).
+            models.Index(fields=['-datetime', '-id'], name='poll_datetime_id_idx'),
+            models.Index(fields=['owner', '-datetime', '-id'], name='poll_owner_datetime_id_idx'),
+            # The trending and top sorts of the explore page.
+            models.Index(fields=['-trending_score', '-id'], name='poll_trending_id_idx'),
+            models.Index(fields=['-vote_count', '-id'], name='poll_vote_count_id_idx'),
+            GinIndex(fields=['search_vector'], name='poll_search_vector_gin'),
+        ]
 
 class Option(models.Model):
     option_text = models.CharField(max_length=100)
     poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='options')
+    vote_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.option_text
@@ -31,5 +75,56 @@ class Option(models.Model):
 class Vote(models.Model):
     option = models.ForeignKey(Option, on_delete=models.CASCADE, related_name='votes')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
-    poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='votes')
+    # Lookups by poll use the (poll, owner) unique index. On PostgreSQL the
+    # table is hash partitioned by poll (see myvote.partitions).
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='votes', db_index=False)
     datetime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # A user may only vote once per poll. Enforced by the database so
+        # concurrent requests can't slip a second vote past the check.
+        unique_together = ('poll', 'owner')
+
+class VoteRollup(models.Model):
+    """
+        The number of votes an option got in one time bucket, for the vote
+        trend charts. Written with every vote (see myvote.rollups) in minute
+        buckets, which compact_vote_rollups later folds into hour and then
+        day buckets, so charts never read Vote rows.
+    """
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+    # Named as Postgres' date_trunc names them.
+    RESOLUTIONS = ((MINUTE, 'Minute'), (HOUR, 'Hour'), (DAY, 'Day'))
+
+    # Lookups by poll use the unique index.
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='+', db_index=False)
+    option = models.ForeignKey(Option, on_delete=models.CASCADE, related_name='+')
+    resolution = models.CharField(max_length=6, choices=RESOLUTIONS)
+    # Start of the bucket.
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('poll', 'bucket', 'resolution', 'option')
+
+class PollStreamEntry(models.Model):
+    """
+        One poll in a user's materialized home PollStream. Written when a
+        followed author creates a poll (see myvote.pollstream) so reading the
+        stream is a range scan over (user, datetime) instead of a join over
+        every followed author's polls.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='+')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Copy of poll.datetime so the stream can be ordered without the join.
+    datetime = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'poll')
+        indexes = [
+            models.Index(fields=['user', '-datetime', '-poll'], name='pollstream_user_datetime_idx'),
+            models.Index(fields=['user', 'author'], name='pollstream_user_author_idx'),
+        ]
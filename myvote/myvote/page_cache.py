@@ -0,0 +1,131 @@
+import datetime
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from django.views.decorators.http import condition
+
+from . import db_router
+
+# Stamp of everything listed on the explore page.
+POLLS = 'polls'
+
+def profile(user_id):
+    """ Stamp of a user's public profile: their bio and polls. """
+    return 'profile:%s' % user_id
+
+def _version_key(name):
+    return 'page_version:%s' % name
+
+def _now():
+    return int(time.time() * 1000)
+
+def get_version(name):
+    """
+        Returns the version stamp called name: the time of the last change
+        to what it covers, in milliseconds. One cache read.
+    """
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _now(), None)
+        version = cache.get(key)
+    return version
+
+def bump_version(*names):
+    """ Records a change to what the named stamps cover. """
+    for name in names:
+        key = _version_key(name)
+        # Never reuse a version, even for two changes in one millisecond.
+        cache.set(key, max(_now(), (cache.get(key) or 0) + 1), None)
+
+def version_datetime(version):
+    return datetime.datetime.fromtimestamp(version / 1000, timezone.utc)
+
+def is_anonymous_request(request):
+    """
+        True for a GET or HEAD without a session or messages cookie. Such a
+        request can't be logged in or have flash messages waiting, so it
+        gets the same page as every other anonymous visitor.
+    """
+    return (request.method in ('GET', 'HEAD') and
+            settings.SESSION_COOKIE_NAME not in request.COOKIES and
+            CookieStorage.cookie_name not in request.COOKIES)
+
+def anonymous_page(etag_func, last_modified_func=None):
+    """
+        Makes a view's anonymous pages cacheable. etag_func and
+        last_modified_func take the view's arguments and should only read
+        version stamps. Anonymous requests get ETag and Last-Modified headers
+        and 304 Not Modified responses, and AnonymousPageCacheMiddleware
+        keeps their pages under the ETag. Other requests go straight to the
+        view.
+    """
+    def decorator(view_func):
+        def page_etag(request, *args, **kwargs):
+            # Computed once per request; the middleware asks first.
+            if not hasattr(request, '_page_etag'):
+                request._page_etag = etag_func(request, *args, **kwargs)
+            return request._page_etag
+
+        conditional_view = condition(etag_func=page_etag,
+                                     last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            if is_anonymous_request(request):
+                return conditional_view(request, *args, **kwargs)
+            return view_func(request, *args, **kwargs)
+        inner.page_etag = page_etag
+        return inner
+    return decorator
+
+
+class AnonymousPageCacheMiddleware:
+    """
+        Serves anonymous requests to @anonymous_page views from the cache.
+        Pages are keyed on their URL and ETag, so a change to the version
+        stamps behind the ETag makes the old page unreachable; it is never
+        deleted, just left to expire after PAGE_CACHE_TIMEOUT seconds.
+
+        Goes before SessionMiddleware: a cached page is returned from
+        process_view, before the view, CSRF checks or any session or user
+        lookup. Responses that set a cookie are never stored, and requests
+        with a session cookie never reach the cache, so logged-in pages are
+        neither stored nor served.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        key = getattr(request, '_page_cache_key', None)
+        if (key and response.status_code == 200 and not response.streaming and
+                not response.cookies):
+            cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        page_etag = getattr(view_func, 'page_etag', None)
+        if page_etag is None or request.method != 'GET' or not is_anonymous_request(request):
+            return None
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = 'page:%s:%s' % (path, page_etag(request, *view_args, **view_kwargs))
+        response = cache.get(key)
+        if response is None:
+            # The page will be stored under the current ETag, so render it
+            # from the primary rather than a replica that may lag behind.
+            db_router.pin_to_primary()
+            request._page_cache_key = key
+            return None
+        last_modified = response.get('Last-Modified')
+        return get_conditional_response(
+            request, etag=response.get('ETag'),
+            last_modified=last_modified and parse_http_date_safe(last_modified),
+            response=response)
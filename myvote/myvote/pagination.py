@@ -0,0 +1,165 @@
+import base64
+import binascii
+from collections.abc import Sequence
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPaginator:
+    """
+        Paginates a queryset newest-first by seeking past the key values of
+        the last row shown (keyset pagination) rather than with LIMIT/OFFSET.
+        Every page is a single index range scan of per_page + 1 rows, so deep
+        pages cost the same as the first one and no COUNT(*) is ever issued.
+
+        Pages are addressed with opaque cursor tokens: 'after' returns the
+        rows older than the cursor, 'before' the rows newer than it.
+
+        Parameters:
+            -  object_list = an unordered queryset. The paginator orders it by
+                             keys, descending.
+            -  per_page = the number of objects on each page.
+            -  keys = field names that uniquely order the queryset, most
+                      significant first. Must be backed by a matching index.
+    """
+    CURSOR_SEPARATOR = '|'
+
+    def __init__(self, object_list, per_page, keys=('datetime', 'id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.keys = tuple(keys)
+
+    def get_page(self, after=None, before=None):
+        """
+            Returns the page following the 'after' cursor or preceding the
+            'before' cursor. Like Paginator.get_page, a missing or malformed
+            cursor returns the first page instead of raising.
+        """
+        try:
+            if before:
+                return self._page_before(self.decode_cursor(before))
+            if after:
+                return self._page_after(self.decode_cursor(after))
+        except InvalidCursor:
+            pass
+        return self._page_after(None)
+
+    def _page_after(self, values):
+        rows = self._fetch(values, descending=True, limit=self.per_page + 1)
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self,
+                          has_next=has_next,
+                          has_previous=values is not None)
+
+    def _page_before(self, values):
+        rows = self._fetch(values, descending=False, limit=self.per_page + 1)
+        if not rows:
+            # Nothing is newer than the cursor any more; start over.
+            return self._page_after(None)
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return KeysetPage(rows, self, has_next=True, has_previous=has_previous)
+
+    def _fetch(self, values, descending, limit):
+        """
+            Returns up to limit objects past the key values (older if
+            descending, newer otherwise), nearest to the cursor first.
+            Subclasses can override this to page over other sources.
+        """
+        return list(self.seek(self.object_list, self.keys, values, descending)[:limit])
+
+    @staticmethod
+    def seek(queryset, keys, values, descending):
+        """
+            Orders queryset by keys and, when values is given, restricts it to
+            the rows strictly past them. The filter is
+            (k1 < v1) OR (k1 = v1 AND k2 < v2) OR ... with an extra k1 <= v1
+            bound so the planner can use the leading index column for the
+            range scan.
+        """
+        prefix, lookup = ('-', 'lt') if descending else ('', 'gt')
+        queryset = queryset.order_by(*[prefix + key for key in keys])
+        if values is None:
+            return queryset
+        seek = Q()
+        equal = {}
+        for key, value in zip(keys, values):
+            seek |= Q(**dict(equal, **{'%s__%s' % (key, lookup): value}))
+            equal[key] = value
+        bound = Q(**{'%s__%se' % (keys[0], lookup): values[0]})
+        return queryset.filter(bound & seek)
+
+    def encode_cursor(self, obj):
+        values = []
+        for key in self.keys:
+            value = getattr(obj, key)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        raw = self.CURSOR_SEPARATOR.join(values).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        except (binascii.Error, UnicodeError, ValueError):
+            raise InvalidCursor(cursor)
+        parts = raw.split(self.CURSOR_SEPARATOR, len(self.keys) - 1)
+        if len(parts) != len(self.keys):
+            raise InvalidCursor(cursor)
+        opts = self.object_list.model._meta
+        try:
+            values = [opts.get_field(key).to_python(part) for key, part in zip(self.keys, parts)]
+        except ValidationError:
+            raise InvalidCursor(cursor)
+        if any(value is None for value in values):
+            raise InvalidCursor(cursor)
+        return values
+
+
+class KeysetPage(Sequence):
+    """
+        A single page produced by KeysetPaginator. Mirrors the parts of
+        django.core.paginator.Page used by the templates, with cursors in
+        place of page numbers.
+    """
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<KeysetPage of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return self.paginator.encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return self.paginator.encode_cursor(self.object_list[0])
+        return None
@@ -0,0 +1,106 @@
+"""
+    Hash partitions of the Vote table. On PostgreSQL 11 and later migration
+    0017 turns myvote_vote into a table partitioned by hash of poll_id, so
+    every query about one poll (tallies, has-voted checks, the unique
+    (poll, owner) check, deleting a poll's votes) touches one partition, and
+    each partition is vacuumed on its own. Partitions are named
+    myvote_vote_h<modulus>_<remainder>.
+
+    Hash partitions don't fill up over time the way date ranges do; the
+    table grows by splitting each partition in two (or more) with a larger
+    modulus. See split_partitions and the create_vote_partitions command.
+"""
+import re
+
+from django.db import connection, transaction
+
+from .models import Vote
+
+VOTE_TABLE = Vote._meta.db_table
+
+_BOUND_RE = re.compile(r'FOR VALUES WITH \(modulus (\d+), remainder (\d+)\)')
+
+PARTITIONS_SQL = """
+    SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+    FROM pg_inherits
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE pg_inherits.inhparent = %s::regclass
+"""
+
+IS_PARTITIONED_SQL = "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)"
+
+
+def partition_name(modulus, remainder):
+    return '%s_h%s_%s' % (VOTE_TABLE, modulus, remainder)
+
+def is_supported():
+    """ Hash partitioning needs PostgreSQL 11 or later. """
+    return connection.vendor == 'postgresql' and connection.pg_version >= 110000
+
+def is_partitioned():
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(IS_PARTITIONED_SQL, [VOTE_TABLE])
+        return cursor.fetchone()[0]
+
+def vote_partitions():
+    """ Returns the (name, modulus, remainder) of every Vote partition. """
+    with connection.cursor() as cursor:
+        cursor.execute(PARTITIONS_SQL, [VOTE_TABLE])
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        modulus, remainder = _BOUND_RE.match(bound).groups()
+        partitions.append((name, int(modulus), int(remainder)))
+    return sorted(partitions, key=lambda partition: (partition[1], partition[2]))
+
+def _create_partition(cursor, modulus, remainder):
+    cursor.execute('CREATE TABLE %s PARTITION OF %s FOR VALUES WITH (MODULUS %s, REMAINDER %s)' % (
+        connection.ops.quote_name(partition_name(modulus, remainder)),
+        connection.ops.quote_name(VOTE_TABLE), modulus, remainder))
+
+def split_partition(name, modulus, remainder, new_modulus):
+    """
+        Replaces one partition with the new_modulus // modulus partitions
+        covering the same polls and moves its rows into them. Runs in one
+        transaction, which locks the whole Vote table until the partition's
+        rows are copied: run it when votes can wait that long.
+    """
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Runs any deferred foreign key checks now: the partition can't be
+        # dropped while checks on its rows are still pending.
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute('ALTER TABLE %s DETACH PARTITION %s' % (quote(VOTE_TABLE), quote(name)))
+        for new_remainder in range(remainder, new_modulus, modulus):
+            _create_partition(cursor, new_modulus, new_remainder)
+        cursor.execute('INSERT INTO %s SELECT * FROM %s' % (quote(VOTE_TABLE), quote(name)))
+        cursor.execute('DROP TABLE %s' % quote(name))
+
+def split_partitions(count):
+    """
+        Brings the Vote table to count hash partitions: partitions with a
+        smaller modulus are split, one transaction each, and any remainder
+        left without a partition gets one. count must be a multiple of every
+        current modulus. Returns (partitions split, partitions created).
+    """
+    partitions = vote_partitions()
+    for name, modulus, remainder in partitions:
+        if count % modulus:
+            raise ValueError('%s partitions is not a multiple of %s.' % (count, modulus))
+    split = created = 0
+    covered = set()
+    for name, modulus, remainder in partitions:
+        if modulus < count:
+            split_partition(name, modulus, remainder, count)
+            split += 1
+            created += count // modulus
+        covered.update(range(remainder, count, modulus))
+    missing = sorted(set(range(count)) - covered)
+    if missing:
+        with transaction.atomic(), connection.cursor() as cursor:
+            for remainder in missing:
+                _create_partition(cursor, count, remainder)
+        created += len(missing)
+    return split, created
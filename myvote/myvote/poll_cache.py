@@ -0,0 +1,110 @@
+import time
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import Http404
+
+from . import db_router
+from .models import Poll, Option
+
+# Cached results are keyed by version, so they never need to be deleted; a
+# stale entry simply stops being read once the version moves on.
+RESULTS_TIMEOUT = 60 * 60
+
+def _results_version_key(poll_id):
+    return 'poll:%s:results_version' % poll_id
+
+def _results_key(poll_id, version):
+    return 'poll:%s:results:%s' % (poll_id, version)
+
+def _fresh_version():
+    # If a version key is evicted, restarting from a constant could make an
+    # old results entry current again. A timestamp never repeats.
+    return int(time.time() * 1000)
+
+def get_results_version(poll_id):
+    """ Returns the current results version of the poll. """
+    key = _results_version_key(poll_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+def get_results_versions(poll_ids):
+    """
+        Returns {poll_id: version} for many polls with one cache round trip
+        (plus one per poll without a version yet).
+    """
+    keys = {_results_version_key(poll_id): poll_id for poll_id in poll_ids}
+    versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+    for poll_id in poll_ids:
+        if poll_id not in versions:
+            versions[poll_id] = get_results_version(poll_id)
+    return versions
+
+def bump_results_version(poll_id):
+    """
+        Invalidates the cached results of the poll. Called whenever a vote is
+        recorded on it or it is deleted.
+    """
+    try:
+        cache.incr(_results_version_key(poll_id))
+    except ValueError:
+        cache.add(_results_version_key(poll_id), _fresh_version(), None)
+
+def get_results(poll_id):
+    """
+        Returns the shared, user-independent results of a poll as a dict:
+            -  id, name, description, datetime, vote_count
+            -  owner = {'id', 'username'}
+            -  options = a list of {'id', 'option_text', 'vote_count'}, in
+                         creation order.
+        Served from the cache when the poll's version is unchanged. Raises
+        Http404 if the poll doesn't exist.
+    """
+    key = _results_key(poll_id, get_results_version(poll_id))
+    results = cache.get(key)
+    if results is None:
+        # From the primary: a lagging replica could store results older
+        # than the version they are cached under.
+        with db_router.use_primary():
+            results = load_results(poll_id)
+        cache.set(key, results, RESULTS_TIMEOUT)
+    return results
+
+def load_results(poll_id):
+    """
+        Reads a poll's results from the database in a single query: the
+        options joined to their poll and its owner. Deleted polls raise
+        Http404.
+    """
+    options = list(Option.objects.filter(poll_id=poll_id, poll__is_deleted=False)
+                                 .select_related('poll__owner')
+                                 .order_by('pk'))
+    if options:
+        poll = options[0].poll
+    else:
+        try:
+            poll = Poll.objects.select_related('owner').get(pk=poll_id)
+        except Poll.DoesNotExist:
+            raise Http404('No Poll matches the given query.')
+    return {
+        'id': poll.id,
+        'name': poll.name,
+        'description': poll.description,
+        'datetime': poll.datetime,
+        'vote_count': poll.vote_count,
+        'owner': {'id': poll.owner.id, 'username': poll.owner.username},
+        'options': [{'id': option.id,
+                     'option_text': option.option_text,
+                     'vote_count': option.vote_count} for option in options],
+    }
+
+def delete_stream_item(poll_id, revision):
+    """
+        Drops the poll's cached stream item (see modules/poll_stream_item.html).
+        Edits move the poll's revision and so the key on their own; a deleted
+        poll has no next revision, so its entry is deleted instead.
+    """
+    cache.delete(make_template_fragment_key('poll_stream_item', [poll_id, revision]))
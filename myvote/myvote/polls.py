@@ -0,0 +1,138 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+from .forms import PollCreationForm
+from .models import Poll, Option, Vote, VoteRollup, PollStreamEntry
+from . import page_cache, poll_cache, pollstream
+
+
+class InvalidBatch(Exception):
+    """
+        Raised by validate_batch. errors maps the index of each invalid poll
+        in the batch (or '__all__' for the batch itself) to its errors.
+    """
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def poll_form(poll):
+    """
+        Returns a PollCreationForm bound to one poll of a batch, a dict with
+        a name, an optional description and a list of option texts.
+    """
+    options = poll.get('options')
+    data = {'name': poll.get('name'), 'description': poll.get('description', '')}
+    if isinstance(options, list):
+        for i, option in enumerate(options):
+            data['option%s' % (i + 1)] = option
+    else:
+        options = None
+    return PollCreationForm(data, options=options)
+
+
+def cleaned_poll(form):
+    """ Returns (name, description, option texts) from a valid form. """
+    options = [val for key, val in form.cleaned_data.items() if 'option' in key]
+    return form.cleaned_data['name'], form.cleaned_data['description'], options
+
+
+def validate_batch(polls):
+    """
+        Validates a decoded JSON batch: a list of at most POLL_BATCH_MAX_SIZE
+        polls, each checked like the create poll form. Returns the polls as
+        (name, description, option texts) or raises InvalidBatch listing
+        every invalid poll.
+    """
+    if not isinstance(polls, list) or not polls:
+        raise InvalidBatch({'__all__': ['Expected a non-empty JSON array of polls.']})
+    if len(polls) > settings.POLL_BATCH_MAX_SIZE:
+        raise InvalidBatch({'__all__': ['At most %s polls per batch.' % settings.POLL_BATCH_MAX_SIZE]})
+    cleaned = []
+    errors = {}
+    for i, poll in enumerate(polls):
+        if not isinstance(poll, dict):
+            errors[i] = {'__all__': ['Expected a JSON object.']}
+            continue
+        form = poll_form(poll)
+        if form.is_valid():
+            cleaned.append(cleaned_poll(form))
+        else:
+            errors[i] = form.errors.get_json_data()
+    if errors:
+        raise InvalidBatch(errors)
+    return cleaned
+
+
+def create_polls(owner, polls):
+    """
+        Creates polls for owner from (name, description, option texts)
+        tuples. Every poll and option is inserted with one bulk_create each,
+        in one transaction, so either the whole batch is created or none of
+        it. The new polls are then fanned out to followers. Returns the new
+        polls, each with its options in option_list.
+    """
+    fanned_out = pollstream.is_fanout_author(owner.id)
+    with transaction.atomic():
+        new_polls = Poll.objects.bulk_create(
+            [Poll(name=name, description=description, owner=owner, fanned_out=fanned_out)
+             for name, description, options in polls])
+        options = []
+        for poll, (name, description, option_texts) in zip(new_polls, polls):
+            poll.option_list = [Option(option_text=text, poll=poll) for text in option_texts]
+            options.extend(poll.option_list)
+        Option.objects.bulk_create(options)
+    pollstream.fan_out_polls(new_polls)
+    page_cache.bump_version(page_cache.POLLS, page_cache.profile(owner.id))
+    return new_polls
+
+
+# Deletes up to a batch of a deleted poll's rows from one table. Selecting
+# the ids first keeps each statement, and the locks it takes, bounded.
+PURGE_BATCH_SQL = """
+    DELETE FROM {table}
+    WHERE poll_id = %(poll_id)s AND id = ANY(ARRAY(
+        SELECT id FROM {table} WHERE poll_id = %(poll_id)s LIMIT %(batch_size)s
+    ))
+"""
+
+# Rows referring to a poll, in the order they are purged: options last, as
+# votes and rollups refer to them.
+PURGED_MODELS = [Vote, VoteRollup, PollStreamEntry, Option]
+
+def delete_poll(poll):
+    """
+        Deletes a poll as far as anyone can see, with one UPDATE: it is marked
+        deleted, which hides it from every queryset, stream and cache. Its
+        votes and other rows stay until purge_poll removes them.
+    """
+    Poll.all_objects.filter(pk=poll.pk).update(is_deleted=True)
+    poll_cache.bump_results_version(poll.pk)
+    poll_cache.delete_stream_item(poll.pk, poll.revision)
+    page_cache.bump_version(page_cache.POLLS, page_cache.profile(poll.owner_id))
+
+def purge_poll(poll_id, batch_size=None):
+    """
+        Removes a deleted poll and every row referring to it, batch_size rows
+        (default POLL_PURGE_BATCH_SIZE) per statement, each statement its own
+        transaction. Nothing is loaded into Python, unlike Model.delete(),
+        whose collector reads every related row first. Can be stopped and
+        rerun at any point. Returns the number of rows removed.
+    """
+    batch_size = batch_size or settings.POLL_PURGE_BATCH_SIZE
+    quote = connection.ops.quote_name
+    removed = 0
+    for model in PURGED_MODELS:
+        sql = PURGE_BATCH_SQL.format(table=quote(model._meta.db_table))
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, {'poll_id': poll_id, 'batch_size': batch_size})
+                count = cursor.rowcount
+            removed += count
+            if count < batch_size:
+                break
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE id = %%s AND is_deleted' % quote(Poll._meta.db_table),
+                       [poll_id])
+        removed += cursor.rowcount
+    return removed
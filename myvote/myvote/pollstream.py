@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.db import connection
+
+from accounts import follow_graph
+from accounts.models import FollowedUsers, UserProfile
+from .models import Poll, PollStreamEntry
+from .pagination import KeysetPaginator
+
+BATCH_SIZE = 1000
+
+# A follow racing a poll's creation can have fan-out and backfill both
+# write the same (user, poll) entry; whichever comes second skips it.
+INSERT_ENTRIES_SQL = """
+    INSERT INTO myvote_pollstreamentry (user_id, poll_id, author_id, datetime)
+    VALUES {rows}
+    ON CONFLICT (user_id, poll_id) DO NOTHING
+"""
+
+def is_fanout_author(author_id):
+    """
+        Returns True if the author has few enough followers that their polls
+        are copied into each follower's PollStream. Reads the follower count
+        kept on the author's UserProfile.
+    """
+    followers = (UserProfile.objects.filter(user_id=author_id)
+                                    .values_list('follower_count', flat=True).first())
+    return (followers or 0) <= settings.POLLSTREAM_FANOUT_LIMIT
+
+def fan_out_poll(poll):
+    """
+        Copies a newly created poll into the PollStream of every follower of
+        its owner. Must run after the poll has been committed. Polls with
+        fanned_out=False are skipped; they are pulled in at read time.
+        Returns the number of stream entries written.
+    """
+    return fan_out_polls([poll])
+
+def _insert_entries(entries):
+    """
+        Writes (user_id, poll_id, author_id, datetime) stream entries with
+        one statement, skipping any already there. Returns the number
+        written.
+    """
+    if not entries:
+        return 0
+    rows = ', '.join(['(%s, %s, %s, %s)'] * len(entries))
+    with connection.cursor() as cursor:
+        cursor.execute(INSERT_ENTRIES_SQL.format(rows=rows), [value for entry in entries for value in entry])
+        return cursor.rowcount
+
+def fan_out_polls(polls):
+    """
+        fan_out_poll for many new polls at once. Reads each owner's
+        followers once, however many of the polls they own.
+    """
+    polls_by_owner = {}
+    for poll in polls:
+        if poll.fanned_out:
+            polls_by_owner.setdefault(poll.owner_id, []).append(poll)
+    written = 0
+    for owner_id, owner_polls in polls_by_owner.items():
+        follower_ids = (FollowedUsers.objects.filter(followed_id=owner_id)
+                                             .order_by()
+                                             .values_list('follower_id', flat=True)
+                                             .distinct())
+        batch = []
+        for follower_id in follower_ids.iterator():
+            for poll in owner_polls:
+                batch.append((follower_id, poll.id, owner_id, poll.datetime))
+            if len(batch) >= BATCH_SIZE:
+                written += _insert_entries(batch)
+                batch = []
+        written += _insert_entries(batch)
+    return written
+
+def backfill(follower_id, author_id):
+    """
+        Copies the author's most recent fanned-out polls into the stream of a
+        new follower. Bounded by POLLSTREAM_BACKFILL_SIZE.
+    """
+    existing = PollStreamEntry.objects.filter(user_id=follower_id, author_id=author_id).values('poll_id')
+    polls = (Poll.objects.filter(owner_id=author_id, fanned_out=True)
+                         .exclude(pk__in=existing)
+                         .order_by('-datetime', '-id')
+                         .values_list('id', 'datetime')[:settings.POLLSTREAM_BACKFILL_SIZE])
+    _insert_entries([(follower_id, poll_id, author_id, datetime) for poll_id, datetime in polls])
+
+def prune(follower_id, author_id):
+    """ Removes an unfollowed author's polls from the follower's stream. """
+    PollStreamEntry.objects.filter(user_id=follower_id, author_id=author_id).delete()
+
+
+class PollStreamPaginator(KeysetPaginator):
+    """
+        Pages through a user's home PollStream, newest first. Merges the
+        user's materialized PollStreamEntry rows with the polls of followed
+        authors that were not fanned out. Both sources are read with the same
+        (datetime, poll id) cursor, so each page is two index range scans.
+    """
+    ENTRY_KEYS = ('datetime', 'poll_id')
+
+    def __init__(self, user, per_page):
+        followed_ids = follow_graph.followed_ids(user.id)
+        pulled_polls = Poll.objects.filter(fanned_out=False, owner_id__in=followed_ids)
+        super().__init__(pulled_polls.select_related('owner'), per_page)
+        # Entries of deleted polls stay until the poll is purged.
+        self.entries = (PollStreamEntry.objects.filter(user=user, poll__is_deleted=False)
+                                               .select_related('poll__owner'))
+
+    def _fetch(self, values, descending, limit):
+        entries = self.seek(self.entries, self.ENTRY_KEYS, values, descending)[:limit]
+        polls = {entry.poll.id: entry.poll for entry in entries}
+        for poll in super()._fetch(values, descending, limit):
+            polls.setdefault(poll.id, poll)
+        merged = sorted(polls.values(), key=lambda poll: (poll.datetime, poll.id), reverse=descending)
+        return merged[:limit]
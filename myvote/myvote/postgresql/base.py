@@ -0,0 +1,28 @@
+"""
+    The PostgreSQL backend, aware of the partitioned Vote table (see
+    myvote.partitions). Django 2.0 introspection only lists plain tables and
+    views, so without this the partitioned parent table would be missing
+    from flush, which fails as soon as a table it references is truncated.
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.introspection import DatabaseIntrospection as PostgresIntrospection
+from django.db.backends.base.introspection import TableInfo
+
+
+class DatabaseIntrospection(PostgresIntrospection):
+    def get_table_list(self, cursor):
+        """ Also returns partitioned tables, as tables. """
+        cursor.execute("""
+            SELECT c.relname, c.relkind
+            FROM pg_catalog.pg_class c
+            LEFT JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind IN ('r', 'v', 'p')
+                AND n.nspname NOT IN ('pg_catalog', 'pg_toast')
+                AND pg_catalog.pg_table_is_visible(c.oid)""")
+        return [TableInfo(row[0], {'r': 't', 'v': 'v', 'p': 't'}.get(row[1]))
+                for row in cursor.fetchall()
+                if row[0] not in self.ignored_tables]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    introspection_class = DatabaseIntrospection
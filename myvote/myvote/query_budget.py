@@ -0,0 +1,100 @@
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Collapses "IN (%s, %s, ...)" so queries differing only in list length share
+# a shape.
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """
+        Declares the most SQL queries a view may issue while handling one
+        request, middleware and template rendering included. Enforced by
+        QueryBudgetMiddleware. Must be the outermost decorator on the view.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def query_shape(sql):
+    """
+        Returns the shape of a query: its SQL with parameters left as
+        placeholders. Repeats of one shape in a request usually mean N+1.
+    """
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """
+        Database execute wrapper that records every statement run while it is
+        installed.
+    """
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated_shapes(self):
+        """ Returns (shape, count) pairs for shapes run more than once. """
+        shapes = Counter(query_shape(sql) for sql in self.queries)
+        return [(shape, count) for shape, count in shapes.most_common() if count > 1]
+
+    def record(self):
+        """ Context manager installing the recorder on every connection. """
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+
+class QueryBudgetMiddleware:
+    """
+        Records every SQL statement issued while handling a request. If the
+        view declared a budget with @query_budget and the request went over
+        it, logs a warning listing the repeated query shapes, or raises
+        QueryBudgetExceeded when QUERY_BUDGET_STRICT is set (as in tests).
+        Should be near the top of MIDDLEWARE so session and auth queries are
+        counted too.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and len(recorder) > budget:
+            self.report(request, recorder, budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+
+    def report(self, request, recorder, budget):
+        lines = ["%s %s ran %s queries, over its budget of %s." % (
+            request.method, request.path, len(recorder), budget)]
+        for shape, count in recorder.repeated_shapes():
+            lines.append("  %sx %s" % (count, shape))
+        message = "\n".join(lines)
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
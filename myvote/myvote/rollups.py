@@ -0,0 +1,183 @@
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import db_router, poll_cache
+from .models import VoteRollup
+
+# Vote counts per option and time bucket (see VoteRollup). Every vote adds
+# one to its option's minute bucket in the same transaction as the vote, so
+# the counts are always exact. compact() then folds minute buckets older
+# than ROLLUP_MINUTE_RETENTION_HOURS into hour buckets, and hour buckets
+# older than ROLLUP_HOUR_RETENTION_DAYS into day buckets, keeping a poll's rollups to a
+# few hundred rows however many votes it gets.
+
+MINUTE, HOUR, DAY = VoteRollup.MINUTE, VoteRollup.HOUR, VoteRollup.DAY
+
+# How far back each trend resolution reaches.
+TREND_WINDOWS = {
+    MINUTE: datetime.timedelta(hours=3),
+    HOUR: datetime.timedelta(days=7),
+    DAY: datetime.timedelta(days=365),
+}
+
+# Rows are listed in a fixed order, so concurrent batches lock the same
+# buckets in the same order and can't deadlock.
+ADD_SQL = """
+    INSERT INTO myvote_voterollup AS rollup (poll_id, option_id, resolution, bucket, count)
+    VALUES {rows}
+    ON CONFLICT (poll_id, bucket, resolution, option_id)
+    DO UPDATE SET count = rollup.count + EXCLUDED.count
+"""
+
+# Moves the rollups of some polls from one resolution to a coarser one.
+COMPACT_SQL = """
+    WITH moved AS (
+        DELETE FROM myvote_voterollup
+        WHERE poll_id = ANY(%(poll_ids)s) AND resolution = %(source)s AND bucket < %(cutoff)s
+        RETURNING poll_id, option_id, bucket, count
+    )
+    INSERT INTO myvote_voterollup AS rollup (poll_id, option_id, resolution, bucket, count)
+    SELECT poll_id, option_id, %(target)s, date_trunc(%(target)s, bucket), sum(count)
+    FROM moved
+    GROUP BY poll_id, option_id, date_trunc(%(target)s, bucket)
+    ON CONFLICT (poll_id, bucket, resolution, option_id)
+    DO UPDATE SET count = rollup.count + EXCLUDED.count
+"""
+
+# Recomputes the rollups of some polls from their Vote rows, each vote
+# counted at the resolution compact() would have left it in.
+REBUILD_SQL = """
+    DELETE FROM myvote_voterollup WHERE poll_id = ANY(%(poll_ids)s);
+
+    INSERT INTO myvote_voterollup (poll_id, option_id, resolution, bucket, count)
+    SELECT poll_id, option_id, resolution, date_trunc(resolution, datetime), count(*)
+    FROM (
+        SELECT poll_id, option_id, datetime,
+               CASE WHEN datetime >= %(minute_cutoff)s THEN 'minute'
+                    WHEN datetime >= %(hour_cutoff)s THEN 'hour'
+                    ELSE 'day' END AS resolution
+        FROM myvote_vote
+        WHERE poll_id = ANY(%(poll_ids)s)
+    ) votes
+    GROUP BY poll_id, option_id, resolution, date_trunc(resolution, datetime);
+"""
+
+POLL_TREND_SQL = """
+    SELECT date_trunc(%(resolution)s, bucket) AS time, option_id, sum(count)
+    FROM myvote_voterollup
+    WHERE poll_id = %(poll_id)s AND bucket >= %(since)s
+    GROUP BY time, option_id
+    ORDER BY time, option_id
+"""
+
+OWNER_TREND_SQL = """
+    SELECT date_trunc(%(resolution)s, rollup.bucket) AS time, sum(rollup.count)
+    FROM myvote_voterollup rollup
+    JOIN myvote_poll poll ON poll.id = rollup.poll_id
+    WHERE poll.owner_id = %(owner_id)s AND NOT poll.is_deleted AND rollup.bucket >= %(since)s
+    GROUP BY time
+    ORDER BY time
+"""
+
+
+def _minute(moment):
+    return moment.replace(second=0, microsecond=0)
+
+def add_votes(votes):
+    """
+        Counts votes, (poll_id, option_id, datetime) tuples, in their minute
+        buckets with one statement. Call it in the transaction writing them.
+    """
+    counts = Counter((poll_id, _minute(moment), option_id) for poll_id, option_id, moment in votes)
+    if not counts:
+        return
+    params = []
+    for (poll_id, bucket, option_id), count in sorted(counts.items()):
+        params.extend([poll_id, option_id, MINUTE, bucket, count])
+    rows = ', '.join(['(%s, %s, %s, %s, %s)'] * len(counts))
+    with connection.cursor() as cursor:
+        cursor.execute(ADD_SQL.format(rows=rows), params)
+
+def cutoffs(now=None):
+    """ Returns (minute cutoff, hour cutoff): where each resolution ends. """
+    now = now or timezone.now()
+    return (now - datetime.timedelta(hours=settings.ROLLUP_MINUTE_RETENTION_HOURS),
+            now - datetime.timedelta(days=settings.ROLLUP_HOUR_RETENTION_DAYS))
+
+def compact(poll_ids, now=None):
+    """ Folds the polls' old minute and hour buckets into coarser ones. """
+    minute_cutoff, hour_cutoff = cutoffs(now)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(COMPACT_SQL, {'poll_ids': list(poll_ids), 'source': MINUTE,
+                                     'target': HOUR, 'cutoff': minute_cutoff})
+        cursor.execute(COMPACT_SQL, {'poll_ids': list(poll_ids), 'source': HOUR,
+                                     'target': DAY, 'cutoff': hour_cutoff})
+
+def rebuild(poll_ids, now=None):
+    """ Recomputes the polls' rollups from their Vote rows. """
+    minute_cutoff, hour_cutoff = cutoffs(now)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(REBUILD_SQL, {'poll_ids': list(poll_ids), 'minute_cutoff': minute_cutoff,
+                                     'hour_cutoff': hour_cutoff})
+
+def _since(resolution, now):
+    return now - TREND_WINDOWS[resolution]
+
+def poll_trend(poll_id, resolution, now=None):
+    """
+        Returns the poll's votes per resolution bucket over the last
+        TREND_WINDOWS[resolution], as a list of (bucket start,
+        {option id: count}). Older buckets compacted to a coarser resolution
+        are listed at their own start.
+    """
+    since = _since(resolution, now or timezone.now())
+    trend = []
+    with connection.cursor() as cursor:
+        cursor.execute(POLL_TREND_SQL, {'resolution': resolution, 'poll_id': poll_id, 'since': since})
+        for time, option_id, count in cursor.fetchall():
+            if not trend or trend[-1][0] != time:
+                trend.append((time, {}))
+            trend[-1][1][option_id] = count
+    return trend
+
+def owner_trend(owner_id, resolution, now=None):
+    """
+        Returns the votes on all of a user's polls per resolution bucket, as
+        a list of (bucket start, count). See poll_trend.
+    """
+    since = _since(resolution, now or timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(OWNER_TREND_SQL, {'resolution': resolution, 'owner_id': owner_id, 'since': since})
+        return [(time, count) for time, count in cursor.fetchall()]
+
+def get_poll_trend(poll_id, resolution):
+    """
+        poll_trend, cached under the poll's results version like its
+        results. Compaction leaves every trend unchanged (the windows are
+        shorter than the retentions), so only votes invalidate it.
+    """
+    key = 'poll:%s:trend:%s:%s' % (poll_id, resolution, poll_cache.get_results_version(poll_id))
+    trend = cache.get(key)
+    if trend is None:
+        # From the primary, for the same reason as poll_cache.get_results.
+        with db_router.use_primary():
+            trend = poll_trend(poll_id, resolution)
+        cache.set(key, trend, poll_cache.RESULTS_TIMEOUT)
+    return trend
+
+def get_owner_trend(owner_id, resolution):
+    """
+        owner_trend, cached for PROFILE_TREND_TIMEOUT seconds: votes on a
+        user's polls don't invalidate it.
+    """
+    key = 'user:%s:trend:%s' % (owner_id, resolution)
+    trend = cache.get(key)
+    if trend is None:
+        trend = owner_trend(owner_id, resolution)
+        cache.set(key, trend, settings.PROFILE_TREND_TIMEOUT)
+    return trend
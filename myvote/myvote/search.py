@@ -0,0 +1,106 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection, close_old_connections
+from django.db.models import F, Q
+
+from .models import Poll
+
+# Polls ranked below this are considered weak matches and left out.
+POLL_MIN_RANK = 0.3
+# Most poll results returned for a single search.
+POLL_RESULT_LIMIT = 100
+# Most user results returned for a single search.
+USER_RESULT_LIMIT = 100
+
+def find_polls(search_val, limit=POLL_RESULT_LIMIT):
+    """
+        Returns the top polls matching search_val, best match first. Matching
+        uses the GIN-indexed search_vector column (search_vector @@ query), so
+        only matching rows are ranked.
+    """
+    query = SearchQuery(search_val)
+    return (Poll.objects.filter(search_vector=query)
+                        .annotate(rank=SearchRank(F('search_vector'), query))
+                        .filter(rank__gte=POLL_MIN_RANK)
+                        .select_related('owner')
+                        .order_by('-rank', '-id')[:limit])
+
+def find_users(search_val, limit=USER_RESULT_LIMIT):
+    """
+        Returns the users whose username contains search_val or is similar to
+        it, most similar first. Both conditions are served by the pg_trgm
+        GIN indexes on auth_user.username (see accounts migration 0004).
+    """
+    return (User.objects.filter(Q(username__icontains=search_val) |
+                                Q(username__trigram_similar=search_val))
+                        .annotate(similarity=TrigramSimilarity('username', search_val))
+                        .select_related('bio')
+                        .order_by('-similarity', 'username')[:limit])
+
+# The newest polls of each user in one statement: a LIMITed index scan of
+# (owner, datetime, id) per user rather than one query per user.
+RECENT_POLLS_SQL = """
+    SELECT recent.* FROM unnest(%s) AS users(id)
+    CROSS JOIN LATERAL (
+        SELECT * FROM myvote_poll
+        WHERE myvote_poll.owner_id = users.id AND NOT myvote_poll.is_deleted
+        ORDER BY myvote_poll.datetime DESC, myvote_poll.id DESC
+        LIMIT %s
+    ) recent
+"""
+
+def attach_recent_polls(users, count=2):
+    """
+        Sets user.recent_polls on each user in users to a list of their count
+        newest polls, for display next to user search results.
+    """
+    users_by_id = {}
+    for user in users:
+        user.recent_polls = []
+        users_by_id[user.id] = user
+    if not users_by_id:
+        return
+    for poll in Poll.objects.raw(RECENT_POLLS_SQL, [list(users_by_id), count]):
+        users_by_id[poll.owner_id].recent_polls.append(poll)
+    for user in users_by_id.values():
+        user.recent_polls.sort(key=lambda poll: (poll.datetime, poll.id), reverse=True)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _search_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.SEARCH_THREADS,
+                                           thread_name_prefix='search')
+        return _executor
+
+def _run_in_search_thread(func):
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+def search_all(search_val, limit=3):
+    """
+        Returns (users, polls) matching search_val, the users with their
+        recent polls attached. The poll search runs on the search thread pool
+        while the user queries run in the calling thread, so the request
+        waits for the slower of the two rather than both. They run one after
+        the other when SEARCH_THREADS is 0 or inside a transaction, whose
+        uncommitted rows a search thread's connection could not see.
+    """
+    def polls():
+        return list(find_polls(search_val, limit))
+
+    future = None
+    if settings.SEARCH_THREADS and not connection.in_atomic_block:
+        future = _search_executor().submit(_run_in_search_thread, polls)
+    users = list(find_users(search_val, limit))
+    attach_recent_polls(users)
+    return users, future.result() if future else polls()
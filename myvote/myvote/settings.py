@@ -46,6 +46,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'myvote.query_budget.QueryBudgetMiddleware',
+    'myvote.db_router.ReplicaPinMiddleware',
+    'myvote.page_cache.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,15 +85,80 @@ WSGI_APPLICATION = 'myvote.wsgi.application'
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        # django.db.backends.postgresql, aware of partitioned tables.
+        "ENGINE": "myvote.postgresql",
         "NAME": os.environ['DB_NAME'],
         "USER": os.getenv('DB_USER', ""),
         "PASSWORD": os.getenv('DB_PASSWORD', ""),
         "HOST": os.environ['DB_HOST'],
         "PORT": os.environ['DB_PORT'],
+        # Seconds to keep a connection open between requests. 0 closes it at
+        # the end of each request.
+        "CONN_MAX_AGE": int(os.getenv('DB_CONN_MAX_AGE', '0')),
     }
 }
 
+# Read replicas (see myvote.db_router)
+# DB_REPLICA_HOSTS is a comma separated list of host:port streaming replicas
+# of the primary, added as the aliases replica1, replica2... They share the
+# primary's name and credentials, and its test database when testing.
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    replica_host, _, replica_port = replica.strip().partition(':')
+    DATABASES['replica%s' % number] = dict(
+        DATABASES['default'],
+        HOST=replica_host,
+        PORT=replica_port or DATABASES['default']['PORT'],
+        CONN_MAX_AGE=int(os.getenv('DB_REPLICA_CONN_MAX_AGE', '60')),
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['myvote.db_router.ReplicaRouter']
+# Seconds a client reads from the primary after writing, so it sees its own
+# writes while the replicas catch up.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+# Seconds an unreachable replica is left alone before it is tried again.
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', '30'))
+# Persistent replica connections are checked with a trivial query at most
+# this often, in seconds, so a dropped connection fails over instead of
+# failing the request.
+DB_HEALTH_CHECK_INTERVAL = int(os.getenv('DB_HEALTH_CHECK_INTERVAL', '10'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+# Defaults to a per-process in-memory cache. In production point CACHE_BACKEND
+# and CACHE_LOCATION at a shared backend (e.g. memcached) so every worker
+# sees the same cached data and invalidations.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
+# Sessions and authentication
+# Sessions are read from the cache and written through to the database.
+# A session is only written when it changes, and flash messages travel in a
+# signed cookie instead, so showing one doesn't write the session either.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+SESSION_SAVE_EVERY_REQUEST = False
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Logged in users are loaded from the cache (see accounts.backends) and
+# dropped from it whenever they are saved or deleted.
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
+USER_CACHE_TIMEOUT = int(os.getenv('USER_CACHE_TIMEOUT', str(60 * 60)))
+
+# Password hashing (see accounts.hashing)
+# Processes per worker hashing passwords for logins, signups and the account
+# forms. 0 hashes in the request thread.
+PASSWORD_HASHING_PROCESSES = int(os.getenv('PASSWORD_HASHING_PROCESSES', '2'))
+# Most hashes a worker lets run or wait at once. Requests past it are turned
+# away with a message to try again.
+PASSWORD_HASHING_QUEUE_DEPTH = int(os.getenv('PASSWORD_HASHING_QUEUE_DEPTH', '8'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -140,3 +208,74 @@ LOGOUT_REDIRECT_URL = 'home'
 # Email configuration
 # EMAIL_HOST = 'localhost'
 # EMAIL_PORT = 1025
+
+# Vote ingestion
+# 'sync' writes each vote inside the request. 'buffered' validates and
+# dedupes votes in the request, then writes them in batches with bulk_create
+# once VOTE_BUFFER_BATCH_SIZE votes are waiting or every
+# VOTE_BUFFER_FLUSH_INTERVAL seconds (0 disables the background flusher).
+VOTE_INGESTION_MODE = os.getenv('VOTE_INGESTION_MODE', 'sync')
+VOTE_BUFFER_BATCH_SIZE = int(os.getenv('VOTE_BUFFER_BATCH_SIZE', '500'))
+VOTE_BUFFER_FLUSH_INTERVAL = float(os.getenv('VOTE_BUFFER_FLUSH_INTERVAL', '1.0'))
+# Hash partitions myvote_vote is created with on PostgreSQL 11 and later, and
+# the default target of the create_vote_partitions command.
+VOTE_PARTITIONS = int(os.getenv('VOTE_PARTITIONS', '16'))
+
+# Vote trend rollups (see myvote.rollups)
+# Minute buckets older than this many hours are folded into hour buckets by
+# compact_vote_rollups, and hour buckets older than this many days into day
+# buckets.
+ROLLUP_MINUTE_RETENTION_HOURS = int(os.getenv('ROLLUP_MINUTE_RETENTION_HOURS', '48'))
+ROLLUP_HOUR_RETENTION_DAYS = int(os.getenv('ROLLUP_HOUR_RETENTION_DAYS', '90'))
+# How long a profile's vote trend is cached, in seconds. Poll trends are
+# keyed on the poll's results version and don't need a short timeout.
+PROFILE_TREND_TIMEOUT = int(os.getenv('PROFILE_TREND_TIMEOUT', '60'))
+
+# Explore page rankings (see myvote.trending)
+# A vote counts half as much towards a poll's trending score after this many
+# hours. Run update_trending after changing it.
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', '24'))
+# Votes don't invalidate cached anonymous trending and top pages; they are
+# rebuilt at least this often instead, in seconds.
+RANKED_PAGE_SECONDS = int(os.getenv('RANKED_PAGE_SECONDS', '60'))
+
+# Live poll results (Server-Sent Events)
+# How often each worker checks the watched polls for new votes, in seconds.
+# 0 disables the background check.
+LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', '1.0'))
+LIVE_KEEPALIVE_INTERVAL = float(os.getenv('LIVE_KEEPALIVE_INTERVAL', '15'))
+# Streams are closed after this long to free the worker thread; the browser
+# reconnects by itself.
+LIVE_STREAM_MAX_SECONDS = float(os.getenv('LIVE_STREAM_MAX_SECONDS', '300'))
+
+# How long each user's followed set stays cached, in seconds. Follows and
+# unfollows move it to a new cache key, so this only bounds the space
+# taken by outdated ones.
+FOLLOW_GRAPH_TIMEOUT = int(os.getenv('FOLLOW_GRAPH_TIMEOUT', str(60 * 60 * 24)))
+
+# How long anonymous pages are kept by AnonymousPageCacheMiddleware, in
+# seconds. Pages are keyed on version stamps, so this only bounds the
+# space taken by outdated ones.
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '300'))
+
+# Threads per worker running search_all's poll search alongside its user
+# search. 0 runs them one after the other in the request thread.
+SEARCH_THREADS = int(os.getenv('SEARCH_THREADS', '4'))
+
+# Most polls accepted by one request to the batch poll creation endpoint.
+POLL_BATCH_MAX_SIZE = int(os.getenv('POLL_BATCH_MAX_SIZE', '1000'))
+# Rows deleted per statement when purge_deleted_polls removes a deleted
+# poll's votes, rollups, stream entries and options.
+POLL_PURGE_BATCH_SIZE = int(os.getenv('POLL_PURGE_BATCH_SIZE', '5000'))
+
+# Query budgets
+# Views declare the most queries a request may run with @query_budget. Going
+# over logs a warning, or raises QueryBudgetExceeded when strict (tests).
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+
+# PollStream configuration
+# Authors with more followers than this don't have their polls copied into
+# every follower's stream; their polls are merged in when a stream is read.
+POLLSTREAM_FANOUT_LIMIT = int(os.getenv('POLLSTREAM_FANOUT_LIMIT', '10000'))
+# Number of an author's most recent polls copied into a new follower's stream.
+POLLSTREAM_BACKFILL_SIZE = int(os.getenv('POLLSTREAM_BACKFILL_SIZE', '200'))
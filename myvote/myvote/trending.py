@@ -0,0 +1,80 @@
+"""
+    Trending scores of polls, for the explore page's trending sort. A
+    poll's trend is the sum of its votes, each weighted by
+    2 ** (-age / TRENDING_HALF_LIFE_HOURS). Rather than decay every poll's
+    score as time passes, a vote cast at time t adds 2 ** (t / half life),
+    measured from EPOCH: the ratio between two polls' scores is the same
+    either way, so they rank the same, and a poll's score never needs
+    changing until it gets another vote.
+
+    Those sums soon outgrow a float, so Poll.trending_score holds their
+    natural log. Adding a vote's weight w to a score s is then
+    max(s, w) + ln(1 + exp(-|s - w|)), which the vote path folds into its
+    update of the poll's vote count (see bump). recompute rebuilds scores
+    from the vote rollups, after the half life changes or to repair them.
+"""
+import datetime
+import math
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+EPOCH = datetime.datetime(2018, 1, 1, tzinfo=timezone.utc)
+
+# Postgres raises an error rather than round exp() of a large negative
+# number down to zero, so exponents are kept above -700; exp(-700) is far
+# below anything that could change a ranking.
+BUMP_SQL = 'GREATEST(trending_score, %s) + LN(1 + EXP(-LEAST(ABS(trending_score - %s), 700)))'
+
+# Each rollup bucket's votes are counted at the middle of the bucket. The
+# sum of exponentials is taken relative to the poll's largest, so it stays
+# in range.
+RECOMPUTE_SQL = """
+    UPDATE myvote_poll poll SET trending_score = COALESCE(scores.score, 0)
+    FROM (
+        SELECT poll.id,
+               buckets.top + LN(SUM(buckets.count * EXP(GREATEST(buckets.weight - buckets.top, -700)))) AS score
+        FROM myvote_poll poll
+        LEFT JOIN (
+            SELECT poll_id, count, weight, MAX(weight) OVER (PARTITION BY poll_id) AS top
+            FROM (
+                SELECT poll_id, SUM(count) AS count,
+                       EXTRACT(EPOCH FROM bucket + CASE resolution WHEN 'minute' THEN interval '30 seconds'
+                                                                   WHEN 'hour' THEN interval '30 minutes'
+                                                                   ELSE interval '12 hours' END
+                                          - %(epoch)s) * %(rate)s AS weight
+                FROM myvote_voterollup
+                WHERE poll_id = ANY(%(poll_ids)s) AND count > 0
+                GROUP BY poll_id, bucket, resolution
+            ) rollups
+        ) buckets ON buckets.poll_id = poll.id
+        WHERE poll.id = ANY(%(poll_ids)s)
+        GROUP BY poll.id, buckets.top
+    ) scores
+    WHERE poll.id = scores.id
+"""
+
+
+def _rate():
+    """ Log weight gained per second: ln 2 per half life. """
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 60 * 60)
+
+def weight(moment, votes=1):
+    """ The log weight of votes cast at moment. """
+    return (moment - EPOCH).total_seconds() * _rate() + math.log(votes)
+
+def bump(votes, moment=None):
+    """
+        An expression for Poll.trending_score with votes more cast at moment
+        (default now), to use in the update of the poll's vote count.
+    """
+    added = weight(moment or timezone.now(), votes)
+    return RawSQL(BUMP_SQL, [added, added], output_field=FloatField())
+
+def recompute(poll_ids):
+    """ Rebuilds the trending scores of the polls from their vote rollups. """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(RECOMPUTE_SQL, {'poll_ids': list(poll_ids), 'epoch': EPOCH, 'rate': _rate()})
@@ -24,8 +24,11 @@ urlpatterns = [
     path('explore/recent/<int:user_id>', views.explore_recent_polls, name='explore recent polls'),
     path('explore/', views.explore_polls, name='explore polls'),
     path('create_poll/', views.create_poll, name='create poll'),
+    path('create_poll/batch/', views.create_polls_batch, name='create polls batch'),
     path('vote_poll/<int:poll_id>/<int:option_id>', views.vote_poll, name='vote poll'),
     path('view_poll/<int:poll_id>/', views.view_poll, name='view poll'),
+    path('view_poll/<int:poll_id>/trend/', views.poll_trend, name='poll trend'),
+    path('view_poll/<int:poll_id>/live/', views.poll_results_stream, name='poll results stream'),
     path('delete_poll/<int:poll_id>/', views.delete_poll, name='delete poll'),
     path('search', views.search_all, name="search"),
     path('search/users/', views.search_users, name="search users"),
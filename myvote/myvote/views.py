@@ -1,3 +1,7 @@
+import json
+import time
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
@@ -5,46 +9,83 @@ from django.contrib import messages
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
 from django.core.mail import send_mail
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.http import JsonResponse, StreamingHttpResponse, Http404
+from django.views.decorators.http import require_POST
+from django.db import IntegrityError
 
-from .models import Poll, Option, Vote
+from accounts import follow_graph
+from .models import Poll, Option
 from .forms import PollCreationForm, PollDeletionForm
+from .pagination import KeysetPaginator
+from .query_budget import query_budget
+from .db_router import writes
+from . import live, page_cache, poll_cache, polls, pollstream, rollups, search
+from .votes import record_vote, has_voted
+from .vote_buffer import vote_buffer
 
+@query_budget(5)
 def index(request):
     """ Renders homepage/index view. """
     if request.user.is_authenticated:
-        followed_users = request.user.followed.values_list('followed_id')
-        followed_poll_list = Poll.objects.filter(owner_id__in=followed_users).order_by('-datetime')
-
-        paginator = Paginator(followed_poll_list, 5)
-        page = request.GET.get('page')
-        followed_polls = paginator.get_page(page)
+        paginator = pollstream.PollStreamPaginator(request.user, 5)
+        followed_polls = paginator.get_page(after=request.GET.get('after'),
+                                            before=request.GET.get('before'))
     else:
-        followed_users = None
         followed_polls = None
     return render(request, 'myvote/index.html',
                   {'followed_polls': followed_polls})
 
+# The explore page's sorts: (page title, keys of KeysetPaginator). Each
+# has a matching index on Poll, so every page is an index scan.
+EXPLORE_SORTS = {
+    'new': ("Explore Polls", ('datetime', 'id')),
+    'trending': ("Trending Polls", ('trending_score', 'id')),
+    'top': ("Top Polls", ('vote_count', 'id')),
+}
+
+def _explore_sort(request):
+    sort = request.GET.get('sort')
+    return sort if sort in EXPLORE_SORTS else 'new'
+
+def _explore_etag(request):
+    sort = _explore_sort(request)
+    etag = 'explore-%s' % page_cache.get_version(page_cache.POLLS)
+    if sort != 'new':
+        # Votes reorder these without moving the stamp, so their pages
+        # also change every RANKED_PAGE_SECONDS.
+        etag += '-%s-%s' % (sort, int(time.time() // settings.RANKED_PAGE_SECONDS))
+    return etag
+
+def _explore_last_modified(request):
+    if _explore_sort(request) != 'new':
+        return None
+    return page_cache.version_datetime(page_cache.get_version(page_cache.POLLS))
+
+@query_budget(4)
+@page_cache.anonymous_page(_explore_etag, _explore_last_modified)
 def explore_polls(request):
     """
-        Allows users to explore and find polls. As of now explore simply
-        displays all polls in system, ordered by datetime added descending.
-        Produces two values for use in template: 'page_title', and 'polls'.
+        Allows users to explore and find polls. ?sort= orders them by posted
+        datetime (new, the default), trending score (trending) or votes
+        (top), all descending.
 
         Template values:
             -  page_title = a String representing the title of the page.
-            -  polls = a query_set of Poll objects, ordered by posted datetime
-                       descending.
+            -  polls = a KeysetPage of Poll objects in the chosen order.
+            -  sort = the chosen sort, and sorts = every sort's name.
     """
-    page_title = "Explore Polls"
-    poll_list = Poll.objects.all().order_by('-datetime')
-    paginator = Paginator(poll_list, 10)
-    page = request.GET.get('page')
-    polls = paginator.get_page(page)
+    sort = _explore_sort(request)
+    page_title, keys = EXPLORE_SORTS[sort]
+    poll_list = Poll.objects.select_related('owner')
+    paginator = KeysetPaginator(poll_list, 10, keys=keys)
+    polls = paginator.get_page(after=request.GET.get('after'),
+                               before=request.GET.get('before'))
     return render(request, 'myvote/recent_polls.html',
-                  {'page_title': page_title, 'polls': polls})
+                  {'page_title': page_title, 'polls': polls,
+                   'sort': sort, 'sorts': list(EXPLORE_SORTS)})
 
 
+@query_budget(5)
 def explore_recent_polls(request, user_id):
     """
         Allows users to view all recent polls from a given user. Produces two
@@ -52,26 +93,25 @@ def explore_recent_polls(request, user_id):
 
         Template values:
             -  page_title = a String representing the title of the page.
-            -  polls = a query_set of Poll objects, ordered by posted datetime
+            -  polls = a KeysetPage of Poll objects, ordered by posted datetime
                        descending.
     """
     view_user = User.objects.get(pk=user_id)
     page_title = view_user.username + "'s Recent Polls"
-    poll_list = view_user.polls.order_by('-datetime')
-    paginator = Paginator(poll_list, 10)
-    page = request.GET.get('page')
-    polls = paginator.get_page(page)
+    poll_list = view_user.polls.select_related('owner')
+    paginator = KeysetPaginator(poll_list, 10)
+    polls = paginator.get_page(after=request.GET.get('after'),
+                               before=request.GET.get('before'))
     return render(request, 'myvote/recent_polls.html',
                   {'page_title': page_title, 'polls': polls})
 
+@query_budget(7)
 def search_all(request):
     search_val = request.GET.get('search_val')
 
     if search_val:
-        user_search_results = User.objects.filter(username__icontains=search_val)[:3]
-        poll_vector = SearchVector('name', weight='A') + SearchVector('description', weight='B')
-        poll_query = SearchQuery(search_val)
-        poll_search_results = Poll.objects.annotate(rank=SearchRank(poll_vector, poll_query)).filter(rank__gte=0.3).order_by('rank')[:3]
+        user_search_results, poll_search_results = search.search_all(search_val)
+        follow_graph.follow_states(request.user, user_search_results)
     else:
         user_search_results = None
         poll_search_results = None
@@ -81,14 +121,17 @@ def search_all(request):
                    'poll_search_results': poll_search_results,
                    'search_val': search_val,})
 
+@query_budget(7)
 def search_users(request):
     search_val = request.GET.get('search_val')
 
     if search_val:
-        user_search_results_list = User.objects.filter(username__icontains=search_val)
+        user_search_results_list = search.find_users(search_val)
         paginator = Paginator(user_search_results_list, 10)
         page = request.GET.get('page')
         user_search_results = paginator.get_page(page)
+        search.attach_recent_polls(user_search_results)
+        follow_graph.follow_states(request.user, user_search_results)
     else:
         user_search_results = None
 
@@ -97,13 +140,12 @@ def search_users(request):
                    'result_type': 'User',
                    'search_val': search_val,})
 
+@query_budget(5)
 def search_polls(request):
     search_val = request.GET.get('search_val')
 
     if search_val:
-        poll_vector = SearchVector('name', weight='A') + SearchVector('description', weight='B')
-        poll_query = SearchQuery(search_val)
-        poll_search_results_list = Poll.objects.annotate(rank=SearchRank(poll_vector, poll_query)).filter(rank__gte=0.3).order_by('rank')
+        poll_search_results_list = search.find_polls(search_val)
         paginator = Paginator(poll_search_results_list, 10)
         page = request.GET.get('page')
         poll_search_results = paginator.get_page(page)
@@ -116,6 +158,7 @@ def search_polls(request):
                    'search_val': search_val,})
 
 
+@query_budget(8)
 @login_required
 def create_poll(request):
     """
@@ -126,29 +169,7 @@ def create_poll(request):
         options = [val for key, val in request.POST.items() if 'option' in key]
         form = PollCreationForm(request.POST, options=options)
         if form.is_valid():
-            poll_name = form.cleaned_data['name']
-            poll_description = form.cleaned_data['description']
-            poll = Poll(name=poll_name,
-                        description=poll_description,
-                        owner=request.user)
-            poll.save()
-
-            options = [val for key, val in form.cleaned_data.items() if 'option' in key]
-            for option in options:
-                option = Option(option_text=option, poll=poll)
-                option.save()
-            # print('\n\n\n')
-            # print(options)
-            # print('\n\n\n')
-
-            # option1_text = form.cleaned_data['option1']
-            # option1 = Option(option_text=option1_text, poll=poll)
-            # option1.save()
-
-            # option2_text = form.cleaned_data['option2']
-            # option2 = Option(option_text=option2_text, poll=poll)
-            # option2.save()
-
+            poll, = polls.create_polls(request.user, [polls.cleaned_poll(form)])
             messages.success(request, 'Poll successfully created.')
             return redirect(reverse('view poll', args=(poll.id,)))
     else:
@@ -157,43 +178,171 @@ def create_poll(request):
     return render(request, 'myvote/create_poll.html', {'form': form})
 
 
+@query_budget(12)
+@require_POST
+def create_polls_batch(request):
+    """
+        Creates many polls at once for the logged in user. Takes a JSON array
+        of polls, each an object with a name, an optional description and a
+        list of options, validated like the create poll form. Either every
+        poll is created, in one transaction, or none are.
+
+        Responds 201 with the new polls and their option ids, 400 with the
+        errors of each invalid poll (keyed by its index), or 401 if not
+        logged in.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'errors': {'__all__': ['Login required.']}}, status=401)
+    try:
+        batch = json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        return JsonResponse({'errors': {'__all__': ['Invalid JSON.']}}, status=400)
+    try:
+        cleaned = polls.validate_batch(batch)
+    except polls.InvalidBatch as e:
+        return JsonResponse({'errors': e.errors}, status=400)
+
+    new_polls = polls.create_polls(request.user, cleaned)
+    return JsonResponse({'polls': [
+        {'id': poll.id,
+         'name': poll.name,
+         'options': [{'id': option.id, 'option_text': option.option_text}
+                     for option in poll.option_list]}
+        for poll in new_polls]}, status=201)
+
+
+def _view_poll_etag(request, poll_id):
+    # Results versions are counters rather than times, so no Last-Modified.
+    return 'poll-%s-%s' % (poll_id, poll_cache.get_results_version(poll_id))
+
+@query_budget(5)
+@page_cache.anonymous_page(_view_poll_etag)
 def view_poll(request, poll_id):
-    # TODO: implement F() to protect against race conditions
-    poll = get_object_or_404(Poll, pk=poll_id)
-    if request.user.is_anonymous or poll.user_has_voted(request.user):
+    """
+        Displays a poll and its results. The results are shared by every
+        viewer and come from the results cache; only the has-voted flag is
+        looked up per user.
+
+        Template values:
+            -  poll = the results dict from poll_cache.get_results.
+            -  user_has_voted = True if the user has voted or is anonymous.
+    """
+    poll = poll_cache.get_results(poll_id)
+    if request.user.is_anonymous or has_voted(poll_id, request.user):
         user_has_voted = True
     else:
         user_has_voted = False
     return render(request, 'myvote/view_poll.html',
                   {'poll': poll, 'user_has_voted': user_has_voted})
 
+def trend_resolution(request):
+    """
+        Returns the resolution asked for by the trend request's ?resolution=
+        (hour by default), or None if it isn't one of the rollup resolutions.
+    """
+    resolution = request.GET.get('resolution', rollups.HOUR)
+    return resolution if resolution in rollups.TREND_WINDOWS else None
+
+def invalid_resolution():
+    return JsonResponse({'errors': {'resolution': [
+        'Resolution must be one of: %s.' % ', '.join(rollups.TREND_WINDOWS)]}}, status=400)
+
+@query_budget(3)
+def poll_trend(request, poll_id):
+    """
+        The poll's votes over time for the trend chart on view_poll, read from
+        the vote rollups. Responds with JSON of the form
+            {"resolution": "hour",
+             "options": [{"id", "option_text"}, ...],
+             "buckets": [{"time": bucket start, "counts": [count per option]}, ...]}
+        with counts in the order of options. ?resolution= is minute, hour
+        (the default) or day; anything else gets a 400.
+    """
+    resolution = trend_resolution(request)
+    if resolution is None:
+        return invalid_resolution()
+    poll = poll_cache.get_results(poll_id)
+    option_ids = [option['id'] for option in poll['options']]
+    return JsonResponse({
+        'resolution': resolution,
+        'options': [{'id': option['id'], 'option_text': option['option_text']}
+                    for option in poll['options']],
+        'buckets': [{'time': time, 'counts': [counts.get(option_id, 0) for option_id in option_ids]}
+                    for time, counts in rollups.get_poll_trend(poll_id, resolution)],
+    })
+
+@query_budget(3)
+def poll_results_stream(request, poll_id):
+    """
+        Streams a poll's vote counts as Server-Sent Events for view_poll to
+        update in place: first every count, then the counts that change
+        while the page is open. Each event's data is JSON of the form
+        {"vote_count": total, "options": {option id: count}}, with
+        "deleted": true added if the poll is deleted.
+    """
+    # Subscribe before reading the snapshot so no vote falls in between.
+    subscription = live.broker.subscribe(poll_id)
+    try:
+        snapshot = poll_cache.get_results(poll_id)
+    except Http404:
+        live.broker.unsubscribe(poll_id, subscription)
+        raise
+    response = StreamingHttpResponse(live.event_stream(poll_id, subscription, snapshot),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@query_budget(10)
 @login_required
+@writes
 def vote_poll(request, poll_id, option_id):
+    """
+        Records the user's vote for an option of a poll. With
+        VOTE_INGESTION_MODE = 'buffered' the vote is validated, deduplicated
+        and handed to the vote buffer instead of being written in the request.
+    """
     poll = get_object_or_404(Poll, pk=poll_id)
-    if poll.user_has_voted(request.user):
-        messages.add_message(request, messages.ERROR, "You've already voted on this poll!")
+    try:
+        option = poll.options.get(pk=option_id)
+    except Option.DoesNotExist:
+        messages.add_message(request, messages.ERROR, "No such option exists.")
+        return redirect(reverse('view poll', args=(poll.id,)))
+
+    if settings.VOTE_INGESTION_MODE == 'buffered':
+        recorded = (not has_voted(poll.id, request.user) and
+                    vote_buffer.submit(poll.id, option.id, request.user.id))
     else:
+        # No has-voted check up front: the unique (poll, owner) constraint
+        # rejects a second vote, even from concurrent requests.
         try:
-            option = poll.options.get(pk=option_id)
-        except Exception:
-            messages.add_message(request, messages.ERROR, "No such option exists.")
-        else:
-            vote = Vote(option=option, owner=request.user, poll=poll)
-            vote.save()
-            messages.add_message(request, messages.SUCCESS, "Vote recorded successfully!")
+            record_vote(poll, option, request.user)
+            recorded = True
+            live.broker.notify(poll.id)
+        except IntegrityError:
+            recorded = False
 
+    if recorded:
+        messages.add_message(request, messages.SUCCESS, "Vote recorded successfully!")
+    else:
+        messages.add_message(request, messages.ERROR, "You've already voted on this poll!")
     return redirect(reverse('view poll', args=(poll.id,)))
 
+@query_budget(12)
 @login_required
 def delete_poll(request, poll_id):
     """
         If current user is logged in and owns poll, deletes poll with given poll_id.
+        The poll is only marked deleted (see polls.delete_poll), so this takes
+        the same time however many votes it has; purge_deleted_polls removes
+        it later.
     """
     poll = get_object_or_404(Poll, pk=poll_id)
     if request.user == poll.owner:
         if request.method == 'POST':
             # if current user is poll owner and has submitted post request, delete poll
-            deleted = poll.delete()
+            polls.delete_poll(poll)
             messages.add_message(request, messages.SUCCESS, "Poll successfully deleted")
             return redirect(reverse('home'))
         else:
@@ -0,0 +1,119 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections
+
+from . import live
+from .votes import record_votes, pending_vote_key
+
+logger = logging.getLogger(__name__)
+
+# How long a vote stays marked as pending. Must comfortably exceed the time a
+# vote can wait in the buffer, including retries.
+PENDING_TIMEOUT = 60 * 60
+
+
+class VoteBuffer:
+    """
+        Write-behind buffer for buffered vote ingestion. Requests submit
+        validated votes; they are deduplicated against the pending-vote keys
+        in the cache (shared between workers with a shared cache backend) and
+        appended to an in-process list. The list is written with record_votes
+        when it reaches VOTE_BUFFER_BATCH_SIZE or when the background flusher
+        wakes up every VOTE_BUFFER_FLUSH_INTERVAL seconds.
+
+        Once a batch commits, the live broker is told about its polls, as the
+        synchronous vote path does for each vote.
+
+        Delivery is at-least-once: a batch that fails to write is put back
+        and retried on the next flush, and record_votes skips votes that are
+        already stored, so replays never double count.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._votes = []
+        self._flusher = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._votes)
+
+    def submit(self, poll_id, option_id, owner_id):
+        """
+            Queues a vote. Returns False if the user already has a vote on
+            this poll waiting to be written.
+        """
+        if not cache.add(pending_vote_key(poll_id, owner_id), option_id, PENDING_TIMEOUT):
+            return False
+        with self._lock:
+            self._votes.append((poll_id, option_id, owner_id))
+            full = len(self._votes) >= settings.VOTE_BUFFER_BATCH_SIZE
+        self._start_flusher()
+        if full:
+            self.flush()
+        return True
+
+    def flush(self):
+        """ Writes every buffered vote. Returns the number of votes written. """
+        with self._lock:
+            batch, self._votes = self._votes, []
+        if not batch:
+            return 0
+        try:
+            return self._write(batch)
+        except IntegrityError:
+            # Usually a vote for an option deleted while it was buffered.
+            # Write the votes one at a time so only the bad ones are lost.
+            return self._flush_individually(batch)
+        except Exception:
+            logger.exception("Vote buffer flush failed; requeueing %s votes.", len(batch))
+            with self._lock:
+                self._votes[:0] = batch
+            return 0
+
+    def _write(self, batch):
+        written = record_votes(batch)
+        for poll_id in {vote.poll_id for vote in written}:
+            live.broker.notify(poll_id)
+        return len(written)
+
+    def _flush_individually(self, batch):
+        written = 0
+        for i, vote in enumerate(batch):
+            try:
+                written += self._write([vote])
+            except IntegrityError:
+                logger.warning("Dropping unwritable vote %s.", vote)
+                cache.delete(pending_vote_key(vote[0], vote[2]))
+            except Exception:
+                logger.exception("Vote buffer flush failed; requeueing %s votes.", len(batch) - i)
+                with self._lock:
+                    self._votes[:0] = batch[i:]
+                break
+        return written
+
+    def _start_flusher(self):
+        interval = settings.VOTE_BUFFER_FLUSH_INTERVAL
+        if not interval or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, args=(interval,),
+                                                 name='vote-buffer-flusher', daemon=True)
+                self._flusher.start()
+
+    def _run_flusher(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+vote_buffer = VoteBuffer()
+atexit.register(vote_buffer.flush)
@@ -0,0 +1,134 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Count
+
+from .models import Poll, Option, Vote
+from . import poll_cache, rollups, trending
+
+def record_vote(poll, option, user):
+    """
+        Records a vote by user for the given option of poll. The Vote row,
+        the stored tallies on the option and the poll, the poll's trending
+        score and the vote rollups are written in a single transaction, using
+        F() expressions so concurrent votes never lose an increment.
+    """
+    with transaction.atomic():
+        vote = Vote.objects.create(option=option, owner=user, poll=poll)
+        Option.objects.filter(pk=option.pk).update(vote_count=F('vote_count') + 1)
+        Poll.objects.filter(pk=poll.pk).update(vote_count=F('vote_count') + 1,
+                                               trending_score=trending.bump(1, vote.datetime))
+        rollups.add_votes([(poll.pk, option.pk, vote.datetime)])
+    poll_cache.bump_results_version(poll.pk)
+    return vote
+
+def record_votes(votes):
+    """
+        Bulk counterpart of record_vote. votes is a list of
+        (poll_id, option_id, owner_id) tuples. Votes whose (poll, owner) pair
+        is already in the Vote table, or repeated within the batch, are
+        skipped, so a batch can be replayed safely. The new rows are inserted
+        with bulk_create and the tallies and rollups incremented once per
+        option and poll, all in one transaction. Returns the list of Votes written.
+    """
+    with transaction.atomic():
+        existing = set(Vote.objects.filter(poll_id__in={vote[0] for vote in votes},
+                                           owner_id__in={vote[2] for vote in votes})
+                                   .values_list('poll_id', 'owner_id'))
+        new_votes = []
+        for poll_id, option_id, owner_id in votes:
+            if (poll_id, owner_id) in existing:
+                continue
+            existing.add((poll_id, owner_id))
+            new_votes.append(Vote(poll_id=poll_id, option_id=option_id, owner_id=owner_id))
+        Vote.objects.bulk_create(new_votes)
+
+        option_counts = Counter(vote.option_id for vote in new_votes)
+        poll_counts = Counter(vote.poll_id for vote in new_votes)
+        # Update in primary key order so concurrent batches lock rows in the
+        # same order and can't deadlock.
+        for option_id in sorted(option_counts):
+            Option.objects.filter(pk=option_id).update(vote_count=F('vote_count') + option_counts[option_id])
+        for poll_id in sorted(poll_counts):
+            Poll.objects.filter(pk=poll_id).update(vote_count=F('vote_count') + poll_counts[poll_id],
+                                                   trending_score=trending.bump(poll_counts[poll_id]))
+        rollups.add_votes([(vote.poll_id, vote.option_id, vote.datetime) for vote in new_votes])
+    for poll_id in poll_counts:
+        poll_cache.bump_results_version(poll_id)
+    return new_votes
+
+# Takes a voter's votes out of the stored tallies. Returns the polls changed.
+REMOVE_VOTER_TALLIES_SQL = """
+    UPDATE myvote_option option SET vote_count = option.vote_count - votes.count
+    FROM (SELECT option_id, count(*) AS count FROM myvote_vote
+          WHERE owner_id = %(owner)s GROUP BY option_id) votes
+    WHERE option.id = votes.option_id;
+
+    UPDATE myvote_poll poll SET vote_count = poll.vote_count - votes.count
+    FROM (SELECT poll_id, count(*) AS count FROM myvote_vote
+          WHERE owner_id = %(owner)s GROUP BY poll_id) votes
+    WHERE poll.id = votes.poll_id
+    RETURNING poll.id;
+"""
+
+def remove_voter_tallies(owner_id):
+    """
+        Subtracts every vote by owner_id from the stored option and poll
+        tallies, for a voter whose Vote rows are about to be deleted. Run it
+        in the transaction deleting them, and bump the results versions of
+        the returned poll ids once it commits.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(REMOVE_VOTER_TALLIES_SQL, {'owner': owner_id})
+        return [row[0] for row in cursor.fetchall()]
+
+def pending_vote_key(poll_id, owner_id):
+    """
+        Cache key marking a vote accepted by the vote buffer but not yet
+        written. Doubles as the buffer's dedupe set.
+    """
+    return 'vote:pending:%s:%s' % (poll_id, owner_id)
+
+def has_voted(poll_id, user):
+    """
+        Returns True if user has voted on the poll. A single lookup on the
+        unique (poll, owner) index; kept apart from the cached poll results
+        because it differs per user. In buffered mode a vote still waiting in
+        the buffer counts as well.
+    """
+    if settings.VOTE_INGESTION_MODE == 'buffered' and cache.get(pending_vote_key(poll_id, user.id)):
+        return True
+    return Vote.objects.filter(poll_id=poll_id, owner=user).exists()
+
+def recount_tallies(poll_ids):
+    """
+        Recomputes the stored tallies of the given polls (and their options)
+        from the Vote table. Only rows whose stored value is wrong are
+        written. Returns the number of Poll and Option rows repaired.
+    """
+    repaired = 0
+    with transaction.atomic():
+        option_counts = dict(Vote.objects.filter(poll_id__in=poll_ids)
+                                         .order_by()
+                                         .values_list('option_id')
+                                         .annotate(count=Count('id')))
+        options = Option.objects.filter(poll_id__in=poll_ids).values_list('id', 'vote_count')
+        for option_id, stored in options:
+            actual = option_counts.get(option_id, 0)
+            if stored != actual:
+                Option.objects.filter(pk=option_id).update(vote_count=actual)
+                repaired += 1
+
+        poll_counts = dict(Vote.objects.filter(poll_id__in=poll_ids)
+                                       .order_by()
+                                       .values_list('poll_id')
+                                       .annotate(count=Count('id')))
+        polls = Poll.objects.filter(pk__in=poll_ids).values_list('id', 'vote_count')
+        for poll_id, stored in polls:
+            actual = poll_counts.get(poll_id, 0)
+            if stored != actual:
+                Poll.objects.filter(pk=poll_id).update(vote_count=actual)
+                repaired += 1
+    return repaired
@@ -0,0 +1,40 @@
+var resultsTable = null;
+
+
+function LivePollResults(resultsTable) {
+  this.table = resultsTable;
+  this.cells = {};
+  this.source = null;
+
+  let cells = this.table.querySelectorAll('.vote_count');
+  for (let i = 0; i < cells.length; i++) {
+    this.cells[cells[i].dataset.optionId] = cells[i];
+  }
+
+  this.connect = function() {
+    if (!window.EventSource) {
+      return null;
+    }
+    this.source = new EventSource(this.table.dataset.liveUrl);
+    this.source.addEventListener('message', (event)=> {this.update(JSON.parse(event.data));});
+  }
+
+  this.update = function(message) {
+    if (message.deleted) {
+      this.source.close();
+      this.table.insertAdjacentHTML('afterend', '<p class="block_center text-center">This poll has been deleted.</p>');
+      return null;
+    }
+    for (let optionId in message.options) {
+      if (this.cells[optionId]) {
+        this.cells[optionId].textContent = message.options[optionId];
+      }
+    }
+  }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+  resultsTable = document.getElementById('poll_results');
+  let results = new LivePollResults(resultsTable);
+  results.connect();
+});
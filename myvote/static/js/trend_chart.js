@@ -0,0 +1,64 @@
+var SVG_NS = 'http://www.w3.org/2000/svg';
+var TREND_COLORS = ['#337ab7', '#d9534f', '#5cb85c', '#f0ad4e', '#5bc0de', '#777777'];
+
+
+function TrendChart(container) {
+  this.container = container;
+  this.width = 480;
+  this.height = 160;
+
+  this.load = function() {
+    let request = new XMLHttpRequest();
+    request.open('GET', this.container.dataset.trendUrl);
+    request.addEventListener('load', ()=> {
+      if (request.status === 200) {
+        this.draw(JSON.parse(request.responseText));
+      }
+    });
+    request.send();
+  }
+
+  // Poll trends have one line per option, profile trends a single line.
+  this.series = function(trend) {
+    if (trend.options) {
+      return trend.options.map((option, i)=> ({
+        name: option.option_text,
+        counts: trend.buckets.map((bucket)=> bucket.counts[i])
+      }));
+    }
+    return [{name: 'Votes', counts: trend.buckets.map((bucket)=> bucket.count)}];
+  }
+
+  this.draw = function(trend) {
+    if (trend.buckets.length === 0) {
+      this.container.textContent = 'No votes yet.';
+      return null;
+    }
+    let series = this.series(trend);
+    let max = Math.max(1, ...series.map((line)=> Math.max(...line.counts)));
+    let step = this.width / Math.max(1, trend.buckets.length - 1);
+    let svg = document.createElementNS(SVG_NS, 'svg');
+    svg.setAttribute('viewBox', '0 0 ' + this.width + ' ' + this.height);
+    svg.setAttribute('class', 'trend_chart');
+    series.forEach((line, i)=> {
+      let points = line.counts.map((count, j)=>
+        (j * step) + ',' + (this.height - count / max * this.height));
+      let polyline = document.createElementNS(SVG_NS, 'polyline');
+      polyline.setAttribute('points', points.join(' '));
+      polyline.setAttribute('stroke', TREND_COLORS[i % TREND_COLORS.length]);
+      polyline.setAttribute('fill', 'none');
+      let title = document.createElementNS(SVG_NS, 'title');
+      title.textContent = line.name;
+      polyline.appendChild(title);
+      svg.appendChild(polyline);
+    });
+    this.container.appendChild(svg);
+  }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+  let containers = document.querySelectorAll('[data-trend-url]');
+  for (let i = 0; i < containers.length; i++) {
+    new TrendChart(containers[i]).load();
+  }
+});
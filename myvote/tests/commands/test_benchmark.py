@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.urls import URLResolver
+
+from myvote import benchmark
+from myvote.datagen import generate, dataset_size
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        generate(**dataset_size(200))
+
+    def test_scenarios_cover_every_url(self):
+        """
+            Every URL routed by myvote/urls.py and accounts/urls.py (the admin
+            site aside) should be driven by at least one scenario.
+        """
+        from myvote.urls import urlpatterns
+        names = set()
+        for pattern in urlpatterns:
+            if isinstance(pattern, URLResolver):
+                if pattern.app_name == 'admin':
+                    continue
+                names.update('%s:%s' % (pattern.namespace, url.name) for url in pattern.url_patterns)
+            else:
+                names.add(pattern.name)
+        covered = {scenario.url_name for scenario in benchmark.SCENARIOS}
+        self.assertEqual(names - covered, set())
+
+    def test_every_scenario_succeeds(self):
+        """
+            Every scenario should run against a seeded dataset without a
+            failed request and report latency and query counts.
+        """
+        results = benchmark.run(iterations=2, warmup=1)
+        self.assertEqual(set(results), {scenario.name for scenario in benchmark.SCENARIOS})
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['requests'], 2)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertIsNotNone(result['queries_per_request'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
+        self.assertIsNone(benchmark.percentile([], 50))
+
+    def test_compare_flags_regressions(self):
+        """
+            A scenario should count as regressed if its p95 grows past the
+            threshold or it runs more queries than before.
+        """
+        def report(p95, queries):
+            return {'results': {'view_poll': {'p95_ms': p95, 'queries_per_request': queries}}}
+        lines, regressions = benchmark.compare(report(10.0, 3), report(10.5, 3), threshold=10)
+        self.assertEqual(regressions, [])
+        self.assertEqual(len(lines), 1)
+        _, regressions = benchmark.compare(report(10.0, 3), report(12.0, 3), threshold=10)
+        self.assertEqual(regressions, ['view_poll'])
+        _, regressions = benchmark.compare(report(10.0, 3), report(10.0, 4), threshold=10)
+        self.assertEqual(regressions, ['view_poll'])
+
+class LoginStormTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        generate(**dataset_size(200))
+
+    def test_login_storm(self):
+        """
+            The storm should time each read scenario alone and during the
+            storm without failed requests, while the storm's logins go
+            through or are turned away by the hashing queue.
+        """
+        results = benchmark.login_storm(iterations=3, warmup=1, threads=2)
+        for name in benchmark.STORM_READS:
+            self.assertEqual(results[name]['baseline']['errors'], 0, name)
+            self.assertEqual(results[name]['storm']['errors'], 0, name)
+        self.assertTrue(results['logins'])
+        self.assertLessEqual(set(results['logins']), {'login', 'busy'})
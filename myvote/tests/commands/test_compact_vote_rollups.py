@@ -0,0 +1,75 @@
+import datetime
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+
+from myvote import rollups
+from myvote.models import Poll, Vote, VoteRollup
+from myvote.votes import record_vote, record_votes
+from tests.testing_helpers import create_test_user, create_polls
+
+class VoteRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_test_user()
+        self.voters = [create_test_user(username='voter%s' % i) for i in range(4)]
+        create_polls(self.user, amount=2)
+        self.poll = Poll.objects.get(name='test_poll_0')
+        self.option1, self.option2 = self.poll.options.order_by('pk')
+
+    def rollup_counts(self, resolution=None):
+        rollup_rows = VoteRollup.objects.filter(poll=self.poll)
+        if resolution:
+            rollup_rows = rollup_rows.filter(resolution=resolution)
+        return dict(rollup_rows.order_by().values_list('option_id').annotate(total=Sum('count')))
+
+    def test_votes_counted_in_minute_buckets(self):
+        record_vote(self.poll, self.option1, self.voters[0])
+        record_votes([(self.poll.id, self.option1.id, self.voters[1].id),
+                      (self.poll.id, self.option2.id, self.voters[2].id),
+                      # already voted, so not counted again
+                      (self.poll.id, self.option2.id, self.voters[0].id)])
+        self.assertEqual(self.rollup_counts(rollups.MINUTE), {self.option1.id: 2, self.option2.id: 1})
+        bucket = VoteRollup.objects.filter(poll=self.poll).first().bucket
+        self.assertEqual((bucket.second, bucket.microsecond), (0, 0))
+
+    def test_compact_folds_old_buckets(self):
+        """
+            Minute buckets past their retention should move into hour buckets,
+            and hour buckets into day buckets, without changing any count.
+        """
+        now = timezone.now()
+        old_minute = (now - datetime.timedelta(days=3)).replace(minute=10, second=0, microsecond=0)
+        old_hour = (now - datetime.timedelta(days=120)).replace(minute=0, second=0, microsecond=0)
+        VoteRollup.objects.create(poll=self.poll, option=self.option1, resolution=rollups.MINUTE,
+                                  bucket=old_minute, count=2)
+        VoteRollup.objects.create(poll=self.poll, option=self.option1, resolution=rollups.MINUTE,
+                                  bucket=old_minute + datetime.timedelta(minutes=5), count=3)
+        VoteRollup.objects.create(poll=self.poll, option=self.option2, resolution=rollups.HOUR,
+                                  bucket=old_hour, count=4)
+        record_vote(self.poll, self.option2, self.voters[0])
+
+        call_command('compact_vote_rollups', chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(self.rollup_counts(), {self.option1.id: 5, self.option2.id: 5})
+        self.assertEqual(self.rollup_counts(rollups.MINUTE), {self.option2.id: 1})
+        hour = VoteRollup.objects.get(poll=self.poll, resolution=rollups.HOUR)
+        self.assertEqual((hour.bucket, hour.count), (old_minute.replace(minute=0), 5))
+        day = VoteRollup.objects.get(poll=self.poll, resolution=rollups.DAY)
+        self.assertEqual((day.bucket, day.count), (old_hour.replace(hour=0), 4))
+
+    def test_rebuild_matches_votes(self):
+        for voter in self.voters:
+            record_vote(self.poll, self.option1, voter)
+        Vote.objects.filter(owner=self.voters[0]).update(datetime=timezone.now() - datetime.timedelta(days=5))
+        VoteRollup.objects.all().delete()
+
+        call_command('compact_vote_rollups', rebuild=True, stdout=StringIO())
+
+        self.assertEqual(self.rollup_counts(), {self.option1.id: 4})
+        self.assertEqual(self.rollup_counts(rollups.HOUR), {self.option1.id: 1})
+
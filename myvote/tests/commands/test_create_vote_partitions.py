@@ -0,0 +1,62 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+
+from myvote import partitions
+from myvote.models import Poll, Vote
+from myvote.votes import record_vote, has_voted
+from tests.testing_helpers import create_test_user, create_polls
+
+@skipUnless(partitions.is_supported(), "Hash partitioning needs PostgreSQL 11 or later.")
+class VotePartitionTests(TestCase):
+    def setUp(self):
+        self.user = create_test_user()
+        self.voters = [create_test_user(username='voter%s' % i) for i in range(3)]
+        create_polls(self.user, amount=8)
+        for poll in Poll.objects.all():
+            for voter in self.voters:
+                record_vote(poll, poll.options.first(), voter)
+
+    def test_votes_table_partitioned(self):
+        self.assertTrue(partitions.is_partitioned())
+        self.assertEqual([(modulus, remainder) for _, modulus, remainder in partitions.vote_partitions()],
+                         [(settings.VOTE_PARTITIONS, remainder)
+                          for remainder in range(settings.VOTE_PARTITIONS)])
+
+    def test_poll_lookups_touch_one_partition(self):
+        """
+            A has-voted check should be planned against a single partition.
+        """
+        poll = Poll.objects.first()
+        sql, params = Vote.objects.filter(poll_id=poll.id, owner=self.voters[0]).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertEqual(plan.count(' on %s_h' % partitions.VOTE_TABLE), 1, plan)
+
+    def test_split_partitions(self):
+        """
+            Splitting should give every poll's votes a new partition and lose
+            none of them, and one vote per user and poll should still be
+            enforced.
+        """
+        out = StringIO()
+        call_command('create_vote_partitions', partitions=settings.VOTE_PARTITIONS * 2, stdout=out)
+        self.assertIn('%s in total' % (settings.VOTE_PARTITIONS * 2), out.getvalue())
+        self.assertEqual({modulus for _, modulus, _ in partitions.vote_partitions()},
+                         {settings.VOTE_PARTITIONS * 2})
+        self.assertEqual(Vote.objects.count(), 8 * len(self.voters))
+        poll = Poll.objects.first()
+        self.assertTrue(has_voted(poll.id, self.voters[0]))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vote.objects.create(poll=poll, option=poll.options.first(), owner=self.voters[0])
+
+    def test_partitions_must_divide(self):
+        with self.assertRaises(CommandError):
+            call_command('create_vote_partitions', partitions=settings.VOTE_PARTITIONS + 1,
+                         stdout=StringIO())
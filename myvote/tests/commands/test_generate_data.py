@@ -0,0 +1,109 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.db.models import Count
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import FollowedUsers, UserProfile
+from myvote.models import Poll, Option, Vote, PollStreamEntry
+from myvote.datagen import generate
+from myvote.populate import populate_users_with_polls
+from myvote.votes import recount_tallies
+
+END = timezone.make_aware(datetime.datetime(2018, 1, 31), timezone.utc)
+
+def snapshot():
+    """ The generated dataset, with ids made relative to the first row. """
+    first_user = User.objects.order_by('pk').first().pk
+    first_poll = Poll.objects.order_by('pk').first().pk
+    return {
+        'follows': sorted((f - first_user, t - first_user) for f, t in
+                          FollowedUsers.objects.values_list('follower_id', 'followed_id')),
+        'polls': [(owner - first_user, when, votes) for owner, when, votes in
+                  Poll.objects.order_by('pk').values_list('owner_id', 'datetime', 'vote_count')],
+        'votes': sorted((poll - first_poll, owner - first_user) for poll, owner in
+                        Vote.objects.values_list('poll_id', 'owner_id')),
+    }
+
+class GenerateDataTests(TestCase):
+    def test_generates_requested_counts_with_correct_tallies(self):
+        """
+            Should write the requested users and polls, about the requested
+            votes, and tallies that match the Vote rows.
+        """
+        out = StringIO()
+        call_command('generate_data', users=60, polls=120, votes=1500, follows=5,
+                     end='2018-01-31', stdout=out)
+        self.assertIn('Done.', out.getvalue())
+        self.assertEqual(User.objects.count(), 60)
+        self.assertEqual(Poll.objects.count(), 120)
+        self.assertAlmostEqual(Vote.objects.count(), 1500, delta=150)
+        self.assertEqual(recount_tallies(Poll.objects.values_list('pk', flat=True)), 0)
+        counts = Option.objects.values('poll').annotate(options=Count('id'))
+        self.assertTrue(all(2 <= row['options'] <= 4 for row in counts))
+        self.assertLessEqual(Poll.objects.latest('datetime').datetime, END)
+
+    def test_no_follows(self):
+        call_command('generate_data', users=20, polls=20, votes=50, follows=0,
+                     end='2018-01-31', stdout=StringIO())
+        self.assertEqual(User.objects.count(), 20)
+        self.assertFalse(FollowedUsers.objects.exists())
+        self.assertFalse(UserProfile.objects.exists())
+        self.assertFalse(PollStreamEntry.objects.exists())
+
+    def test_negative_follows_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_data', users=20, follows=-1, stdout=StringIO())
+
+    def test_populate_users_with_polls(self):
+        populate_users_with_polls(user_count=3, poll_count=2)
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Poll.objects.count(), 6)
+        self.assertFalse(Vote.objects.exists())
+        self.assertFalse(FollowedUsers.objects.exists())
+
+    def test_same_seed_generates_same_data(self):
+        generate(users=30, polls=40, votes=300, seed=7, end=END)
+        first = snapshot()
+        Vote.objects.all().delete()
+        Poll.objects.all().delete()
+        User.objects.all().delete()
+        generate(users=30, polls=40, votes=300, seed=7, end=END)
+        self.assertEqual(snapshot(), first)
+
+    def test_distributions_are_skewed(self):
+        """
+            The most popular poll should get far more votes than the median
+            poll, and the most followed user far more followers than the
+            median user.
+        """
+        generate(users=200, polls=200, votes=4000, follows=10, end=END)
+        votes = sorted(Poll.objects.values_list('vote_count', flat=True))
+        self.assertGreater(votes[-1], 10 * max(1, votes[len(votes) // 2]))
+        followers = sorted(FollowedUsers.objects.values('followed')
+                                                .annotate(n=Count('id'))
+                                                .values_list('n', flat=True))
+        self.assertGreater(followers[-1], 5 * followers[len(followers) // 2])
+
+    def test_streams_match_follows(self):
+        """
+            Each follower's PollStream should hold the polls of the users they
+            follow.
+        """
+        generate(users=40, polls=80, votes=200, follows=4, end=END)
+        expected = (Poll.objects.filter(owner__followers__isnull=False)
+                                .values_list('owner__followers__follower_id', 'id')
+                                .distinct())
+        self.assertEqual(set(PollStreamEntry.objects.values_list('user_id', 'poll_id')),
+                         set(expected))
+
+    def test_profile_counts_match_follows(self):
+        generate(users=40, polls=40, votes=100, follows=4, end=END)
+        for user in User.objects.annotate(n_followers=Count('followers', distinct=True),
+                                          n_following=Count('followed', distinct=True)):
+            profile = UserProfile.objects.filter(user=user).first()
+            counts = (profile.follower_count, profile.following_count) if profile else (0, 0)
+            self.assertEqual(counts, (user.n_followers, user.n_following))
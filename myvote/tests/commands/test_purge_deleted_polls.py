@@ -0,0 +1,73 @@
+import tracemalloc
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from myvote.models import Poll, Option, Vote, VoteRollup
+from myvote.votes import record_vote
+from tests.testing_helpers import create_test_user, create_polls, PASSWORD
+
+# Votes on the large poll. Loading this many Votes through the ORM collector
+# takes tens of megabytes.
+LARGE_POLL_VOTES = 50000
+
+class PurgeDeletedPollsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_test_user()
+        create_polls(self.user, amount=2)
+        self.poll, self.kept_poll = Poll.objects.order_by('pk')
+        self.client.login(username=self.user.username, password=PASSWORD)
+
+    def delete_poll(self, poll):
+        response = self.client.post(reverse('delete poll', kwargs={'poll_id': poll.id}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_purge_removes_deleted_polls_only(self):
+        voters = [create_test_user(username='voter%s' % i) for i in range(5)]
+        for poll in (self.poll, self.kept_poll):
+            for voter in voters:
+                record_vote(poll, poll.options.first(), voter)
+        self.delete_poll(self.poll)
+
+        out = StringIO()
+        call_command('purge_deleted_polls', batch_size=2, stdout=out)
+        self.assertIn('1 polls purged', out.getvalue())
+
+        self.assertFalse(Poll.all_objects.filter(pk=self.poll.id).exists())
+        for model in (Option, Vote, VoteRollup):
+            self.assertFalse(model.objects.filter(poll_id=self.poll.id).exists())
+            self.assertTrue(model.objects.filter(poll_id=self.kept_poll.id).exists())
+
+    def test_large_poll_deleted_in_flat_memory(self):
+        """
+            Deleting and purging a poll with many votes should never hold its
+            votes in Python memory.
+        """
+        option = self.poll.options.first()
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO auth_user (password, is_superuser, username, first_name, last_name,
+                                       email, is_staff, is_active, date_joined)
+                SELECT '', false, 'bulk_voter_' || n, '', '', '', false, true, now()
+                FROM generate_series(1, %s) n
+            """, [LARGE_POLL_VOTES])
+            cursor.execute("""
+                INSERT INTO myvote_vote (option_id, owner_id, poll_id, datetime)
+                SELECT %s, id, %s, now() FROM auth_user WHERE username LIKE 'bulk_voter_%%'
+            """, [option.id, self.poll.id])
+
+        tracemalloc.start()
+        try:
+            self.delete_poll(self.poll)
+            call_command('purge_deleted_polls', batch_size=1000, stdout=StringIO())
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertFalse(Vote.objects.filter(poll_id=self.poll.id).exists())
+        self.assertLess(peak, 2 * 1024 * 1024)
@@ -0,0 +1,41 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from myvote.models import Poll, Option, Vote
+from tests.testing_helpers import create_test_user, create_polls
+
+class RecountVotesTests(TestCase):
+    def setUp(self):
+        self.user = create_test_user()
+        self.voter = create_test_user(username='testvoter')
+        create_polls(self.user, amount=3)
+        self.poll = Poll.objects.get(name='test_poll_0')
+        self.option1, self.option2 = self.poll.options.order_by('pk')
+
+    def test_recount_repairs_drifted_tallies(self):
+        """
+            Tallies that disagree with the Vote table should be rewritten from
+            the Vote rows.
+        """
+        Vote.objects.create(option=self.option1, owner=self.voter, poll=self.poll)
+        Vote.objects.create(option=self.option1, owner=self.user, poll=self.poll)
+        Option.objects.filter(pk=self.option2.pk).update(vote_count=7)
+
+        call_command('recount_votes', chunk_size=1, stdout=StringIO())
+
+        self.option1.refresh_from_db()
+        self.option2.refresh_from_db()
+        self.poll.refresh_from_db()
+        self.assertEqual(self.option1.vote_count, 2)
+        self.assertEqual(self.option2.vote_count, 0)
+        self.assertEqual(self.poll.vote_count, 2)
+
+    def test_recount_leaves_correct_tallies_alone(self):
+        """
+            Should report no repairs when every tally is already correct.
+        """
+        out = StringIO()
+        call_command('recount_votes', stdout=out)
+        self.assertIn('3 polls checked, 0 tallies repaired', out.getvalue())
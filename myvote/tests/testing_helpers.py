@@ -32,13 +32,7 @@ def create_polls(user, start_num=0, amount=10):
     if not user:
         raise Exception("User not provided.")
 
-    for i in range(start_num, amount + start_num):
-        new_name = POLL_NAME + str(i)
-        p = Poll(owner=user, name=new_name)
-        p.save()
-
-        option_1 = Option(option_text=OPTION_1, poll=p)
-        option_1.save()
-
-        option_2 = Option(option_text=OPTION_2, poll=p)
-        option_2.save()
+    polls = Poll.objects.bulk_create(Poll(owner=user, name=POLL_NAME + str(i))
+                                     for i in range(start_num, amount + start_num))
+    Option.objects.bulk_create(Option(option_text=text, poll=poll)
+                               for poll in polls for text in (OPTION_1, OPTION_2))
@@ -1,9 +1,19 @@
+import os
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.urls import reverse, resolve
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+from accounts import follow_graph, hashing
+from accounts.models import FollowedUsers
 from accounts.views import signup
 from accounts.forms import SignUpForm, ChangePasswordForm, ChangeEmailForm, DeleteAccountForm
+from myvote import page_cache, poll_cache
+from myvote.models import Poll, Option
+from myvote.votes import record_vote
+from tests.testing_helpers import create_test_user, create_polls
 
 class SignupTests(TestCase):
     def setUp(self):
@@ -403,6 +413,28 @@ class DeleteAccountTests(TestCase):
         with self.assertRaisesMessage(User.DoesNotExist, "User matching query does not exist."):
             user = User.objects.get(pk=self.user.id)
 
+    def test_deleted_voter_leaves_tallies(self):
+        """
+            Deleting an account should take its votes out of the stored
+            tallies and the cached results of the polls it voted on.
+        """
+        owner = User.objects.create_user(username="pollowner", password=self.password)
+        poll = Poll.objects.create(name="tallied poll", owner=owner)
+        option = Option.objects.create(option_text="option", poll=poll)
+        other_voter = User.objects.create_user(username="othervoter", password=self.password)
+        record_vote(poll, option, self.user)
+        record_vote(poll, option, other_voter)
+        self.assertEqual(poll_cache.get_results(poll.id)['vote_count'], 2)
+
+        self.assertTrue(self.login())
+        self.post_delete_account({'password': self.password, 'password2': self.password})
+
+        option.refresh_from_db()
+        poll.refresh_from_db()
+        self.assertEqual((option.vote_count, poll.vote_count), (1, 1))
+        results = poll_cache.get_results(poll.id)
+        self.assertEqual((results['vote_count'], results['options'][0]['vote_count']), (1, 1))
+
     def test_user_logged_in_invalid_passwords_dont_delete_account(self):
         """
             Should redisplay DeleteAccountForm if user provides invalid passwords.
@@ -449,3 +481,225 @@ class DeleteAccountTests(TestCase):
         self.assertIsInstance(form_2, DeleteAccountForm)
         self.assertIsInstance(form_3, DeleteAccountForm)
         self.assertIsInstance(form_4, DeleteAccountForm)
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.password = "testpassword12"
+        self.user = User.objects.create_user(username="follower", password=self.password)
+        self.author = User.objects.create_user(username="author", password=self.password)
+        self.other = User.objects.create_user(username="authorfan", password=self.password)
+        self.profile_url = reverse('account:view profile', kwargs={'user_id': self.author.id})
+        self.client.login(username="follower", password=self.password)
+
+    def follow(self, user):
+        return self.client.post(reverse('account:follow user', kwargs={'user_id': user.id}))
+
+    def unfollow(self, user):
+        return self.client.post(reverse('account:unfollow user', kwargs={'user_id': user.id}))
+
+    def counts(self, user):
+        user = User.objects.select_related('profile').get(pk=user.pk)
+        return follow_graph.follow_counts(user)
+
+    def test_follow_and_unfollow_update_cached_graph(self):
+        """
+            Follows and unfollows should move the cached followed set to a new
+            version, loaded once and then read with no query.
+        """
+        self.assertEqual(follow_graph.followed_ids(self.user.id), frozenset())
+        self.follow(self.author)
+        with self.assertNumQueries(1):
+            self.assertTrue(follow_graph.is_following(self.user.id, self.author.id))
+        with self.assertNumQueries(0):
+            self.assertTrue(follow_graph.is_following(self.user.id, self.author.id))
+        self.unfollow(self.author)
+        self.assertFalse(follow_graph.is_following(self.user.id, self.author.id))
+
+    def test_set_loaded_before_follow_is_never_read(self):
+        """
+            A followed set loaded before a follow commits, but stored after
+            it, should not hide the follow.
+        """
+        version = follow_graph._followed_version(self.user.id)
+        self.follow(self.author)
+        cache.set(follow_graph._followed_key(self.user.id, version), frozenset())
+        self.assertTrue(follow_graph.is_following(self.user.id, self.author.id))
+
+    def test_follow_is_idempotent_and_counted(self):
+        """
+            Following twice should leave one edge and count it once;
+            unfollowing should remove it and uncount it, once.
+        """
+        self.assertEqual(self.counts(self.author), (0, 0))
+        self.follow(self.author)
+        self.follow(self.author)
+        self.assertEqual(FollowedUsers.objects.filter(follower=self.user).count(), 1)
+        self.assertEqual(self.counts(self.author), (1, 0))
+        self.assertEqual(self.counts(self.user), (0, 1))
+        self.unfollow(self.author)
+        self.unfollow(self.author)
+        self.assertFalse(FollowedUsers.objects.exists())
+        self.assertEqual(self.counts(self.author), (0, 0))
+        self.assertEqual(self.counts(self.user), (0, 0))
+
+    def test_follow_missing_user(self):
+        response = self.client.post(reverse('account:follow user', kwargs={'user_id': 99999}),
+                                    follow=True)
+        self.assertContains(response, "This user does not exist.")
+        self.assertFalse(FollowedUsers.objects.exists())
+
+    def test_profile_shows_follow_state_and_counts(self):
+        response = self.client.get(self.profile_url)
+        self.assertFalse(response.context.get('followed'))
+        self.assertContains(response, 'value="Follow"')
+        self.follow(self.author)
+        response = self.client.get(self.profile_url)
+        self.assertTrue(response.context.get('followed'))
+        self.assertContains(response, 'value="Unfollow"')
+        self.assertContains(response, "1 follower &middot; 0 following")
+
+    def test_user_search_results_get_follow_buttons(self):
+        """
+            Each user in search results should get the viewer's follow state
+            from a single lookup, except the viewer themselves.
+        """
+        self.follow(self.author)
+        response = self.client.get(reverse('search users'), {'search_val': 'author'})
+        followed = {user.username: user.follow_state for user in response.context.get('results')}
+        self.assertEqual(followed, {'author': True, 'authorfan': False})
+        self.assertContains(response, 'value="Unfollow"', count=1)
+        self.assertContains(response, 'value="Follow"', count=1)
+
+    def test_deleted_user_leaves_cached_graph(self):
+        """
+            Deleting an account should drop it from the cached followed sets
+            of its followers and the counts of the users on both ends, and
+            move those users' profile stamps so their cached pages go.
+        """
+        follow_graph.follow(self.other.id, self.user.id)
+        self.follow(self.author)
+        self.assertTrue(follow_graph.is_following(self.other.id, self.user.id))
+        stamps = {user_id: page_cache.get_version(page_cache.profile(user_id))
+                  for user_id in (self.author.id, self.other.id)}
+        self.client.post(reverse('account:delete account'),
+                         {'password': self.password, 'password2': self.password})
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(follow_graph.is_following(self.other.id, self.user.id))
+        self.assertEqual(self.counts(self.author), (0, 0))
+        self.assertEqual(self.counts(self.other), (0, 0))
+        for user_id, stamp in stamps.items():
+            self.assertGreater(page_cache.get_version(page_cache.profile(user_id)), stamp)
+
+
+class SessionLoadingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.password = "testpassword12"
+        self.user = User.objects.create_user(username="testuser", email="old@example.com",
+                                             password=self.password)
+        self.overview_url = reverse('account:overview')
+        self.client.login(username="testuser", password=self.password)
+        self.client.get(self.overview_url)
+
+    def test_logged_in_request_runs_no_queries(self):
+        """
+            Once cached, the session and user should be loaded without a
+            query, and an unchanged session should not be written back.
+        """
+        with self.assertNumQueries(0):
+            response = self.client.get(self.overview_url)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_password_change_ends_cached_session(self):
+        self.client.post(reverse('account:change password'),
+                         {'old_password': self.password, 'new_password': 'newpassword12',
+                          'new_password2': 'newpassword12'})
+        response = self.client.get(self.overview_url)
+        self.assertRedirects(response, reverse('account:login') + '?next=' + self.overview_url)
+
+    def test_email_change_seen_next_request(self):
+        self.client.post(reverse('account:change email'),
+                         {'password': self.password, 'new_email': 'new@example.com',
+                          'new_email2': 'new@example.com'})
+        self.assertEqual(self.client.get(self.overview_url).context['user'].email,
+                         'new@example.com')
+
+    def test_deleted_account_ends_cached_session(self):
+        self.client.post(reverse('account:delete account'),
+                         {'password': self.password, 'password2': self.password})
+        response = self.client.get(self.overview_url)
+        self.assertRedirects(response, reverse('account:login') + '?next=' + self.overview_url)
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.password = "testpassword12"
+        self.user = User.objects.create_user(username="testuser", password=self.password)
+
+    def test_hashes_run_in_pool(self):
+        self.assertNotEqual(hashing.run(os.getpid), os.getpid())
+        self.assertTrue(hashing.check_password(self.user, self.password))
+        self.assertFalse(hashing.check_password(self.user, "wrongpassword12"))
+
+    def test_outdated_hash_upgraded(self):
+        """
+            A correct password stored with an outdated hasher should be
+            rehashed on login, as ModelBackend does.
+        """
+        self.user.password = make_password(self.password, hasher='pbkdf2_sha1')
+        self.user.save()
+        self.assertTrue(self.client.login(username="testuser", password=self.password))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+    @override_settings(PASSWORD_HASHING_QUEUE_DEPTH=0)
+    def test_full_queue_fails_fast(self):
+        """
+            With the hashing queue full, logins (the admin's too), signups
+            and the password forms should be turned away with a message to
+            try again, and change nothing.
+        """
+        response = self.client.post(reverse('account:login'),
+                                    {'username': "testuser", 'password': self.password})
+        self.assertContains(response, hashing.RETRY_MESSAGE)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+        response = self.client.post(reverse('admin:login'),
+                                    {'username': "testuser", 'password': self.password})
+        self.assertContains(response, hashing.RETRY_MESSAGE)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+        response = self.client.post(reverse('account:signup'),
+                                    {'username': 'john', 'email': 'john@does.com',
+                                     'password1': 'abcdef123456', 'password2': 'abcdef123456'})
+        self.assertContains(response, hashing.RETRY_MESSAGE)
+        self.assertFalse(User.objects.filter(username='john').exists())
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('account:change password'),
+                                    {'old_password': self.password, 'new_password': 'newpassword12',
+                                     'new_password2': 'newpassword12'})
+        self.assertContains(response, hashing.RETRY_MESSAGE)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(self.password))
+
+
+class ProfileTrendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_test_user()
+        self.voter = create_test_user(username='testvoter')
+        create_polls(self.user, amount=2)
+
+    def test_profile_trend(self):
+        for poll in Poll.objects.filter(owner=self.user):
+            record_vote(poll, poll.options.first(), self.voter)
+        url = reverse('account:profile trend', kwargs={'user_id': self.user.id})
+        trend = self.client.get(url, {'resolution': 'day'}).json()
+        self.assertEqual([bucket['count'] for bucket in trend['buckets']], [2])
+        url = reverse('account:profile trend', kwargs={'user_id': self.voter.id})
+        self.assertEqual(self.client.get(url).json()['buckets'], [])
+        url = reverse('account:profile trend', kwargs={'user_id': self.user.id + 100})
+        self.assertEqual(self.client.get(url).status_code, 404)
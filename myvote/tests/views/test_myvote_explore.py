@@ -1,8 +1,16 @@
+import datetime
+from io import StringIO
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
 from django.urls import reverse, resolve
 from django.test import TestCase
+from django.utils import timezone
 
+from myvote import trending
 from myvote.models import Poll, Option, Vote
+from myvote.votes import record_vote
 from tests.testing_helpers import create_test_user, create_polls
 
 # CONSTANTS
@@ -12,6 +20,7 @@ PASSWORD = 'testpassword12'
 
 class ExploreTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.url = reverse('explore polls')
         self.user = create_test_user(username=USERNAME, password=PASSWORD)
         create_polls(self.user, amount=10)
@@ -40,39 +49,136 @@ class ExploreTests(TestCase):
 
     def test_pagination_links_and_poll_lists(self):
         """
-            Tests for next/previous page links.
+            Tests for next/previous cursor links. Walking the 'older' links
+            should visit every poll exactly once, newest first.
         """
         create_polls(self.user, start_num=10, amount=30)
         get_response = self.client.get(self.url)
+        page = get_response.context.get('polls')
         # view should still return 10 polls in get request
-        self.assertEqual(len(get_response.context.get('polls')), POLLS_PER_PAGE)
+        self.assertEqual(len(page), POLLS_PER_PAGE)
 
-        # Get page 1
-        self.assertContains(get_response, "?page=2")
-        self.assertNotContains(get_response, "?page=1")
-        self.assertNotContains(get_response, "?page=3")
-        self.assertEqual(len(get_response.context.get('polls')), POLLS_PER_PAGE)
+        # first page only links to older polls
+        self.assertContains(get_response, "?after=" + page.next_cursor)
+        self.assertNotContains(get_response, "?before=")
+        self.assertNotContains(get_response, "?page=")
 
-        # page 2
-        get_page_2 = self.client.get(self.url + "?page=2")
-        self.assertContains(get_page_2, "?page=1")
-        self.assertContains(get_page_2, "?page=3")
-        self.assertNotContains(get_page_2, "?page=2")
-        self.assertEqual(len(get_response.context.get('polls')), POLLS_PER_PAGE)
+        seen = list(page)
+        for page_number in range(2, 5):
+            get_page = self.client.get(self.url + "?after=" + page.next_cursor)
+            page = get_page.context.get('polls')
+            self.assertEqual(len(page), POLLS_PER_PAGE)
+            self.assertContains(get_page, "?before=" + page.previous_cursor)
+            seen.extend(page)
 
-        # page 3
-        get_page_3 = self.client.get(self.url + "?page=3")
-        self.assertNotContains(get_page_3, "?page=1")
-        self.assertContains(get_page_3, "?page=2")
-        self.assertNotContains(get_page_3, "?page=3")
-        self.assertEqual(len(get_response.context.get('polls')), POLLS_PER_PAGE)
+        # last page has no older link
+        self.assertNotContains(get_page, "?after=")
+        self.assertEqual(len(set(poll.id for poll in seen)), 40)
+        self.assertEqual(seen, list(Poll.objects.order_by('-datetime', '-id')))
+
+    def test_previous_link_returns_previous_page(self):
+        """
+            Following the 'newer' link should return the page that linked to
+            the current one.
+        """
+        create_polls(self.user, start_num=10, amount=30)
+        first_page = self.client.get(self.url).context.get('polls')
+        second_page = self.client.get(self.url + "?after=" + first_page.next_cursor).context.get('polls')
+        back_page = self.client.get(self.url + "?before=" + second_page.previous_cursor).context.get('polls')
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertFalse(back_page.has_previous())
+        self.assertTrue(back_page.has_next())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """
+            A malformed cursor should fall back to the first page rather than
+            raising an error.
+        """
+        first_page = self.client.get(self.url).context.get('polls')
+        get_response = self.client.get(self.url + "?after=not-a-cursor")
+        self.assertEqual(get_response.status_code, 200)
+        self.assertEqual(list(get_response.context.get('polls')), list(first_page))
+
+    def test_deep_page_query_count_matches_first_page(self):
+        """
+            A deep page should issue the same queries as the first page: no
+            COUNT(*) and no OFFSET scan.
+        """
+        create_polls(self.user, start_num=10, amount=30)
+        page = self.client.get(self.url).context.get('polls')
+        for i in range(2):
+            page = self.client.get(self.url + "?after=" + page.next_cursor).context.get('polls')
+        with self.assertNumQueries(1):
+            list(page.paginator.get_page())
+        with self.assertNumQueries(1):
+            list(page.paginator.get_page(after=page.next_cursor))
+
+
+class ExploreRankingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('explore polls')
+        self.user = create_test_user(username=USERNAME, password=PASSWORD)
+        self.voters = [create_test_user(username='voter%s' % i) for i in range(3)]
+        create_polls(self.user, amount=15)
+        self.old_favourite, self.rising, self.newest = Poll.objects.order_by('pk')[:3]
+        for voter in self.voters:
+            record_vote(self.old_favourite, self.old_favourite.options.first(), voter)
+        record_vote(self.rising, self.rising.options.first(), self.voters[0])
+
+    def age_votes(self, poll, days):
+        """ Rescores the poll as if its votes were cast days ago. """
+        Poll.objects.filter(pk=poll.pk).update(trending_score=0)
+        Poll.objects.filter(pk=poll.pk).update(
+            trending_score=trending.bump(poll.votes.count(), timezone.now() - datetime.timedelta(days=days)))
+
+    def test_top_sort(self):
+        response = self.client.get(self.url, {'sort': 'top'})
+        self.assertEqual(response.context['page_title'], "Top Polls")
+        self.assertEqual(list(response.context['polls'])[:2], [self.old_favourite, self.rising])
+
+    def test_trending_sort_decays_old_votes(self):
+        """
+            Three votes from three days ago should count for less than one
+            vote now.
+        """
+        polls = self.client.get(self.url, {'sort': 'trending'}).context['polls']
+        self.assertEqual(list(polls)[:2], [self.old_favourite, self.rising])
+        self.age_votes(self.old_favourite, days=3)
+        cache.clear()
+        polls = self.client.get(self.url, {'sort': 'trending'}).context['polls']
+        self.assertEqual(list(polls)[:2], [self.rising, self.old_favourite])
+
+    def test_ranked_pagination_keeps_sort(self):
+        response = self.client.get(self.url, {'sort': 'trending'})
+        page = response.context['polls']
+        self.assertContains(response, "?after=%s&amp;sort=trending" % page.next_cursor)
+        next_page = self.client.get(self.url, {'sort': 'trending', 'after': page.next_cursor}).context['polls']
+        self.assertEqual(len(page) + len(next_page), Poll.objects.count())
+        self.assertFalse(set(page) & set(next_page))
+
+    def test_unknown_sort_is_new(self):
+        response = self.client.get(self.url, {'sort': 'bogus'})
+        self.assertEqual(response.context['sort'], 'new')
+        self.assertEqual(list(response.context['polls'])[0], Poll.objects.order_by('-datetime', '-id')[0])
+
+    def test_update_trending_matches_bumped_scores(self):
+        """
+            Recomputing from the rollups should give the scores the vote path
+            kept, give or take counting each vote at the middle of its minute.
+        """
+        bumped = dict(Poll.objects.values_list('pk', 'trending_score'))
+        Poll.objects.update(trending_score=0)
+        call_command('update_trending', chunk_size=4, stdout=StringIO())
+        for poll_id, score in Poll.objects.values_list('pk', 'trending_score'):
+            self.assertAlmostEqual(score, bumped[poll_id], places=2)
 
 
 class ExploreRecentTests(TestCase):
     def setUp(self):
         self.user = create_test_user(username=USERNAME, password=PASSWORD)
         # url to view self.user recent polls
-        self.url = reverse('explore recent polls', kwargs={'user_id':1})
+        self.url = reverse('explore recent polls', kwargs={'user_id': self.user.id})
 
     def login_helper(self):
         return self.client.login(username=USERNAME, password=PASSWORD)
@@ -94,7 +200,7 @@ class ExploreRecentTests(TestCase):
         get_response = self.client.get(self.url)
         self.assertEqual(get_response.status_code, 200)
         self.assertEqual(len(get_response.context.get('polls')), 10)
-        self.assertNotContains(get_response, '?page=2')
+        self.assertNotContains(get_response, '?after=')
 
     def test_logged_out_view_more_than_10(self):
         """
@@ -104,7 +210,7 @@ class ExploreRecentTests(TestCase):
         get_response = self.client.get(self.url)
         self.assertEqual(get_response.status_code, 200)
         self.assertEqual(len(get_response.context.get('polls')), 10)
-        self.assertContains(get_response, '?page=2')
+        self.assertContains(get_response, '?after=')
 
     def test_logged_in_view_less_than_10(self):
         """
@@ -127,7 +233,7 @@ class ExploreRecentTests(TestCase):
         get_response = self.client.get(self.url)
         self.assertEqual(get_response.status_code, 200)
         self.assertEqual(len(get_response.context.get('polls')), 10)
-        self.assertNotContains(get_response, '?page=2')
+        self.assertNotContains(get_response, '?after=')
 
     def test_logged_in_view_more_than_10(self):
         """
@@ -139,4 +245,4 @@ class ExploreRecentTests(TestCase):
         get_response = self.client.get(self.url)
         self.assertEqual(get_response.status_code, 200)
         self.assertEqual(len(get_response.context.get('polls')), 10)
-        self.assertContains(get_response, '?page=2')
+        self.assertContains(get_response, '?after=')
@@ -1,8 +1,15 @@
+from io import StringIO
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
 from django.urls import reverse, resolve
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from myvote.models import Poll
+from accounts.models import FollowedUsers
+from myvote import pollstream
+from myvote.models import Poll, PollStreamEntry
 
 class IndexViewUserWithOwnedPolls(TestCase):
     def setUp(self):
@@ -28,3 +35,167 @@ class IndexViewUserWithOwnedPolls(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, signup_url)
         self.assertFalse(logout_url in response)
+
+
+class PollStreamTests(TestCase):
+    def setUp(self):
+        self.password = "testpassword12"
+        self.reader = User.objects.create_user(username="reader", password=self.password)
+        self.author = User.objects.create_user(username="author", password=self.password)
+        self.home_url = reverse('home')
+        self.create_poll_url = reverse('create poll')
+
+    def follow(self, user_id):
+        return self.client.post(reverse('account:follow user', kwargs={'user_id': user_id}))
+
+    def unfollow(self, user_id):
+        return self.client.post(reverse('account:unfollow user', kwargs={'user_id': user_id}))
+
+    def create_poll_as_author(self, name):
+        self.client.login(username="author", password=self.password)
+        self.client.post(self.create_poll_url, {'name': name, 'option1': 'yes', 'option2': 'no'})
+        self.client.logout()
+        return Poll.objects.get(name=name)
+
+    def stream_for_reader(self, url=None):
+        self.client.login(username="reader", password=self.password)
+        response = self.client.get(url or self.home_url)
+        self.assertEqual(response.status_code, 200)
+        return response.context.get('followed_polls')
+
+    def test_new_poll_fanned_out_to_followers(self):
+        """
+            A poll created by a followed author should be written into the
+            follower's stream and shown on their home page.
+        """
+        self.client.login(username="reader", password=self.password)
+        self.follow(self.author.id)
+        self.client.logout()
+        poll = self.create_poll_as_author("fanned out poll")
+
+        self.assertTrue(poll.fanned_out)
+        self.assertTrue(PollStreamEntry.objects.filter(user=self.reader, poll=poll).exists())
+        self.assertEqual(list(self.stream_for_reader()), [poll])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """
+            Following an author should copy their existing polls into the
+            stream; unfollowing should remove them again.
+        """
+        poll1 = self.create_poll_as_author("older poll")
+        poll2 = self.create_poll_as_author("newer poll")
+        self.client.login(username="reader", password=self.password)
+        self.follow(self.author.id)
+        self.assertEqual(list(self.stream_for_reader()), [poll2, poll1])
+
+        self.unfollow(self.author.id)
+        self.assertFalse(PollStreamEntry.objects.filter(user=self.reader).exists())
+        self.assertFalse(self.stream_for_reader())
+
+    def test_fan_out_skips_entries_written_by_backfill(self):
+        """
+            A follow racing a poll's creation can backfill the poll before it
+            is fanned out. The fan-out should skip that follower's entry and
+            still reach every other follower.
+        """
+        poll = self.create_poll_as_author("raced poll")
+        self.client.login(username="reader", password=self.password)
+        self.follow(self.author.id)
+        late_follower = User.objects.create_user(username="late", password=self.password)
+        FollowedUsers.objects.create(follower=late_follower, followed=self.author)
+
+        self.assertEqual(pollstream.fan_out_polls([poll]), 1)
+        self.assertEqual(set(PollStreamEntry.objects.filter(poll=poll).values_list('user_id', flat=True)),
+                         {self.reader.id, late_follower.id})
+
+    def test_deleted_poll_removed_from_streams(self):
+        """
+            Deleting a poll should hide it from every follower's stream at
+            once, and purging it should remove its stream entries.
+        """
+        self.client.login(username="reader", password=self.password)
+        self.follow(self.author.id)
+        self.client.logout()
+        poll = self.create_poll_as_author("doomed poll")
+        self.client.login(username="author", password=self.password)
+        self.client.post(reverse('delete poll', kwargs={'poll_id': poll.id}))
+        self.assertFalse(self.stream_for_reader())
+        call_command('purge_deleted_polls', stdout=StringIO())
+        self.assertFalse(PollStreamEntry.objects.filter(poll_id=poll.id).exists())
+
+    @override_settings(POLLSTREAM_FANOUT_LIMIT=0)
+    def test_author_over_fanout_limit_pulled_at_read_time(self):
+        """
+            Polls from authors with more followers than the fan-out limit
+            should not be copied into streams but still appear on followers'
+            home pages, merged in order with fanned-out polls.
+        """
+        self.client.login(username="reader", password=self.password)
+        self.follow(self.author.id)
+        self.client.logout()
+        small_author = User.objects.create_user(username="small_author", password=self.password)
+        small_poll = Poll.objects.create(name="small poll", owner=small_author)
+        PollStreamEntry.objects.create(user=self.reader, poll=small_poll,
+                                       author=small_author, datetime=small_poll.datetime)
+
+        pulled_poll = self.create_poll_as_author("pulled poll")
+        self.assertFalse(pulled_poll.fanned_out)
+        self.assertFalse(PollStreamEntry.objects.filter(poll=pulled_poll).exists())
+        self.assertEqual(list(self.stream_for_reader()), [pulled_poll, small_poll])
+
+    @override_settings(POLLSTREAM_FANOUT_LIMIT=0)
+    def test_merged_stream_pagination(self):
+        """
+            Cursor pagination should walk the merged stream without skipping
+            or repeating polls.
+        """
+        self.client.login(username="reader", password=self.password)
+        self.follow(self.author.id)
+        small_author = User.objects.create_user(username="small_author", password=self.password)
+        expected = []
+        for i in range(8):
+            if i % 2:
+                poll = Poll.objects.create(name="pulled %s" % i, owner=self.author, fanned_out=False)
+            else:
+                poll = Poll.objects.create(name="fanned %s" % i, owner=small_author)
+                PollStreamEntry.objects.create(user=self.reader, poll=poll,
+                                               author=small_author, datetime=poll.datetime)
+            expected.insert(0, poll)
+
+        first_page = self.stream_for_reader()
+        self.assertEqual(len(first_page), 5)
+        second_page = self.stream_for_reader(self.home_url + "?after=" + first_page.next_cursor)
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(list(first_page) + list(second_page), expected)
+
+
+class PollStreamItemCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.password = "testpassword12"
+        self.user = User.objects.create_user(username="author", password=self.password)
+        self.poll = Poll.objects.create(owner=self.user, name="cached poll")
+        self.recent_url = reverse('explore recent polls', kwargs={'user_id': self.user.id})
+        self.key = make_template_fragment_key('poll_stream_item', [self.poll.id, self.poll.revision])
+
+    def test_item_rendered_once_per_revision(self):
+        """
+            A poll's stream item should be served from the cache until the
+            poll is saved again.
+        """
+        self.assertContains(self.client.get(self.recent_url), "cached poll")
+        self.assertIsNotNone(cache.get(self.key))
+        # A queryset update skips save() and so keeps the cached item.
+        Poll.objects.filter(pk=self.poll.pk).update(name="renamed poll")
+        self.assertContains(self.client.get(self.recent_url), "cached poll")
+        self.poll.name = "edited poll"
+        self.poll.save()
+        self.assertEqual(self.poll.revision, 2)
+        self.assertContains(self.client.get(self.recent_url), "edited poll")
+
+    def test_deleting_poll_drops_cached_item(self):
+        self.client.get(self.recent_url)
+        self.client.login(username="author", password=self.password)
+        self.client.post(reverse('delete poll', kwargs={'poll_id': self.poll.id}))
+        self.assertIsNone(cache.get(self.key))
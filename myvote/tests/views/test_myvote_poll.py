@@ -1,10 +1,19 @@
+import json
+
 from django.contrib.auth.models import User
 from django.urls import reverse, resolve
-from django.test import TestCase
+from django.db import IntegrityError, transaction
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
 from myvote.views import index, create_poll, view_poll, vote_poll
 from myvote.forms import PollCreationForm
-from myvote.models import Poll, Option
+from accounts.models import FollowedUsers
+from myvote.models import Poll, Option, Vote, PollStreamEntry
+from myvote import live, poll_cache
+from myvote.vote_buffer import vote_buffer
+from myvote.votes import record_vote, record_votes
+from tests.testing_helpers import create_test_user, create_polls
 
 class PollCreationTests(TestCase):
     def setUp(self):
@@ -62,6 +71,83 @@ class PollCreationTests(TestCase):
 
         self.assertTrue(len(all_polls) == 0)
 
+    def test_poll_creation_inserts_options_in_one_query(self):
+        """
+            Should create every option in order, with a constant number of
+            queries however many options the poll has.
+        """
+        self.client.login(username="testuser", password="testpassword12")
+        poll_data = {'name': 'five options'}
+        poll_data.update({'option%s' % i: 'option %s' % i for i in range(1, 6)})
+        with self.assertNumQueries(7):
+            self.client.post(self.create_poll_url, poll_data)
+        poll = Poll.objects.get(name='five options')
+        self.assertEqual([o.option_text for o in poll.options.order_by('pk')],
+                         ['option %s' % i for i in range(1, 6)])
+
+
+class PollBatchCreationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com", password="testpassword12")
+        self.batch_url = reverse('create polls batch')
+        self.client.login(username="testuser", password="testpassword12")
+
+    def post_batch(self, batch):
+        return self.client.post(self.batch_url, json.dumps(batch), content_type='application/json')
+
+    def test_creates_every_poll_with_its_options(self):
+        """
+            Should create each poll with its options in order and respond 201
+            with the new ids.
+        """
+        batch = [{'name': 'poll %s' % i, 'description': 'batch', 'options': ['a', 'b', 'c']}
+                 for i in range(20)]
+        response = self.post_batch(batch)
+        self.assertEqual(response.status_code, 201)
+        created = response.json()['polls']
+        self.assertEqual(len(created), 20)
+        self.assertEqual(Poll.objects.filter(owner=self.user).count(), 20)
+        poll = Poll.objects.get(pk=created[3]['id'])
+        self.assertEqual(poll.name, 'poll 3')
+        self.assertEqual([o.option_text for o in poll.options.order_by('pk')], ['a', 'b', 'c'])
+        self.assertEqual([o['id'] for o in created[3]['options']],
+                         list(poll.options.order_by('pk').values_list('pk', flat=True)))
+
+    def test_one_invalid_poll_rejects_the_batch(self):
+        """
+            Should create nothing and report the errors of each invalid poll
+            by its index.
+        """
+        batch = [{'name': 'good poll', 'options': ['a', 'b']},
+                 {'name': '', 'options': ['a', 'b']},
+                 {'name': 'no options'},
+                 'not a poll']
+        response = self.post_batch(batch)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'1', '2', '3'})
+        self.assertIn('name', response.json()['errors']['1'])
+        self.assertFalse(Poll.objects.exists())
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get(self.batch_url).status_code, 405)
+        response = self.client.post(self.batch_url, '[{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post_batch({'name': 'not a list'}).status_code, 400)
+        self.assertEqual(self.post_batch([]).status_code, 400)
+        with self.settings(POLL_BATCH_MAX_SIZE=2):
+            batch = [{'name': 'poll %s' % i, 'options': ['a', 'b']} for i in range(3)]
+            self.assertEqual(self.post_batch(batch).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.post_batch([{'name': 'poll', 'options': ['a', 'b']}]).status_code, 401)
+        self.assertFalse(Poll.objects.exists())
+
+    def test_batch_is_fanned_out_to_followers(self):
+        follower = User.objects.create_user(username="follower", password="testpassword12")
+        FollowedUsers.objects.create(follower=follower, followed=self.user)
+        batch = [{'name': 'poll %s' % i, 'options': ['a', 'b']} for i in range(5)]
+        self.post_batch(batch)
+        self.assertEqual(PollStreamEntry.objects.filter(user=follower).count(), 5)
+
 
 class PollVotingTests(TestCase):
     def setUp(self):
@@ -98,6 +184,31 @@ class PollVotingTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(len(self.option1.votes.all()), 1)
 
+    def test_vote_updates_stored_tallies(self):
+        """
+            Recording a vote should increment the stored tallies on both the
+            option voted for and the poll, and leave other options untouched.
+        """
+        login = self.client.login(username="testuser", password="testpassword12")
+        self.assertTrue(login)
+        self.client.get(self.vote_poll_url)
+        self.option1.refresh_from_db()
+        self.option2.refresh_from_db()
+        self.poll.refresh_from_db()
+        self.assertEqual(self.option1.vote_count, 1)
+        self.assertEqual(self.option2.vote_count, 0)
+        self.assertEqual(self.poll.vote_count, 1)
+
+    def test_view_poll_displays_stored_tallies(self):
+        """
+            The results table should render the stored tallies rather than
+            counting votes.
+        """
+        Option.objects.filter(pk=self.option2.pk).update(vote_count=42)
+        response = self.client.get(self.view_poll_url)
+        self.assertContains(response, '<td class="vote_count" data-option-id="%s">42</td>'
+                                      % self.option2.pk)
+
     def test_logged_in_already_voted_not_vote_again(self):
         """
             After a user has already voted they should not be allowed to vote
@@ -113,6 +224,275 @@ class PollVotingTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(response2.status_code, 302)
 
+    def test_vote_on_other_option_after_voting_rejected(self):
+        """
+            A second vote on a different option of the same poll should be
+            rejected with the already voted message and leave tallies alone.
+        """
+        login = self.client.login(username="testuser", password="testpassword12")
+        self.assertTrue(login)
+        self.client.get(self.vote_poll_url)
+        other_option_url = reverse('vote poll', kwargs={'poll_id': self.poll.id, 'option_id': self.option2.id})
+        response = self.client.get(other_option_url, follow=True)
+        self.assertContains(response, "already voted on this poll")
+        self.assertEqual(self.poll.votes.count(), 1)
+        self.option2.refresh_from_db()
+        self.assertEqual(self.option2.vote_count, 0)
+
+    def test_database_rejects_duplicate_vote(self):
+        """
+            The one-vote-per-user rule is enforced by the database, not just
+            the view.
+        """
+        Vote.objects.create(option=self.option1, owner=self.user, poll=self.poll)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Vote.objects.create(option=self.option2, owner=self.user, poll=self.poll)
+
+    def test_user_has_voted_single_query(self):
+        """
+            user_has_voted should be one existence lookup regardless of the
+            number of options.
+        """
+        for i in range(3, 8):
+            Option.objects.create(option_text="test_option_%s" % i, poll=self.poll)
+        with self.assertNumQueries(1):
+            self.assertFalse(self.poll.user_has_voted(self.user))
+        Vote.objects.create(option=self.option2, owner=self.user, poll=self.poll)
+        with self.assertNumQueries(1):
+            self.assertTrue(self.poll.user_has_voted(self.user))
+
+class PollResultsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", email="test@example.com", password="testpassword12")
+        self.poll = Poll.objects.create(name="test_poll", owner=self.user)
+        self.option1 = Option.objects.create(option_text="test_option_1", poll=self.poll)
+        self.option2 = Option.objects.create(option_text="test_option_2", poll=self.poll)
+        self.view_poll_url = reverse('view poll', kwargs={'poll_id': self.poll.id})
+        self.vote_poll_url = reverse('vote poll', kwargs={'poll_id': self.poll.id, 'option_id': self.option1.id})
+
+    def test_results_loaded_in_one_query_then_cached(self):
+        """
+            The first anonymous view should read the results in one query;
+            repeat views should be served without touching the database.
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get(self.view_poll_url)
+        self.assertContains(response, "test_option_2")
+        with self.assertNumQueries(0):
+            response = self.client.get(self.view_poll_url)
+        self.assertContains(response, "test_option_2")
+
+    def test_vote_invalidates_cached_results(self):
+        """
+            A vote should bump the poll's version so the next view shows the
+            new tally.
+        """
+        self.client.get(self.view_poll_url)
+        version = poll_cache.get_results_version(self.poll.id)
+        self.client.login(username="testuser", password="testpassword12")
+        response = self.client.get(self.vote_poll_url, follow=True)
+        self.assertNotEqual(poll_cache.get_results_version(self.poll.id), version)
+        self.assertEqual(response.context.get('poll')['options'][0]['vote_count'], 1)
+        self.assertTrue(response.context.get('user_has_voted'))
+
+    def test_has_voted_not_shared_between_users(self):
+        """
+            The cached results are shared; the has-voted flag must not be.
+        """
+        User.objects.create_user(username="testuser2", password="testpassword12")
+        self.client.login(username="testuser", password="testpassword12")
+        self.client.get(self.vote_poll_url)
+        self.client.logout()
+        self.client.login(username="testuser2", password="testpassword12")
+        response = self.client.get(self.view_poll_url)
+        self.assertFalse(response.context.get('user_has_voted'))
+        self.assertContains(response, reverse('vote poll', kwargs={'poll_id': self.poll.id, 'option_id': self.option2.id}))
+
+    def test_deleted_poll_not_served_from_cache(self):
+        """
+            Deleting a poll should invalidate its cached results.
+        """
+        self.client.get(self.view_poll_url)
+        self.client.login(username="testuser", password="testpassword12")
+        self.client.post(reverse('delete poll', kwargs={'poll_id': self.poll.id}))
+        response = self.client.get(self.view_poll_url)
+        self.assertEqual(response.status_code, 404)
+
+@override_settings(LIVE_POLL_INTERVAL=0, LIVE_KEEPALIVE_INTERVAL=0.01,
+                   LIVE_STREAM_MAX_SECONDS=0.5)
+class LivePollResultsTests(TestCase):
+    """
+        The background watcher is disabled; tests run live.broker.check()
+        where the watcher thread would. Streams end after half a second and
+        are drained at the end of each test, as a client disconnecting would.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword12")
+        self.poll = Poll.objects.create(name="test_poll", owner=self.user)
+        self.option1 = Option.objects.create(option_text="test_option_1", poll=self.poll)
+        self.option2 = Option.objects.create(option_text="test_option_2", poll=self.poll)
+        self.stream_url = reverse('poll results stream', kwargs={'poll_id': self.poll.id})
+        self.vote_url = reverse('vote poll', kwargs={'poll_id': self.poll.id, 'option_id': self.option1.id})
+
+    def open_stream(self):
+        response = self.client.get(self.stream_url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        self.addCleanup(list, stream)
+        return stream
+
+    def next_event(self, stream):
+        """ Returns the data of the next event, skipping keepalives. """
+        for chunk in stream:
+            chunk = chunk.decode()
+            if chunk.startswith('data: '):
+                return json.loads(chunk[len('data: '):])
+
+    def test_stream_starts_with_current_counts(self):
+        Vote.objects.create(option=self.option2, owner=self.user, poll=self.poll)
+        poll_cache.bump_results_version(self.poll.id)
+        stream = self.open_stream()
+        self.assertEqual(next(stream), b'retry: 3000\n\n')
+        self.assertEqual(self.next_event(stream),
+                         {'vote_count': 0, 'options': {str(self.option1.id): 0, str(self.option2.id): 0}})
+
+    def test_vote_is_pushed_to_every_watcher(self):
+        """
+            A vote should reach every open stream of the poll as a delta of
+            the changed counts, from one results read however many watch.
+        """
+        streams = [self.open_stream() for _ in range(3)]
+        for stream in streams:
+            self.next_event(stream)
+        live.broker.check()
+        for stream in streams:
+            self.next_event(stream)
+        self.assertEqual(live.broker.watchers(self.poll.id), 3)
+
+        self.client.login(username="testuser", password="testpassword12")
+        self.client.get(self.vote_url)
+        with self.assertNumQueries(1):
+            live.broker.check()
+        for stream in streams:
+            self.assertEqual(self.next_event(stream),
+                             {'vote_count': 1, 'options': {str(self.option1.id): 1}})
+        with self.assertNumQueries(0):
+            live.broker.check()
+
+    def test_ended_stream_unsubscribes(self):
+        stream = self.open_stream()
+        next(stream)
+        self.assertEqual(live.broker.watchers(self.poll.id), 1)
+        list(stream)
+        self.assertEqual(live.broker.watchers(self.poll.id), 0)
+
+    def test_deleting_the_poll_ends_the_stream(self):
+        stream = self.open_stream()
+        self.next_event(stream)
+        self.client.login(username="testuser", password="testpassword12")
+        self.client.post(reverse('delete poll', kwargs={'poll_id': self.poll.id}))
+        live.broker.check()
+        self.assertTrue(self.next_event(stream)['deleted'])
+        self.assertEqual(list(stream), [])
+
+    def test_missing_poll_is_404(self):
+        response = self.client.get(reverse('poll results stream', kwargs={'poll_id': self.poll.id + 1}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(live.broker.watchers(self.poll.id + 1), 0)
+
+    def test_slow_watcher_gets_merged_counts(self):
+        subscription = live.Subscription()
+        subscription.push({'vote_count': 1, 'options': {'1': 1}})
+        subscription.push({'vote_count': 2, 'options': {'2': 1}})
+        self.assertEqual(subscription.get(0), {'vote_count': 2, 'options': {'1': 1, '2': 1}})
+        self.assertIsNone(subscription.get(0))
+
+
+@override_settings(VOTE_INGESTION_MODE='buffered', VOTE_BUFFER_FLUSH_INTERVAL=0,
+                   VOTE_BUFFER_BATCH_SIZE=100)
+class BufferedVotingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        vote_buffer.flush()
+        self.user = User.objects.create_user(username="testuser", password="testpassword12")
+        self.poll = Poll.objects.create(name="test_poll", owner=self.user)
+        self.option1 = Option.objects.create(option_text="test_option_1", poll=self.poll)
+        self.option2 = Option.objects.create(option_text="test_option_2", poll=self.poll)
+        self.vote_poll_url = reverse('vote poll', kwargs={'poll_id': self.poll.id, 'option_id': self.option1.id})
+        self.view_poll_url = reverse('view poll', kwargs={'poll_id': self.poll.id})
+        self.client.login(username="testuser", password="testpassword12")
+
+    def test_vote_buffered_until_flush(self):
+        """
+            A buffered vote should count as voted immediately but only be
+            written, with its tallies, when the buffer is flushed.
+        """
+        response = self.client.get(self.vote_poll_url, follow=True)
+        self.assertContains(response, "Vote recorded successfully!")
+        self.assertTrue(response.context.get('user_has_voted'))
+        self.assertEqual(Vote.objects.count(), 0)
+
+        self.assertEqual(vote_buffer.flush(), 1)
+        self.assertEqual(self.option1.votes.count(), 1)
+        self.option1.refresh_from_db()
+        self.poll.refresh_from_db()
+        self.assertEqual(self.option1.vote_count, 1)
+        self.assertEqual(self.poll.vote_count, 1)
+
+    def test_duplicate_buffered_vote_rejected(self):
+        """
+            A second vote while the first is still buffered, or after it has
+            been written, should be rejected.
+        """
+        self.client.get(self.vote_poll_url)
+        other_option_url = reverse('vote poll', kwargs={'poll_id': self.poll.id, 'option_id': self.option2.id})
+        response = self.client.get(other_option_url, follow=True)
+        self.assertContains(response, "already voted on this poll")
+        self.assertEqual(len(vote_buffer), 1)
+        vote_buffer.flush()
+        cache.clear()
+        response = self.client.get(other_option_url, follow=True)
+        self.assertContains(response, "already voted on this poll")
+        self.assertEqual(len(vote_buffer), 0)
+
+    def test_flush_wakes_live_watcher(self):
+        """
+            Writing a batch should tell the live broker, as a synchronous
+            vote does, so watchers see buffered votes at once.
+        """
+        live.broker._wake.clear()
+        self.client.get(self.vote_poll_url)
+        self.assertFalse(live.broker._wake.is_set())
+        vote_buffer.flush()
+        self.assertTrue(live.broker._wake.is_set())
+
+    @override_settings(VOTE_BUFFER_BATCH_SIZE=2)
+    def test_full_buffer_flushes(self):
+        """
+            Reaching the batch size should write the buffered votes.
+        """
+        User.objects.create_user(username="testuser2", password="testpassword12")
+        self.client.get(self.vote_poll_url)
+        self.assertEqual(Vote.objects.count(), 0)
+        self.client.login(username="testuser2", password="testpassword12")
+        self.client.get(self.vote_poll_url)
+        self.assertEqual(Vote.objects.count(), 2)
+        self.assertEqual(len(vote_buffer), 0)
+
+    def test_replayed_batch_not_double_counted(self):
+        """
+            Writing the same batch twice should store each vote once.
+        """
+        batch = [(self.poll.id, self.option1.id, self.user.id)]
+        self.assertEqual(len(record_votes(batch)), 1)
+        self.assertEqual(len(record_votes(batch)), 0)
+        self.assertEqual(Vote.objects.count(), 1)
+        self.option1.refresh_from_db()
+        self.assertEqual(self.option1.vote_count, 1)
+
 class PollDeletionTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="testuser", email="test@example.com", password="testpassword12")
@@ -168,3 +548,57 @@ class PollDeletionTests(TestCase):
         self.assertEqual(post_response.status_code, 302)
         self.assertRedirects(post_response, reverse('home'))
         self.assertEqual(len(self.user.polls.all()), 0)
+
+    def test_deleted_poll_hidden_everywhere(self):
+        """
+            A deleted poll should disappear from every page and refuse votes
+            before it is purged.
+        """
+        User.objects.create_user(username="follower", password="testpassword12")
+        self.client.login(username="follower", password="testpassword12")
+        self.client.post(reverse('account:follow user', kwargs={'user_id': self.user.id}))
+        self.assertEqual(len(self.client.get(reverse('home')).context['followed_polls']), 1)
+
+        self.client.login(username="testuser", password="testpassword12")
+        self.client.post(self.delete_poll_url)
+        self.assertTrue(Poll.all_objects.get(pk=self.poll.id).is_deleted)
+        self.assertEqual(Option.objects.filter(poll_id=self.poll.id).count(), 2)
+
+        self.client.login(username="follower", password="testpassword12")
+        self.assertEqual(len(self.client.get(reverse('home')).context['followed_polls']), 0)
+        self.assertEqual(len(self.client.get(reverse('explore polls')).context['polls']), 0)
+        profile_url = reverse('account:view profile', kwargs={'user_id': self.user.id})
+        self.assertEqual(len(self.client.get(profile_url).context['poll_list']), 0)
+        search = self.client.get(reverse('search polls'), {'search_val': 'test_poll'})
+        self.assertEqual(len(search.context['results']), 0)
+        self.assertEqual(self.client.get(reverse('view poll', kwargs={'poll_id': self.poll.id})).status_code, 404)
+        vote_url = reverse('vote poll', kwargs={'poll_id': self.poll.id, 'option_id': self.option1.id})
+        self.assertEqual(self.client.get(vote_url).status_code, 404)
+
+class PollTrendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_test_user()
+        self.voter = create_test_user(username='testvoter')
+        create_polls(self.user, amount=1)
+        self.poll = Poll.objects.get(name='test_poll_0')
+        self.option1, self.option2 = self.poll.options.order_by('pk')
+        self.poll_trend_url = reverse('poll trend', kwargs={'poll_id': self.poll.id})
+
+    def test_poll_trend(self):
+        """ A new vote should show in the trend at once. """
+        self.assertEqual(self.client.get(self.poll_trend_url).json()['buckets'], [])
+        record_vote(self.poll, self.option2, self.voter)
+        trend = self.client.get(self.poll_trend_url, {'resolution': 'minute'}).json()
+        self.assertEqual(trend['resolution'], 'minute')
+        self.assertEqual([option['id'] for option in trend['options']], [self.option1.id, self.option2.id])
+        self.assertEqual([bucket['counts'] for bucket in trend['buckets']], [[0, 1]])
+
+    def test_invalid_resolution(self):
+        response = self.client.get(self.poll_trend_url, {'resolution': 'week'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('resolution', response.json()['errors'])
+
+    def test_missing_poll_is_404(self):
+        url = reverse('poll trend', kwargs={'poll_id': self.poll.id + 100})
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,118 @@
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from myvote.models import Poll
+from myvote.search import find_polls, find_users, search_all
+from tests.testing_helpers import create_test_user
+
+class PollSearchTests(TestCase):
+    def setUp(self):
+        self.user = create_test_user()
+        self.search_url = reverse('search')
+        self.search_polls_url = reverse('search polls')
+
+    def test_search_vector_maintained_on_save(self):
+        """
+            The stored search vector should be written on insert and follow
+            later edits to the poll name.
+        """
+        poll = Poll.objects.create(name="favourite colour", owner=self.user)
+        self.assertEqual(list(find_polls("colour")), [poll])
+        poll.name = "favourite animal"
+        poll.save()
+        self.assertEqual(list(find_polls("colour")), [])
+        self.assertEqual(list(find_polls("animal")), [poll])
+
+    def test_search_results_ordered_by_rank(self):
+        """
+            Polls matching on the name should rank above polls with weaker
+            matches, and non-matching polls should not be returned.
+        """
+        weak = Poll.objects.create(name="pizza night", owner=self.user)
+        strong = Poll.objects.create(name="pizza toppings", owner=self.user,
+                                     description="best pizza toppings")
+        Poll.objects.create(name="weather", owner=self.user)
+        self.assertEqual(list(find_polls("pizza")), [strong, weak])
+        self.assertEqual(list(find_polls("toppings")), [strong])
+
+    def test_search_limit(self):
+        """
+            Should return at most limit results.
+        """
+        for i in range(5):
+            Poll.objects.create(name="election %s" % i, owner=self.user)
+        self.assertEqual(len(find_polls("election", limit=3)), 3)
+
+    def test_search_views(self):
+        """
+            The combined and poll search views should list matching polls.
+        """
+        poll = Poll.objects.create(name="election day", owner=self.user)
+        all_response = self.client.get(self.search_url, {'search_val': 'election'})
+        self.assertEqual(list(all_response.context.get('poll_search_results')), [poll])
+        polls_response = self.client.get(self.search_polls_url, {'search_val': 'election'})
+        self.assertEqual(list(polls_response.context.get('results')), [poll])
+        self.assertContains(polls_response, reverse('view poll', kwargs={'poll_id': poll.id}))
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        for username in ["johnsmith", "john", "jonathan", "alice", "bigjohn99"]:
+            create_test_user(username=username)
+        self.search_users_url = reverse('search users')
+
+    def test_substring_matches(self):
+        """
+            Every username containing the search value should be found.
+        """
+        usernames = set(find_users("john").values_list('username', flat=True))
+        self.assertTrue({"john", "johnsmith", "bigjohn99"} <= usernames)
+        self.assertNotIn("alice", usernames)
+
+    def test_best_match_first(self):
+        """
+            The exact username should be the most similar and come first.
+        """
+        self.assertEqual(find_users("john")[0].username, "john")
+
+    def test_fuzzy_match(self):
+        """
+            A misspelled username should still find the closest user.
+        """
+        self.assertEqual(find_users("johnsmth")[0].username, "johnsmith")
+
+    def test_search_users_view(self):
+        """
+            The user search view should list matches, best first.
+        """
+        response = self.client.get(self.search_users_url, {'search_val': 'alice'})
+        self.assertEqual([user.username for user in response.context.get('results')], ["alice"])
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class ConcurrentSearchTests(TransactionTestCase):
+    """
+        Runs outside a test transaction, as search_all only searches
+        concurrently when the rows are visible to other connections. Reads
+        stay on the primary, whose queries are the ones counted.
+    """
+    def setUp(self):
+        self.user = create_test_user(username="electionfan")
+        self.poll = Poll.objects.create(name="election day", owner=self.user)
+
+    def test_poll_search_runs_on_another_connection(self):
+        """
+            Only the user queries should run on the request's connection,
+            with the same results as searching one after the other.
+        """
+        with self.assertNumQueries(2):
+            users, polls = search_all("election")
+        self.assertEqual(users, [self.user])
+        self.assertEqual(users[0].recent_polls, [self.poll])
+        self.assertEqual(polls, [self.poll])
+
+    @override_settings(SEARCH_THREADS=0)
+    def test_sequential_search(self):
+        with self.assertNumQueries(3):
+            users, polls = search_all("election")
+        self.assertEqual((users, polls), ([self.user], [self.poll]))
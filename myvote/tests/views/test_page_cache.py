@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import UserBio
+from myvote.models import Poll, Option
+from myvote.votes import record_vote
+from tests.testing_helpers import create_test_user, create_polls, PASSWORD
+
+class AnonymousPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_test_user()
+        UserBio.objects.create(user=self.user, text="my bio")
+        create_polls(self.user, amount=3)
+        self.poll = self.user.polls.first()
+        self.explore_url = reverse('explore polls')
+        self.view_poll_url = reverse('view poll', kwargs={'poll_id': self.poll.id})
+        self.profile_url = reverse('account:view profile', kwargs={'user_id': self.user.id})
+
+    def test_conditional_get(self):
+        """
+            Anonymous pages should carry an ETag and Last-Modified, and a
+            request revalidating either should get 304 Not Modified.
+        """
+        response = self.client.get(self.explore_url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        not_modified = self.client.get(self.explore_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        not_modified = self.client.get(self.explore_url,
+                                       HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_anonymous_page_served_from_cache(self):
+        """
+            The second anonymous request for a page should be answered from
+            the cache without a query or a render.
+        """
+        first = self.client.get(self.explore_url)
+        self.assertIsNotNone(first.context)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.explore_url)
+        self.assertIsNone(second.context)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_changes_move_etags(self):
+        """
+            New polls, votes and bio edits should change the ETag of every
+            page showing them, so neither browsers nor the cache keep the old
+            page.
+        """
+        explore_etag = self.client.get(self.explore_url)['ETag']
+        profile_etag = self.client.get(self.profile_url)['ETag']
+        Poll.objects.create(owner=self.user, name="brand new poll")
+        response = self.client.get(self.explore_url)
+        self.assertNotEqual(response['ETag'], explore_etag)
+        self.assertContains(response, "brand new poll")
+        self.assertNotEqual(self.client.get(self.profile_url)['ETag'], profile_etag)
+
+        view_poll_etag = self.client.get(self.view_poll_url)['ETag']
+        voter = create_test_user(username='voter')
+        record_vote(self.poll, Option.objects.filter(poll=self.poll).first(), voter)
+        response = self.client.get(self.view_poll_url, HTTP_IF_NONE_MATCH=view_poll_etag)
+        self.assertEqual(response.status_code, 200)
+
+        profile_etag = self.client.get(self.profile_url)['ETag']
+        self.client.login(username=self.user.username, password=PASSWORD)
+        self.client.post(reverse('account:edit bio'), {'bio_text': "new bio"})
+        self.client.logout()
+        response = self.client.get(self.profile_url)
+        self.assertNotEqual(response['ETag'], profile_etag)
+        self.assertContains(response, "new bio")
+
+    def test_logged_in_pages_never_cached(self):
+        """
+            A logged in user should always get a freshly rendered page
+            without validators, even with an anonymous copy in the cache.
+        """
+        for url in (self.explore_url, self.view_poll_url, self.profile_url):
+            self.client.get(url)
+        self.client.login(username=self.user.username, password=PASSWORD)
+        for url in (self.explore_url, self.view_poll_url, self.profile_url):
+            response = self.client.get(url)
+            self.assertIsNotNone(response.context)
+            self.assertFalse(response.has_header('ETag'))
+            self.assertContains(response, reverse('account:logout'))
+
+    def test_pending_messages_bypass_cache(self):
+        """
+            A visitor with flash messages waiting should get a rendered page
+            showing them.
+        """
+        self.client.get(self.explore_url)
+        self.client.cookies['messages'] = 'pending'
+        response = self.client.get(self.explore_url)
+        self.assertIsNotNone(response.context)
+        self.assertFalse(response.has_header('ETag'))
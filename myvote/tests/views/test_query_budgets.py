@@ -0,0 +1,247 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse, URLResolver
+
+from accounts.models import UserBio
+from myvote.models import Poll
+from myvote.query_budget import (query_budget, QueryBudgetMiddleware,
+                                 QueryBudgetExceeded, QueryRecorder)
+from tests.testing_helpers import create_test_user, create_polls, PASSWORD
+
+OTHER_USERNAME = 'otheruser'
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """
+        Requests every URL in myvote/urls.py and accounts/urls.py (the admin
+        site aside) with budgets enforced. A request that runs more queries
+        than its view's @query_budget raises QueryBudgetExceeded. The data is
+        big enough that an N+1 over a page of results would blow the budget.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = create_test_user()
+        self.other = create_test_user(username=OTHER_USERNAME)
+        UserBio.objects.create(user=self.user, text="my bio")
+        UserBio.objects.create(user=self.other, text="other bio")
+        for i in range(12):
+            create_test_user(username='testuser_%s' % i)
+        create_polls(self.user, amount=12)
+        create_polls(self.other, start_num=12, amount=12)
+        self.poll = self.user.polls.first()
+        self.other_poll = self.other.polls.first()
+        self.client.login(username=self.user.username, password=PASSWORD)
+        self.client.post(reverse('account:follow user', kwargs={'user_id': self.other.id}))
+
+    def assertStatus(self, response, status_code):
+        self.assertEqual(response.status_code, status_code)
+
+    # myvote/urls.py
+
+    def test_home(self):
+        self.assertStatus(self.client.get(reverse('home')), 200)
+
+    def test_home_logged_out(self):
+        self.client.logout()
+        self.assertStatus(self.client.get(reverse('home')), 200)
+
+    def test_explore_polls(self):
+        response = self.client.get(reverse('explore polls'))
+        self.assertStatus(response, 200)
+        next_cursor = response.context.get('polls').next_cursor
+        self.assertStatus(self.client.get(reverse('explore polls') + '?after=' + next_cursor), 200)
+
+    def test_explore_recent_polls(self):
+        url = reverse('explore recent polls', kwargs={'user_id': self.other.id})
+        self.assertStatus(self.client.get(url), 200)
+
+    def test_create_poll(self):
+        self.assertStatus(self.client.get(reverse('create poll')), 200)
+        poll_data = {'name': 'budget poll', 'option1': 'a', 'option2': 'b', 'option3': 'c'}
+        self.assertStatus(self.client.post(reverse('create poll'), poll_data), 302)
+
+    def test_create_polls_batch(self):
+        batch = [{'name': 'batch poll %s' % i, 'options': ['a', 'b', 'c']} for i in range(50)]
+        response = self.client.post(reverse('create polls batch'), json.dumps(batch),
+                                    content_type='application/json')
+        self.assertStatus(response, 201)
+
+    def test_vote_poll(self):
+        option = self.other_poll.options.first()
+        url = reverse('vote poll', kwargs={'poll_id': self.other_poll.id, 'option_id': option.id})
+        self.assertStatus(self.client.get(url), 302)
+        # voting again takes the already voted path
+        self.assertStatus(self.client.get(url), 302)
+
+    def test_view_poll(self):
+        url = reverse('view poll', kwargs={'poll_id': self.other_poll.id})
+        self.assertStatus(self.client.get(url), 200)
+        self.client.logout()
+        self.assertStatus(self.client.get(url), 200)
+
+    def test_poll_trend(self):
+        url = reverse('poll trend', kwargs={'poll_id': self.other_poll.id})
+        self.assertStatus(self.client.get(url), 200)
+        self.client.logout()
+        self.assertStatus(self.client.get(url, {'resolution': 'minute'}), 200)
+
+    @override_settings(LIVE_STREAM_MAX_SECONDS=0)
+    def test_poll_results_stream(self):
+        url = reverse('poll results stream', kwargs={'poll_id': self.other_poll.id})
+        response = self.client.get(url)
+        self.assertStatus(response, 200)
+        b''.join(response.streaming_content)
+
+    def test_delete_poll(self):
+        url = reverse('delete poll', kwargs={'poll_id': self.poll.id})
+        self.assertStatus(self.client.get(url), 200)
+        self.assertStatus(self.client.post(url), 302)
+
+    def test_search(self):
+        self.assertStatus(self.client.get(reverse('search'), {'search_val': 'testuser'}), 200)
+        self.assertStatus(self.client.get(reverse('search'), {'search_val': 'test_poll_1'}), 200)
+
+    def test_search_users(self):
+        response = self.client.get(reverse('search users'), {'search_val': 'testuser'})
+        self.assertStatus(response, 200)
+        self.assertEqual(len(response.context.get('results')), 10)
+
+    def test_search_polls(self):
+        self.assertStatus(self.client.get(reverse('search polls'), {'search_val': 'test_poll_1'}), 200)
+
+    # accounts/urls.py
+
+    def test_account_overview(self):
+        self.assertStatus(self.client.get(reverse('account:overview')), 200)
+
+    def test_view_profile(self):
+        for user_id in (self.user.id, self.other.id):
+            url = reverse('account:view profile', kwargs={'user_id': user_id})
+            self.assertStatus(self.client.get(url), 200)
+        self.client.logout()
+        self.assertStatus(self.client.get(url), 200)
+
+    def test_profile_trend(self):
+        url = reverse('account:profile trend', kwargs={'user_id': self.other.id})
+        self.assertStatus(self.client.get(url), 200)
+        self.client.logout()
+        self.assertStatus(self.client.get(url, {'resolution': 'day'}), 200)
+
+    def test_follow_and_unfollow_user(self):
+        user = User.objects.get(username='testuser_0')
+        follow_url = reverse('account:follow user', kwargs={'user_id': user.id})
+        unfollow_url = reverse('account:unfollow user', kwargs={'user_id': user.id})
+        self.assertStatus(self.client.post(follow_url), 302)
+        self.assertStatus(self.client.post(unfollow_url), 302)
+
+    def test_signup(self):
+        self.client.logout()
+        self.assertStatus(self.client.get(reverse('account:signup')), 200)
+        data = {'username': 'newuser', 'email': 'new@example.com',
+                'password1': 'abcdef123456', 'password2': 'abcdef123456'}
+        self.assertStatus(self.client.post(reverse('account:signup'), data), 302)
+
+    def test_login_and_logout(self):
+        self.assertStatus(self.client.get(reverse('account:logout')), 302)
+        self.assertStatus(self.client.get(reverse('account:login')), 200)
+        data = {'username': self.user.username, 'password': PASSWORD}
+        self.assertStatus(self.client.post(reverse('account:login'), data), 302)
+
+    def test_edit_bio(self):
+        self.assertStatus(self.client.get(reverse('account:edit bio')), 200)
+        self.assertStatus(self.client.post(reverse('account:edit bio'), {'bio_text': 'new bio'}), 302)
+
+    def test_change_password(self):
+        self.assertStatus(self.client.get(reverse('account:change password')), 200)
+        data = {'old_password': PASSWORD, 'new_password': 'newpassword34',
+                'new_password2': 'newpassword34'}
+        self.assertStatus(self.client.post(reverse('account:change password'), data), 302)
+
+    def test_change_email(self):
+        self.assertStatus(self.client.get(reverse('account:change email')), 200)
+        data = {'password': PASSWORD, 'new_email': 'new@example.com',
+                'new_email2': 'new@example.com'}
+        self.assertStatus(self.client.post(reverse('account:change email'), data), 302)
+
+    def test_delete_account(self):
+        self.assertStatus(self.client.get(reverse('account:delete account')), 200)
+        data = {'password': PASSWORD, 'password2': PASSWORD}
+        self.assertStatus(self.client.post(reverse('account:delete account'), data), 302)
+
+    def test_every_url_declares_a_budget(self):
+        """
+            Every view routed by myvote/urls.py and accounts/urls.py should
+            declare a query budget.
+        """
+        from myvote.urls import urlpatterns
+        missing = []
+        for pattern in urlpatterns:
+            if isinstance(pattern, URLResolver):
+                if pattern.app_name == 'admin':
+                    continue
+                patterns = pattern.url_patterns
+            else:
+                patterns = [pattern]
+            for url in patterns:
+                if getattr(url.callback, 'query_budget', None) is None:
+                    missing.append(url.name)
+        self.assertEqual(missing, [])
+
+
+def n_plus_one_view(request):
+    for poll in Poll.objects.all():
+        poll.owner.username
+    return HttpResponse()
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = create_test_user()
+
+    def run_middleware(self, view):
+        middleware = QueryBudgetMiddleware(lambda request: view(request))
+        request = self.factory.get('/')
+        middleware.process_view(request, view, (), {})
+        return middleware(request)
+
+    def test_recorder_groups_repeated_shapes(self):
+        """
+            The same statement run with different parameters should be grouped
+            as one repeated shape.
+        """
+        create_polls(self.user, amount=3)
+        recorder = QueryRecorder()
+        with recorder.record():
+            n_plus_one_view(None)
+        self.assertEqual(len(recorder), 4)
+        shapes = recorder.repeated_shapes()
+        self.assertEqual(len(shapes), 1)
+        self.assertEqual(shapes[0][1], 3)
+        self.assertIn('auth_user', shapes[0][0])
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_over_budget_raises(self):
+        create_polls(self.user, amount=3)
+        view = query_budget(2)(n_plus_one_view)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.run_middleware(view)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_over_budget_logs_warning(self):
+        create_polls(self.user, amount=3)
+        view = query_budget(2)(n_plus_one_view)
+        with self.assertLogs('myvote.query_budget', level='WARNING') as logs:
+            self.run_middleware(view)
+        self.assertIn('over its budget of 2', logs.output[0])
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_within_budget_passes(self):
+        create_polls(self.user, amount=3)
+        view = query_budget(4)(n_plus_one_view)
+        self.assertEqual(self.run_middleware(view).status_code, 200)
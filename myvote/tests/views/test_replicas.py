@@ -0,0 +1,106 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from myvote import db_router
+from myvote.models import Poll, Option
+from myvote.query_budget import QueryRecorder
+from tests.testing_helpers import create_test_user, create_polls, PASSWORD
+
+class PrimaryOnlyTests(TestCase):
+    def test_router_without_replicas(self):
+        """
+            With no replicas configured every read should go to the primary
+            and no pin cookie should be set.
+        """
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(db_router.ReplicaRouter().db_for_read(Poll), db_router.PRIMARY)
+            user = create_test_user()
+            self.client.force_login(user)
+            response = self.client.post(reverse('account:edit bio'), {'bio_text': "bio"})
+            self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "Set DB_REPLICA_HOSTS to test read replicas.")
+class ReplicaRoutingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        db_router._down_until.clear()
+        self.replica = settings.DATABASE_REPLICAS[0]
+        self.user = create_test_user()
+        create_polls(self.user, amount=3)
+        self.poll = self.user.polls.first()
+        self.view_poll_url = reverse('view poll', kwargs={'poll_id': self.poll.id})
+        self.client.login(username=self.user.username, password=PASSWORD)
+
+    def tearDown(self):
+        # Replica connections would keep the test database from being dropped.
+        for alias in settings.DATABASE_REPLICAS:
+            connections[alias].close()
+
+    def replica_queries(self, method, url, **kwargs):
+        """ Returns the response to the request and its queries run on the replica. """
+        recorder = QueryRecorder()
+        with connections[self.replica].execute_wrapper(recorder):
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, len(recorder)
+
+    def test_reads_go_to_replica(self):
+        response, queries = self.replica_queries('get', reverse('explore polls'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(queries, 0)
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_writes_pin_client_to_primary(self):
+        """
+            A vote should run on the primary and pin the voter to it, so the
+            next page shows their vote whatever the replica's lag.
+        """
+        option = Option.objects.filter(poll=self.poll).first()
+        response, queries = self.replica_queries(
+            'get', reverse('vote poll', kwargs={'poll_id': self.poll.id, 'option_id': option.id}))
+        self.assertEqual(queries, 0)
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[db_router.PIN_COOKIE]['max-age'],
+                         settings.REPLICA_PIN_SECONDS)
+
+        response, queries = self.replica_queries('get', self.view_poll_url)
+        self.assertEqual(queries, 0)
+        self.assertTrue(response.context['user_has_voted'])
+
+        del self.client.cookies[db_router.PIN_COOKIE]
+        cache.clear()
+        _, queries = self.replica_queries('get', reverse('explore polls'))
+        self.assertGreater(queries, 0)
+
+    def test_post_pins_client_to_primary(self):
+        response, queries = self.replica_queries('post', reverse('account:edit bio'),
+                                                 data={'bio_text': "new bio"})
+        self.assertEqual(queries, 0)
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_unreachable_replica_skipped(self):
+        """
+            Reads should fall back to the primary while a replica can't be
+            reached, and the replica should be left alone until
+            REPLICA_RETRY_SECONDS pass.
+        """
+        connection = connections[self.replica]
+        connection.close()
+        settings_dict = connection.settings_dict
+        connection.settings_dict = dict(settings_dict, PORT='1')
+        try:
+            with self.assertLogs('myvote.db_router', 'WARNING'):
+                self.assertEqual(db_router.ReplicaRouter().db_for_read(Poll), db_router.PRIMARY)
+            response, queries = self.replica_queries('get', reverse('explore polls'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(queries, 0)
+        finally:
+            connection.settings_dict = settings_dict
+        self.assertIsNone(db_router.choose_replica())
+        db_router._down_until.clear()
+        self.assertEqual(db_router.choose_replica(), self.replica)
@@ -5,6 +5,9 @@ export DEBUG='True'
 export DB_NAME='myvote'
 export DB_HOST='localhost'
 export DB_PORT='5432'
+# Replicas are test mirrors of the default database, so any host runs the
+# read replica tests.
+export DB_REPLICA_HOSTS='localhost:5432'
 
 if [ $1 ]
 then